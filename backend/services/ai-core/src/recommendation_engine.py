@@ -2,62 +2,439 @@
 AI Recommendation Engine with Collaborative Filtering and Content-Based Recommendations
 Requirements: 17.4 - Personalized recommendations based on browsing history
 """
+import asyncio
+import os
+import time
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
-from collections import defaultdict
+from itertools import islice
+from typing import Deque, Iterable, List, Dict, Any, Mapping, Optional, Sequence, Tuple, Union
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from enum import Enum
 import logging
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy import sparse
 
 from src.models import (
     ProductBase, RecommendedProduct, RecommendationType,
     UserInteraction, UserProfile
 )
 from src import database
+from src.cache import BaseCache, TTLCache
+from src.ann_index import RandomProjectionLSH
+from src.similarity_table import SIMILARITY_TABLE_DIR, SimilarityTable, build_similarity_table
+from src.topk import top_k, top_k_indices
+from src.catalog import COLUMNS, NO_CATEGORY, ProductCatalog
+from src.snapshot_store import current_version, load_arrays, save_arrays
+from src.startup import lazy_import
+from src.trending import TrendingIndex
 
 logger = logging.getLogger(__name__)
 
+# How often the background task rebuilds the interaction snapshot
+INTERACTION_REFRESH_SECONDS = int(os.getenv("INTERACTION_REFRESH_SECONDS", "900"))
+
+# Bounds for the set-based item-item similarity cache
+SIMILARITY_CACHE_SIZE = int(os.getenv("SIMILARITY_CACHE_SIZE", "50000"))
+SIMILARITY_CACHE_TTL_SECONDS = float(os.getenv("SIMILARITY_CACHE_TTL_SECONDS", "3600"))
+
+# Catalogs at least this large use the ANN index for similar-product queries
+ANN_MIN_PRODUCTS = int(os.getenv("ANN_MIN_PRODUCTS", "5000"))
+ANN_DIMENSIONS = int(os.getenv("ANN_DIMENSIONS", "64"))
+
+# Hashed feature space for product text (no vocabulary to fit or hold)
+CONTENT_HASH_FEATURES = int(os.getenv("CONTENT_HASH_FEATURES", str(2 ** 18)))
+
+# Fitted content model snapshot shared by worker processes
+CONTENT_SNAPSHOT_DIR = os.getenv("CONTENT_SNAPSHOT_DIR", "/tmp/mnbara/content_model")
+# Older snapshots are ignored at startup and the model is re-fitted
+CONTENT_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("CONTENT_SNAPSHOT_MAX_AGE_SECONDS", "86400"))
+# How often the catalog watermark is polled for changes
+CONTENT_REFRESH_SECONDS = int(os.getenv("CONTENT_REFRESH_SECONDS", "60"))
+# Full content rebuild interval even without a watermark change (catches hard deletes)
+CONTENT_REBUILD_SECONDS = int(os.getenv("CONTENT_REBUILD_SECONDS", "21600"))
+# Most changed listings applied as a delta; more triggers a full re-fit
+CONTENT_DELTA_MAX_ROWS = int(os.getenv("CONTENT_DELTA_MAX_ROWS", "50000"))
+# Full re-fit once this share of fitted rows has been changed by deltas
+CONTENT_DELTA_MAX_FRACTION = float(os.getenv("CONTENT_DELTA_MAX_FRACTION", "0.1"))
+# Full re-fit once this share of delta term occurrences was unseen at fit time
+CONTENT_DRIFT_THRESHOLD = float(os.getenv("CONTENT_DRIFT_THRESHOLD", "0.3"))
+# Bumped whenever the snapshot layout or text pipeline changes
+CONTENT_SNAPSHOT_FORMAT = 2
+
+# Half-life of interactions in the collaborative model
+INTERACTION_HALF_LIFE_DAYS = float(os.getenv("INTERACTION_HALF_LIFE_DAYS", "30"))
+
+# Streamed interactions of types the snapshot query does not read back are
+# kept this long (and at most this many) and replayed into every rebuild
+STREAMED_INTERACTION_RETENTION_DAYS = float(os.getenv("STREAMED_INTERACTION_RETENTION_DAYS", "90"))
+STREAMED_INTERACTIONS_MAX = int(os.getenv("STREAMED_INTERACTIONS_MAX", "500000"))
+
+# How often trending rankings are re-materialized
+TRENDING_REFRESH_SECONDS = int(os.getenv("TRENDING_REFRESH_SECONDS", "300"))
+
+# Latency budget for each homepage section; slower sections are dropped
+HOMEPAGE_SECTION_TIMEOUT_SECONDS = float(os.getenv("HOMEPAGE_SECTION_TIMEOUT_SECONDS", "0.5"))
+
+# Weight by interaction type
+INTERACTION_WEIGHTS = {
+    'purchase': 5.0,
+    'bid': 4.0,
+    'add_to_cart': 3.5,
+    'wishlist': 3.0,
+    'share': 2.5,
+    'click': 2.0,
+    'dwell_time': 1.5,
+    'view': 1.0
+}
+
+# Interaction types database.get_all_interactions returns
+PERSISTED_INTERACTION_TYPES = frozenset({'purchase', 'bid'})
+
+
+def _watermark_moved(fitted: Optional[datetime], latest: Optional[datetime]) -> bool:
+    """
+    Whether the catalog has changes newer than a fitted model. A lagging
+    replica may report an older watermark, which is not a change.
+    """
+    if latest is None:
+        return False
+    return fitted is None or latest > fitted
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _epoch_seconds(value: Union[datetime, float]) -> float:
+    """Unix time of a row timestamp; naive datetimes (Prisma's timestamp(3)) are UTC"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+class SimilarityMetric(str, Enum):
+    JACCARD = "jaccard"
+    COSINE = "cosine"
+
 
 class CollaborativeFilter:
     """
     Collaborative filtering using user-item interaction matrix
     Implements item-based collaborative filtering
+
+    In sparse mode (default) the interactions are packed into a SciPy CSR
+    matrix and the top-k neighbours of every item are computed with a
+    chunked sparse product, then kept as fixed-width neighbour arrays.
+    Sparse mode disabled falls back to the original per-item set walk.
+
+    Interaction weights are decayed by their age: snapshot rows by their
+    created_at, streamed interactions (apply_interaction) by growing as
+    exp(decay_rate * t), which is equivalent to exponentially decaying
+    everything older, so stale interactions fade without a rebuild.
+    Streamed interactions also update item co-occurrence and the touched
+    neighbour rows in place.
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        use_sparse: bool = True,
+        metric: SimilarityMetric = SimilarityMetric.JACCARD,
+        top_k: int = 20,
+        chunk_size: int = 2048,
+        half_life_days: float = INTERACTION_HALF_LIFE_DAYS,
+        similarity_cache: Optional[BaseCache] = None
+    ):
         self.user_item_matrix: Dict[int, Dict[int, float]] = defaultdict(dict)
-        self.item_similarity: Dict[int, Dict[int, float]] = {}
+        # Caches the per-item set walk; the sparse neighbour arrays are
+        # already precomputed and are read directly
+        if similarity_cache is None and not use_sparse:
+            similarity_cache = TTLCache(
+                max_size=SIMILARITY_CACHE_SIZE,
+                ttl_seconds=SIMILARITY_CACHE_TTL_SECONDS,
+                name="item_similarity"
+            )
+        self.item_similarity: Optional[BaseCache] = similarity_cache
+        self._generation = 0
         self.item_users: Dict[int, set] = defaultdict(set)
+        
+        # Snapshot metadata, set when built by RecommendationEngine
+        self.snapshot_version = 0
+        self.built_at: Optional[datetime] = None
+        
+        self.use_sparse = use_sparse
+        self.metric = SimilarityMetric(metric)
+        self.top_k = top_k
+        self.chunk_size = chunk_size
+        self.decay_rate = np.log(2) / (half_life_days * 86400)
+        
+        # Sparse index state (rebuilt lazily when interactions change)
+        self._index_dirty = True
+        self._item_index: Dict[int, int] = {}
+        self._n_items = 0
+        self._item_ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self._item_mass: np.ndarray = np.empty(0, dtype=np.float64)
+        self._neighbor_idx: np.ndarray = np.empty((0, top_k), dtype=np.int32)
+        self._neighbor_sim: np.ndarray = np.empty((0, top_k), dtype=np.float32)
+        
+        # Streamed weights are scaled by exp(decay_rate * (t - _decay_origin))
+        self._decay_origin = time.time()
     
     def add_interaction(self, user_id: int, item_id: int, weight: float = 1.0):
         """Add a user-item interaction"""
         self.user_item_matrix[user_id][item_id] = weight
         self.item_users[item_id].add(user_id)
+        self._generation += 1
+        self._index_dirty = True
     
-    def build_from_interactions(self, interactions: List[Dict[str, Any]]):
-        """Build matrix from interaction history"""
-        # Weight by interaction type
-        weights = {
-            'purchase': 5.0,
-            'bid': 4.0,
-            'wishlist': 3.0,
-            'click': 2.0,
-            'view': 1.0
-        }
-        
+    def add_decayed_interaction(self, user_id: int, item_id: int, weight: float, timestamp: float):
+        """Add an interaction made at `timestamp`, keeping the strongest decayed weight per pair"""
+        weight *= self._decay_scale(timestamp)
+        existing = self.user_item_matrix.get(user_id, {}).get(item_id, 0.0)
+        self.add_interaction(user_id, item_id, max(existing, weight))
+    
+    def build_from_interactions(self, interactions: Iterable[Dict[str, Any]]):
+        """
+        Build matrix from interaction history. Each row is decayed by the
+        age of its created_at; rows without one count as current.
+        """
+        now = time.time()
+        self._rebase_decay(now)
         for interaction in interactions:
             user_id = interaction.get('user_id')
             product_id = interaction.get('product_id')
             interaction_type = interaction.get('interaction_type', 'view')
-            weight = weights.get(interaction_type, 1.0)
+            weight = INTERACTION_WEIGHTS.get(interaction_type, 1.0)
+            created_at = interaction.get('created_at')
+            timestamp = now if created_at is None else _epoch_seconds(created_at)
             
             if user_id and product_id:
-                self.add_interaction(user_id, product_id, weight)
+                self.add_decayed_interaction(user_id, product_id, weight, timestamp)
+    
+    def build_sparse_index(self) -> None:
+        """Build the CSR user-item matrix and top-k item neighbour arrays"""
+        # Express the decayed weights relative to now
+        self._rebase_decay(time.time())
+        self._item_ids = np.fromiter(self.item_users.keys(), dtype=np.int64, count=len(self.item_users))
+        self._item_index = {int(iid): i for i, iid in enumerate(self._item_ids)}
+        self._n_items = len(self._item_ids)
+        
+        rows, cols, data = [], [], []
+        for row, items in enumerate(self.user_item_matrix.values()):
+            for item_id, weight in items.items():
+                rows.append(row)
+                cols.append(self._item_index[item_id])
+                data.append(weight)
+        
+        n_users, n_items = len(self.user_item_matrix), self._n_items
+        user_item = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), (rows, cols)),
+            shape=(n_users, n_items)
+        )
+        self._neighbor_idx, self._neighbor_sim = self._compute_neighbors(user_item)
+        self._item_mass = np.asarray((user_item > 0).sum(axis=0), dtype=np.float64).ravel()
+        self._index_dirty = False
+        logger.info(f"Collaborative index built: {n_users} users, {n_items} items")
+    
+    def _compute_neighbors(self, user_item: sparse.csr_matrix) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute top-k neighbours for every item in chunks of item rows"""
+        n_items = user_item.shape[1]
+        k = self.top_k
+        neighbor_idx = np.full((n_items, k), -1, dtype=np.int32)
+        neighbor_sim = np.zeros((n_items, k), dtype=np.float32)
+        if n_items == 0:
+            return neighbor_idx, neighbor_sim
+        
+        item_user = user_item.T.tocsr()
+        if self.metric == SimilarityMetric.JACCARD:
+            item_user = item_user.astype(bool).astype(np.float32)
+            item_norms = np.asarray(item_user.sum(axis=1)).ravel()
+        else:
+            norms = np.sqrt(np.asarray(item_user.multiply(item_user).sum(axis=1)).ravel())
+            norms[norms == 0] = 1.0
+            item_user = sparse.diags(1.0 / norms).dot(item_user).tocsr()
+        item_user_t = item_user.T.tocsr()
+        
+        for start in range(0, n_items, self.chunk_size):
+            stop = min(start + self.chunk_size, n_items)
+            block = (item_user[start:stop] @ item_user_t).tocsr()
+            block.sort_indices()
+            
+            for offset in range(stop - start):
+                item = start + offset
+                lo, hi = block.indptr[offset], block.indptr[offset + 1]
+                cols = block.indices[lo:hi]
+                vals = block.data[lo:hi]
+                
+                keep = cols != item
+                cols, vals = cols[keep], vals[keep]
+                if self.metric == SimilarityMetric.JACCARD:
+                    vals = vals / (item_norms[item] + item_norms[cols] - vals)
+                
+                order = top_k_indices(vals, k, mask=vals > 0)
+                
+                neighbor_idx[item, :order.size] = cols[order]
+                neighbor_sim[item, :order.size] = vals[order]
+        
+        return neighbor_idx, neighbor_sim
+    
+    def _ensure_index(self) -> None:
+        """Rebuild the sparse index if interactions changed since last build"""
+        if self._index_dirty:
+            self.build_sparse_index()
+    
+    def _decay_scale(self, timestamp: float) -> float:
+        """Weight of an interaction at `timestamp` relative to the decay origin"""
+        return float(np.exp(self.decay_rate * (timestamp - self._decay_origin)))
+    
+    def _rebase_decay(self, timestamp: float) -> None:
+        """Move the decay origin forward so scaled weights stay finite"""
+        factor = self._decay_scale(timestamp)
+        self._item_mass[:self._n_items] /= factor
+        for items in self.user_item_matrix.values():
+            for item_id in items:
+                items[item_id] /= factor
+        self._decay_origin = timestamp
+    
+    def _add_item(self, item_id: int) -> int:
+        """Append an unseen item to the neighbour arrays, growing capacity geometrically"""
+        if self._n_items == len(self._item_ids):
+            capacity = max(16, 2 * len(self._item_ids))
+            grow = capacity - len(self._item_ids)
+            self._item_ids = np.concatenate([self._item_ids, np.zeros(grow, dtype=np.int64)])
+            self._item_mass = np.concatenate([self._item_mass, np.zeros(grow)])
+            self._neighbor_idx = np.vstack([
+                self._neighbor_idx, np.full((grow, self.top_k), -1, dtype=np.int32)
+            ])
+            self._neighbor_sim = np.vstack([
+                self._neighbor_sim, np.zeros((grow, self.top_k), dtype=np.float32)
+            ])
+        
+        idx = self._n_items
+        self._item_ids[idx] = item_id
+        self._item_index[item_id] = idx
+        self._n_items += 1
+        return idx
+    
+    def _neighbor_similarity(self, row: int, col: int) -> float:
+        """Stored similarity of col in row's neighbour list (0 if absent)"""
+        hits = np.flatnonzero(self._neighbor_idx[row] == col)
+        return float(self._neighbor_sim[row, hits[0]]) if hits.size else 0.0
+    
+    def _set_neighbor(self, row: int, col: int, similarity: float) -> None:
+        """Insert or update col in row's fixed-width neighbour list"""
+        neighbors, sims = self._neighbor_idx[row], self._neighbor_sim[row]
+        hits = np.flatnonzero(neighbors == col)
+        if hits.size:
+            slot = hits[0]
+        else:
+            slot = int(np.argmin(np.where(neighbors >= 0, sims, -1.0)))
+            if neighbors[slot] >= 0 and sims[slot] >= similarity:
+                return
+        neighbors[slot] = col
+        sims[slot] = similarity
+        
+        order = np.lexsort((-sims, neighbors < 0))
+        self._neighbor_idx[row] = neighbors[order]
+        self._neighbor_sim[row] = sims[order]
+    
+    def apply_interaction(
+        self,
+        user_id: int,
+        item_id: int,
+        weight: float = 1.0,
+        timestamp: Optional[float] = None
+    ) -> None:
+        """
+        Apply one streamed interaction without rebuilding the index.
+        
+        Updates the decayed item mass and co-occurrence with every item
+        already in the user's history, then rewrites the neighbour rows
+        of the touched items. Co-occurrence of pairs already in a
+        neighbour list is recovered from the stored Jaccard score. A
+        repeat interaction with an item already in the user's history
+        only strengthens the user's weight.
+        """
+        if self.use_sparse and self.metric == SimilarityMetric.JACCARD:
+            self._ensure_index()
+        
+        timestamp = time.time() if timestamp is None else timestamp
+        if self._decay_scale(timestamp) > 1e6:
+            self._rebase_decay(timestamp)
+        scale = self._decay_scale(timestamp)
+        
+        if not self.use_sparse or self.metric != SimilarityMetric.JACCARD:
+            # Incremental updates are defined for Jaccard co-occurrence only
+            self.add_interaction(user_id, item_id, weight * scale)
+            return
+        
+        user_items = self.user_item_matrix.get(user_id, {})
+        if item_id in user_items:
+            # Not a new co-occurrence: mass and neighbours are unchanged
+            user_items[item_id] = max(user_items[item_id], weight * scale)
+            return
+        
+        row = self._item_index.get(item_id)
+        if row is None:
+            row = self._add_item(item_id)
+        
+        history = [self._item_index[other] for other in user_items]
+        mass = self._item_mass[:self._n_items]
+        old_mass = mass[row]
+        
+        # Co-occurrence of this item with its neighbours and the user's history
+        co_counts: Dict[int, float] = {}
+        for col, sim in zip(self._neighbor_idx[row], self._neighbor_sim[row]):
+            if col < 0:
+                break
+            co_counts[int(col)] = sim * (old_mass + mass[col]) / (1 + sim)
+        for col in history:
+            if col not in co_counts:
+                sim = self._neighbor_similarity(col, row)
+                co_counts[col] = sim * (old_mass + mass[col]) / (1 + sim)
+            co_counts[col] += scale
+        
+        mass[row] += scale
+        cols = np.fromiter(co_counts.keys(), dtype=np.int32, count=len(co_counts))
+        co = np.fromiter(co_counts.values(), dtype=np.float64, count=len(co_counts))
+        sims = co / (mass[row] + mass[cols] - co)
+        
+        order = top_k_indices(sims, self.top_k)
+        self._neighbor_idx[row] = -1
+        self._neighbor_sim[row] = 0.0
+        self._neighbor_idx[row, :order.size] = cols[order]
+        self._neighbor_sim[row, :order.size] = sims[order]
+        
+        # Similarity is symmetric: mirror the new scores into the other rows
+        for col, sim in zip(cols, sims):
+            self._set_neighbor(col, row, float(sim))
+        
+        user_items = self.user_item_matrix[user_id]
+        user_items[item_id] = max(user_items.get(item_id, 0.0), weight * scale)
+        self.item_users[item_id].add(user_id)
+    
+    def _cache_key(self, item_id: int, top_k: int) -> Tuple[int, int, int, int]:
+        """Similarity cache key, unique per snapshot version and local change"""
+        return (self.snapshot_version, self._generation, item_id, top_k)
     
     def compute_item_similarity(self, item_id: int, top_k: int = 20) -> Dict[int, float]:
         """Compute similarity between items using co-occurrence"""
-        if item_id in self.item_similarity:
-            return self.item_similarity[item_id]
+        if self.use_sparse:
+            self._ensure_index()
+            idx = self._item_index.get(item_id)
+            if idx is None:
+                return {}
+            cols = self._neighbor_idx[idx, :top_k]
+            sims = self._neighbor_sim[idx, :top_k]
+            valid = cols >= 0
+            return {
+                int(self._item_ids[c]): float(s) for c, s in zip(cols[valid], sims[valid])
+            }
+        
+        cached = self.item_similarity.get(self._cache_key(item_id, top_k))
+        if cached is not None:
+            return cached
         
         users_who_liked = self.item_users.get(item_id, set())
         if not users_who_liked:
@@ -80,9 +457,10 @@ class CollaborativeFilter:
         
         # Keep top K similar items
         sorted_items = sorted(similarity_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
-        self.item_similarity[item_id] = dict(sorted_items)
+        similar = dict(sorted_items)
+        self.item_similarity.set(self._cache_key(item_id, top_k), similar)
         
-        return self.item_similarity[item_id]
+        return similar
     
     def recommend_for_user(self, user_id: int, limit: int = 10) -> List[Tuple[int, float]]:
         """Get recommendations for a user based on their history"""
@@ -90,6 +468,9 @@ class CollaborativeFilter:
         if not user_items:
             return []
         
+        if self.use_sparse:
+            return self._recommend_sparse(user_id, limit)
+        
         candidate_scores = defaultdict(float)
         
         for item_id, user_weight in user_items.items():
@@ -102,25 +483,127 @@ class CollaborativeFilter:
         # Sort by score and return top items
         sorted_candidates = sorted(candidate_scores.items(), key=lambda x: x[1], reverse=True)
         return sorted_candidates[:limit]
+    
+    def _recommend_sparse(self, user_id: int, limit: int) -> List[Tuple[int, float]]:
+        """Score candidates by gathering neighbour rows of the user's items"""
+        self._ensure_index()
+        user_items = self.user_item_matrix[user_id]
+        seen = np.fromiter(
+            (self._item_index[item_id] for item_id in user_items), dtype=np.int64, count=len(user_items)
+        )
+        user_weights = np.fromiter(user_items.values(), dtype=np.float64, count=len(user_items))
+        # Streamed weights are stored in decay-scaled units
+        user_weights = user_weights / self._decay_scale(time.time())
+        
+        neighbors = self._neighbor_idx[seen]
+        contributions = self._neighbor_sim[seen] * user_weights[:, None]
+        
+        valid = (neighbors >= 0) & ~np.isin(neighbors, seen)
+        if not valid.any():
+            return []
+        
+        candidates, inverse = np.unique(neighbors[valid], return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions[valid])
+        
+        return top_k(self._item_ids[candidates], scores, limit)
 
 
 class ContentBasedFilter:
     """
     Content-based filtering using product attributes
     Uses TF-IDF for text similarity
+
+    Text is hashed into a fixed feature space, so products can be
+    vectorized chunk by chunk as they stream from the database; IDF
+    weights are fitted once the whole catalog has been seen. Only the
+    sparse matrix and the ProductCatalog columns are kept per product.
+
+    A fitted model can be saved as a snapshot of flat arrays and loaded
+    memory-mapped, so worker processes share its pages and start without
+    re-fitting.
+
+    Listing changes after a fit are applied as deltas (apply_changes):
+    changed and new listings are vectorized with the fitted IDF weights
+    into a small overlay matrix, and deactivated ones are tombstoned. The
+    fitted matrix itself is never copied or written (it may be a shared
+    memory map); the overlay is merged into it by the next full fit. Rows
+    changed since the fit are always rescored exactly, as their LSH codes
+    and precomputed neighbours are stale.
+
+    Large catalogs also get an LSH index over SVD-reduced TF-IDF vectors
+    at fit time. Similar-product queries then only rescore the LSH
+    candidates (with exact TF-IDF cosine) instead of the whole matrix.
     """
     
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
+    def __init__(
+        self,
+        use_ann: bool = True,
+        ann_min_products: int = ANN_MIN_PRODUCTS,
+        ann_dimensions: int = ANN_DIMENSIONS,
+        n_features: int = CONTENT_HASH_FEATURES
+    ):
+        # scikit-learn is imported by the first fit or transform, not at startup;
+        # a model loaded from a snapshot serves queries without it
+        self.n_features = n_features
+        self._vectorizer = None
+        self._tfidf = None
+        self._snapshot_idf: Optional[np.ndarray] = None
         self.product_vectors = None
-        self.product_ids: List[int] = []
-        self.product_data: Dict[int, Dict[str, Any]] = {}
+        # Vectors of rows added or updated since the fit, which take the
+        # place of product_vectors rows; overlay_rows holds their catalog
+        # rows in ascending order
+        self.overlay_vectors = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self.overlay_rows = np.empty(0, dtype=np.int64)
+        self.catalog = ProductCatalog()
+        self.built_at: Optional[datetime] = None
+        # Latest listing updatedAt covered by the fitted catalog
+        self.watermark: Optional[datetime] = None
+        
+        # Delta bookkeeping since the last full fit
+        self.fit_documents = 0
+        self.changed_rows = np.empty(0, dtype=bool)
+        self._changed_idx = np.empty(0, dtype=np.int64)
+        self.delta_terms = 0.0
+        self.delta_unseen_terms = 0.0
+        
+        self.use_ann = use_ann
+        self.ann_min_products = ann_min_products
+        self.ann_dimensions = ann_dimensions
+        self.ann_index: Optional[RandomProjectionLSH] = None
+    
+    @property
+    def product_ids(self) -> np.ndarray:
+        """Product ID of each matrix row"""
+        return self.catalog.product_ids
+    
+    @property
+    def vectorizer(self):
+        """HashingVectorizer for product text, built on first use"""
+        if self._vectorizer is None:
+            text = lazy_import("sklearn.feature_extraction.text")
+            self._vectorizer = text.HashingVectorizer(
+                n_features=self.n_features,
+                stop_words='english',
+                ngram_range=(1, 2),
+                alternate_sign=False,
+                norm=None
+            )
+        return self._vectorizer
     
-    def _create_product_text(self, product: Dict[str, Any]) -> str:
+    @property
+    def tfidf(self):
+        """TfidfTransformer, built on first use with any IDF weights from a snapshot"""
+        if self._tfidf is None:
+            self._tfidf = lazy_import("sklearn.feature_extraction.text").TfidfTransformer()
+            if self._snapshot_idf is not None:
+                self._tfidf.idf_ = self._snapshot_idf
+        return self._tfidf
+    
+    @tfidf.setter
+    def tfidf(self, tfidf):
+        self._tfidf = tfidf
+    
+    def _create_product_text(self, product: Mapping[str, Any]) -> str:
         """Create text representation of product for TF-IDF"""
         parts = [
             product.get('title', ''),
@@ -136,60 +619,404 @@ class ContentBasedFilter:
         
         return ' '.join(filter(None, parts)).lower()
     
+    def transform_chunk(
+        self,
+        products: Sequence[Mapping[str, Any]]
+    ) -> Tuple[sparse.csr_matrix, ProductCatalog]:
+        """
+        Hash one chunk of products into term counts.
+        
+        Args:
+            products: Product dicts or database Records
+        
+        Returns:
+            (term count matrix, catalog columns) for the chunk
+        """
+        if not products:
+            # HashingVectorizer cannot transform an empty batch (a tombstone-only delta)
+            counts = sparse.csr_matrix((0, self.n_features), dtype=np.float32)
+        else:
+            counts = self.vectorizer.transform(self._create_product_text(p) for p in products)
+        return counts.astype(np.float32), ProductCatalog.from_products(products)
+    
     def fit(self, products: List[Dict[str, Any]]):
         """Fit the vectorizer on product data"""
         if not products:
             return
+        self.fit_chunks([self.transform_chunk(products)])
+    
+    def fit_chunks(self, chunks: Iterable[Tuple[sparse.csr_matrix, ProductCatalog]]):
+        """
+        Fit IDF weights over chunks from transform_chunk and index the result
         
-        self.product_ids = [p['id'] for p in products]
-        self.product_data = {p['id']: p for p in products}
+        Args:
+            chunks: (term counts, catalog) pairs covering the whole catalog
+        """
+        counts, catalogs = [], []
+        for chunk_counts, chunk_catalog in chunks:
+            counts.append(chunk_counts)
+            catalogs.append(chunk_catalog)
+        if not counts:
+            return
         
-        texts = [self._create_product_text(p) for p in products]
+        self.catalog = ProductCatalog.concat(catalogs)
+        self.built_at = datetime.utcnow()
+        self._reset_delta_state()
         
         try:
-            self.product_vectors = self.vectorizer.fit_transform(texts)
-            logger.info(f"Content-based filter fitted on {len(products)} products")
+            matrix = sparse.vstack(counts, format='csr')
+            del counts
+            self.product_vectors = self.tfidf.fit_transform(matrix).astype(np.float32)
+            logger.info(f"Content-based filter fitted on {len(self.catalog)} products")
         except Exception as e:
             logger.error(f"Error fitting content-based filter: {e}")
             self.product_vectors = None
+        
+        self.ann_index = None
+        if self.use_ann and self.product_vectors is not None \
+                and len(self.catalog) >= self.ann_min_products:
+            self._build_ann_index()
+    
+    def _reset_delta_state(self) -> None:
+        n = len(self.catalog)
+        self.fit_documents = n
+        self.changed_rows = np.zeros(n, dtype=bool)
+        self._changed_idx = np.empty(0, dtype=np.int64)
+        self.overlay_vectors = sparse.csr_matrix((0, self.n_features), dtype=np.float32)
+        self.overlay_rows = np.empty(0, dtype=np.int64)
+        self.delta_terms = 0.0
+        self.delta_unseen_terms = 0.0
+    
+    @property
+    def vocabulary_drift(self) -> float:
+        """Share of term occurrences in delta rows whose features the fit never saw"""
+        return self.delta_unseen_terms / self.delta_terms if self.delta_terms else 0.0
+    
+    def apply_changes(
+        self,
+        changes: Sequence[Mapping[str, Any]],
+        max_changed_fraction: float = CONTENT_DELTA_MAX_FRACTION,
+        drift_threshold: float = CONTENT_DRIFT_THRESHOLD
+    ) -> Optional["ContentBasedFilter"]:
+        """
+        Apply listings created, updated or deactivated since the fit.
+        
+        The current filter is left untouched (it may be memory-mapped and
+        in use); the result is a new filter sharing the fitted matrix, IDF
+        weights and ANN index, with the changed rows in its overlay.
+        
+        Args:
+            changes: Rows from database.get_catalog_changes, oldest first
+            max_changed_fraction: Re-fit once this share of rows has changed
+            drift_threshold: Re-fit once vocabulary_drift exceeds this
+        
+        Returns:
+            The updated filter, or None when a full re-fit is due
+        """
+        if self.product_vectors is None:
+            return None
+        
+        # A listing changed twice in the window keeps its latest version
+        latest = list({row['id']: row for row in changes}.values())
+        upserts = [row for row in latest if row.get('active', True)]
+        catalog = self.catalog
+        tombstones = np.array([
+            row for row in (catalog.row_of(r['id']) for r in latest if not r.get('active', True))
+            if row is not None
+        ], dtype=np.int64)
+        
+        counts, part = self.transform_chunk(upserts)
+        vectors = self.tfidf.transform(counts).astype(np.float32) if upserts else counts
+        # Features absent at fit time carry the maximum smoothed IDF, ln(1 + n) + 1;
+        # the next value down is ln2 lower, so float32 rounding cannot blur them
+        unseen = self.tfidf.idf_ >= np.log(1 + self.fit_documents) + 1 - 1e-3
+        delta_terms = self.delta_terms + float(counts.sum())
+        delta_unseen_terms = self.delta_unseen_terms + float((counts @ unseen.astype(np.float32)).sum())
+        
+        rows = np.array([catalog.row_of(pid) for pid in part.product_ids.tolist()], dtype=object)
+        existing = np.array([r is not None for r in rows], dtype=bool)
+        updated = rows[existing].astype(np.int64)
+        n_old, n_new = len(catalog), int((~existing).sum())
+        
+        changed = np.concatenate([self.changed_rows, np.ones(n_new, dtype=bool)])
+        changed[updated] = True
+        changed[tombstones] = True
+        if changed.sum() > max_changed_fraction * self.fit_documents \
+                or (delta_terms and delta_unseen_terms / delta_terms > drift_threshold):
+            return None
+        
+        # Overlay rows superseded or tombstoned by this delta are dropped, so
+        # the overlay never holds more rows than have changed
+        targets = np.empty(len(part), dtype=np.int64)
+        targets[existing] = updated
+        targets[~existing] = n_old + np.arange(n_new)
+        kept = ~np.isin(self.overlay_rows, np.concatenate([updated, tombstones]))
+        overlay_rows = np.concatenate([self.overlay_rows[kept], targets])
+        order = np.argsort(overlay_rows, kind='stable')
+        overlay = sparse.vstack([self.overlay_vectors[kept], vectors], format='csr')[order]
+        
+        columns = {}
+        for name in COLUMNS:
+            column = np.concatenate([getattr(catalog, name), getattr(part, name)[~existing]])
+            column[updated] = getattr(part, name)[existing]
+            columns[name] = column
+        columns['active'][tombstones] = False
+        
+        content = ContentBasedFilter(
+            use_ann=self.use_ann,
+            ann_min_products=self.ann_min_products,
+            ann_dimensions=self.ann_dimensions,
+            n_features=self.n_features
+        )
+        content.tfidf = self.tfidf
+        content.ann_index = self.ann_index
+        content.product_vectors = self.product_vectors
+        content.overlay_vectors = overlay
+        content.overlay_rows = overlay_rows[order]
+        content.catalog = ProductCatalog(**columns)
+        content.catalog.sorted_order()
+        content.built_at = self.built_at
+        stamps = [row['updated_at'] for row in latest if row.get('updated_at')]
+        content.watermark = max(stamps + ([self.watermark] if self.watermark else []), default=None)
+        content.fit_documents = self.fit_documents
+        content.changed_rows = changed
+        content._changed_idx = np.flatnonzero(changed)
+        content.delta_terms = delta_terms
+        content.delta_unseen_terms = delta_unseen_terms
+        return content
+    
+    def merged_vectors(self) -> Optional[sparse.csr_matrix]:
+        """Vectors of every catalog row, with the overlay merged in (a copy only when there is one)"""
+        if self.product_vectors is None or not self.overlay_rows.size:
+            return self.product_vectors
+        n, n_base = len(self.catalog), self.product_vectors.shape[0]
+        base = sparse.vstack([
+            self.product_vectors,
+            sparse.csr_matrix((n - n_base, self.product_vectors.shape[1]), dtype=np.float32)
+        ], format='csr')
+        keep = np.ones(n, dtype=np.float32)
+        keep[self.overlay_rows] = 0.0
+        placement = sparse.csr_matrix(
+            (np.ones(self.overlay_rows.size, dtype=np.float32),
+             (self.overlay_rows, np.arange(self.overlay_rows.size))),
+            shape=(n, self.overlay_rows.size)
+        )
+        matrix = (sparse.diags(keep) @ base + placement @ self.overlay_vectors).tocsr()
+        matrix.eliminate_zeros()
+        return matrix
+    
+    def _overlay_slots(self, rows: np.ndarray) -> np.ndarray:
+        """Overlay row of each catalog row, or -1 where the fitted row applies"""
+        slots = np.searchsorted(self.overlay_rows, rows)
+        found = slots < self.overlay_rows.size
+        found[found] = self.overlay_rows[slots[found]] == rows[found]
+        return np.where(found, slots, -1)
+    
+    def _row_vector(self, idx: int) -> sparse.csr_matrix:
+        slot = self._overlay_slots(np.array([idx], dtype=np.int64))[0]
+        return self.overlay_vectors[slot] if slot >= 0 else self.product_vectors[idx]
+    
+    def _score_rows(self, query: sparse.csr_matrix, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dot product of query with the given catalog rows (all rows when None)"""
+        if rows is None:
+            scores = np.zeros(len(self.catalog), dtype=np.float32)
+            scores[:self.product_vectors.shape[0]] = (self.product_vectors @ query.T).toarray().ravel()
+            if self.overlay_rows.size:
+                scores[self.overlay_rows] = (self.overlay_vectors @ query.T).toarray().ravel()
+            return scores
+        
+        slots = self._overlay_slots(rows)
+        fitted = slots < 0
+        scores = np.empty(rows.size, dtype=np.float32)
+        scores[fitted] = (self.product_vectors[rows[fitted]] @ query.T).toarray().ravel()
+        if not fitted.all():
+            scores[~fitted] = (self.overlay_vectors[slots[~fitted]] @ query.T).toarray().ravel()
+        return scores
+    
+    def is_changed(self, product_id: int) -> bool:
+        """Whether a product was added or updated by a delta since the fit"""
+        idx = self.catalog.row_of(product_id)
+        return idx is not None and bool(self.changed_rows[idx])
+    
+    def is_tombstoned(self, product_id: int) -> bool:
+        """Whether a product was deactivated by a delta since the fit"""
+        idx = self.catalog.row_of(product_id)
+        return idx is not None and not self.catalog.active[idx]
+    
+    def category_of(self, product_id: int) -> Optional[int]:
+        """Category of a fitted product, or None when unknown"""
+        idx = self.catalog.row_of(product_id)
+        if idx is None:
+            return None
+        category = int(self.catalog.category_ids[idx])
+        return None if category == NO_CATEGORY else category
+    
+    def _build_ann_index(self):
+        """Build the LSH index over SVD-reduced, L2-normalized TF-IDF vectors"""
+        n_features = self.product_vectors.shape[1]
+        if n_features > self.ann_dimensions:
+            decomposition = lazy_import("sklearn.decomposition")
+            svd = decomposition.TruncatedSVD(n_components=self.ann_dimensions, random_state=42)
+            reduced = svd.fit_transform(self.product_vectors)
+        else:
+            reduced = self.product_vectors.toarray()
+        
+        normalize = lazy_import("sklearn.preprocessing").normalize
+        self.ann_index = RandomProjectionLSH().fit(normalize(reduced))
+    
+    def save_snapshot(self, directory: str = CONTENT_SNAPSHOT_DIR) -> Optional[str]:
+        """
+        Save the fitted model (IDF weights, CSR matrix, catalog columns and
+        ANN index) as a new snapshot version
+        
+        Returns:
+            Path of the written version, or None if nothing is fitted
+        """
+        if self.product_vectors is None:
+            return None
+        
+        vectors = self.merged_vectors()
+        arrays = {
+            "idf": self.tfidf.idf_,
+            "matrix_data": vectors.data,
+            "matrix_indices": vectors.indices,
+            "matrix_indptr": vectors.indptr,
+            # Sorted here once rather than in every worker
+            "id_order": self.catalog.sorted_order(),
+            "changed_rows": self.changed_rows,
+            **{name: getattr(self.catalog, name) for name in COLUMNS}
+        }
+        if self.ann_index is not None:
+            arrays.update({f"ann_{k}": v for k, v in self.ann_index.get_arrays().items()})
+        
+        target = save_arrays(
+            directory,
+            arrays,
+            {
+                "format": CONTENT_SNAPSHOT_FORMAT,
+                "n_features": self.n_features,
+                "shape": list(vectors.shape),
+                "watermark": _isoformat(self.watermark),
+                "fit_documents": self.fit_documents,
+                "delta_terms": self.delta_terms,
+                "delta_unseen_terms": self.delta_unseen_terms
+            },
+            self.built_at or datetime.utcnow()
+        )
+        logger.info(f"Content model snapshot saved to {target}")
+        return target
+    
+    @classmethod
+    def load_snapshot(
+        cls,
+        directory: str = CONTENT_SNAPSHOT_DIR,
+        max_age_seconds: Optional[float] = None,
+        **kwargs
+    ) -> Optional["ContentBasedFilter"]:
+        """
+        Load the current snapshot memory-mapped
+        
+        Args:
+            directory: Snapshot root directory
+            max_age_seconds: Ignore snapshots built longer ago than this
+            **kwargs: ContentBasedFilter arguments
+        
+        Returns:
+            The restored filter, or None if there is no usable snapshot
+        """
+        snapshot = load_arrays(directory)
+        if snapshot is None:
+            return None
+        arrays, meta = snapshot
+        
+        content = cls(**kwargs)
+        if meta.get("format") != CONTENT_SNAPSHOT_FORMAT \
+                or meta.get("n_features") != content.n_features:
+            logger.info("Ignoring content model snapshot built with other settings")
+            return None
+        age = (datetime.utcnow() - meta["built_at"]).total_seconds()
+        if max_age_seconds is not None and age > max_age_seconds:
+            logger.info(f"Ignoring content model snapshot {age:.0f}s old")
+            return None
+        
+        content._snapshot_idf = arrays["idf"]
+        content.product_vectors = sparse.csr_matrix(
+            (arrays["matrix_data"], arrays["matrix_indices"], arrays["matrix_indptr"]),
+            shape=tuple(meta["shape"]),
+            copy=False
+        )
+        content.catalog = ProductCatalog(
+            id_order=arrays["id_order"], **{name: arrays[name] for name in COLUMNS}
+        )
+        if "ann_codes" in arrays:
+            content.ann_index = RandomProjectionLSH.from_arrays(
+                {k[len("ann_"):]: v for k, v in arrays.items() if k.startswith("ann_")}
+            )
+        content.built_at = meta["built_at"]
+        if meta.get("watermark"):
+            content.watermark = datetime.fromisoformat(meta["watermark"])
+        content.fit_documents = meta["fit_documents"]
+        content.changed_rows = arrays["changed_rows"]
+        content._changed_idx = np.flatnonzero(content.changed_rows)
+        content.delta_terms = meta["delta_terms"]
+        content.delta_unseen_terms = meta["delta_unseen_terms"]
+        return content
     
     def get_similar_products(
         self, 
         product_id: int, 
         limit: int = 10,
-        exclude_same_seller: bool = True
+        exclude_same_seller: bool = True,
+        exact: bool = False
     ) -> List[Tuple[int, float]]:
-        """Find similar products based on content"""
-        if self.product_vectors is None or product_id not in self.product_data:
+        """
+        Find similar products based on content.
+        Uses the ANN index when built, unless exact=True.
+        """
+        idx = self.catalog.row_of(product_id)
+        if self.product_vectors is None or idx is None or not self.catalog.active[idx]:
             return []
         
-        try:
-            idx = self.product_ids.index(product_id)
-        except ValueError:
-            return []
+        # Rows changed since the fit have stale LSH codes
+        if self.ann_index is not None and not exact and not self.changed_rows[idx]:
+            results = self._get_similar_products_ann(idx, limit, exclude_same_seller)
+            if len(results) >= limit:
+                return results
         
-        product_vector = self.product_vectors[idx]
-        similarities = cosine_similarity(product_vector, self.product_vectors).flatten()
+        # TF-IDF rows are L2-normalized, so the dot product is the cosine
+        similarities = self._score_rows(self._row_vector(idx))
         
-        # Get product's seller for exclusion
-        source_seller = self.product_data[product_id].get('seller_id')
+        # Exclude the product itself, tombstones and, optionally, its seller's listings
+        mask = np.array(self.catalog.active, dtype=bool)
+        mask[idx] = False
+        source_seller = self.catalog.seller_ids[idx]
+        if exclude_same_seller and source_seller:
+            mask &= self.catalog.seller_ids != source_seller
         
-        # Create list of (product_id, similarity) excluding self
-        results = []
-        for i, sim in enumerate(similarities):
-            pid = self.product_ids[i]
-            if pid == product_id:
-                continue
-            
-            if exclude_same_seller and source_seller:
-                if self.product_data[pid].get('seller_id') == source_seller:
-                    continue
-            
-            results.append((pid, float(sim)))
+        return top_k(self.product_ids, similarities, limit, mask=mask)
+    
+    def _get_similar_products_ann(
+        self,
+        idx: int,
+        limit: int,
+        exclude_same_seller: bool
+    ) -> List[Tuple[int, float]]:
+        """Rescore LSH candidates, plus rows changed since the fit, with exact TF-IDF cosine"""
+        candidates = np.union1d(self.ann_index.query_row(idx), self._changed_idx)
+        candidates = candidates[(candidates != idx) & self.catalog.active[candidates]]
+        
+        source_seller = self.catalog.seller_ids[idx]
+        if exclude_same_seller and source_seller:
+            candidates = candidates[self.catalog.seller_ids[candidates] != source_seller]
+        if candidates.size == 0:
+            return []
         
-        # Sort by similarity
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:limit]
+        # TF-IDF rows are L2-normalized, so the dot product is the cosine
+        scores = self._score_rows(self._row_vector(idx), candidates)
+        return [
+            (int(self.product_ids[candidates[i]]), float(scores[i]))
+            for i in top_k_indices(scores, limit)
+        ]
     
     def recommend_for_profile(
         self,
@@ -198,34 +1025,24 @@ class ContentBasedFilter:
         limit: int = 10
     ) -> List[Tuple[int, float]]:
         """Recommend products based on user profile preferences"""
-        if not self.product_data:
+        catalog = self.catalog
+        if not len(catalog):
             return []
         
-        candidates = []
         min_price, max_price = price_range
         
-        for pid, product in self.product_data.items():
-            score = 0.0
-            
-            # Category match
-            if product.get('category_id') in preferred_categories:
-                score += 0.5
-            
-            # Price range match
-            price = product.get('price', 0)
-            if min_price is not None and max_price is not None:
-                if min_price <= price <= max_price:
-                    score += 0.3
-            
-            # Popularity boost
-            view_count = product.get('view_count', 0)
-            score += min(0.2, view_count / 10000)
-            
-            if score > 0:
-                candidates.append((pid, score))
+        # Category match
+        scores = np.where(np.isin(catalog.category_ids, preferred_categories), 0.5, 0.0)
+        
+        # Price range match
+        if min_price is not None and max_price is not None:
+            in_range = (catalog.prices >= min_price) & (catalog.prices <= max_price)
+            scores += np.where(in_range, 0.3, 0.0)
+        
+        # Popularity boost
+        scores += np.minimum(0.2, catalog.view_counts / 10000)
         
-        candidates.sort(key=lambda x: x[1], reverse=True)
-        return candidates[:limit]
+        return top_k(catalog.product_ids, scores, limit, mask=(scores > 0) & catalog.active)
 
 
 class RecommendationEngine:
@@ -236,22 +1053,383 @@ class RecommendationEngine:
     def __init__(self):
         self.collaborative = CollaborativeFilter()
         self.content_based = ContentBasedFilter()
+        self.similarity_table: Optional[SimilarityTable] = None
+        self.trending = TrendingIndex()
+        self._table_task: Optional[asyncio.Task] = None
         self._initialized = False
+        self._refresh_lock = asyncio.Lock()
+        self._content_lock = asyncio.Lock()
+        self.content_snapshot_dir = CONTENT_SNAPSHOT_DIR
+        self.similarity_table_dir = SIMILARITY_TABLE_DIR
+        # Streamed interactions the snapshot query cannot return, as
+        # (user_id, product_id, weight, timestamp); replayed into every rebuild
+        self._streamed: Deque[Tuple[int, int, float, float]] = deque(maxlen=STREAMED_INTERACTIONS_MAX)
+        self._streamed_count = 0
+        # Streamed persisted-type interactions not yet covered by a snapshot read
+        self._persisted_deltas: Deque[Tuple[int, int, float, float]] = deque(maxlen=STREAMED_INTERACTIONS_MAX)
     
     async def initialize(self):
         """Initialize the engine with data from database"""
         if self._initialized:
             return
         
+        # Serve the last precomputed table until a newer one is published
+        await self.sync_similarity_table()
+        
         try:
-            # Load products for content-based filtering
-            products = await database.get_active_products(limit=1000)
-            self.content_based.fit(products)
+            # Workers share a recent snapshot; otherwise fit and publish one
+            content = await asyncio.to_thread(
+                ContentBasedFilter.load_snapshot,
+                self.content_snapshot_dir,
+                max_age_seconds=CONTENT_SNAPSHOT_MAX_AGE_SECONDS
+            )
+            fitted = content is None
+            if content is not None:
+                self.content_based = content
+                logger.info(f"Content model loaded from snapshot of {len(content.catalog)} products")
+            else:
+                self.content_based = await self.build_content_model()
+                await self._save_content_snapshot()
             
             self._initialized = True
             logger.info("Recommendation engine initialized")
         except Exception as e:
             logger.error(f"Failed to initialize recommendation engine: {e}")
+            return
+        
+        # Only the worker that fitted the model computes its table; the
+        # others load it once published (see sync_similarity_table)
+        if fitted:
+            self._table_task = asyncio.create_task(self.refresh_similarity_table())
+        
+        try:
+            await self.refresh_interactions()
+        except Exception as e:
+            logger.error(f"Failed to load interaction snapshot: {e}")
+        
+        try:
+            await self.refresh_trending()
+        except Exception as e:
+            logger.error(f"Failed to build trending index: {e}")
+    
+    async def build_content_model(self) -> ContentBasedFilter:
+        """
+        Fit a new content model on every active listing, one cursor chunk
+        at a time. Each chunk is hashed off the event loop and its rows are
+        dropped, so the catalog is never held as a list of rows.
+        """
+        content = ContentBasedFilter()
+        chunks = []
+        async for watermark, rows in database.iter_active_product_chunks():
+            chunks.append(await asyncio.to_thread(content.transform_chunk, rows))
+            content.watermark = watermark
+        await asyncio.to_thread(content.fit_chunks, chunks)
+        return content
+    
+    async def refresh_content(self, force: bool = False) -> bool:
+        """
+        Bring the content model up to date if the catalog changed since it
+        was fitted.
+        
+        In order of preference the new model is: a snapshot another worker
+        already published for the current watermark, the current model with
+        the changed listings applied as a delta, or a full re-fit (when the
+        delta is too large or has drifted too far from the fitted IDF). It
+        is built into a separate object while requests keep using the
+        current one, then swapped in with a single assignment.
+        
+        Args:
+            force: Re-fit even if the watermark has not moved
+        
+        Returns:
+            Whether a new model was swapped in
+        """
+        async with self._content_lock:
+            watermark = await database.get_catalog_watermark()
+            current = self.content_based
+            if not force and current.product_vectors is not None \
+                    and not _watermark_moved(current.watermark, watermark):
+                return False
+            
+            content, source = None, "fit"
+            if not force:
+                content = await asyncio.to_thread(
+                    ContentBasedFilter.load_snapshot, self.content_snapshot_dir
+                )
+                source = "snapshot"
+                if content is not None and _watermark_moved(content.watermark, watermark):
+                    content = None
+                if content is None:
+                    content = await self._apply_content_delta(current)
+                    source = "delta"
+            if content is None:
+                content = await self.build_content_model()
+                source = "fit"
+            if content.product_vectors is None:
+                logger.warning("Content refresh produced an empty model; keeping the current one")
+                return False
+            
+            self.content_based = content
+            logger.info(
+                f"Content model swapped in from {source} for {len(content.catalog)} products "
+                f"(watermark {content.watermark})"
+            )
+            if source == "fit":
+                await self._save_content_snapshot()
+        
+        # Deltas leave the table as is; changed rows bypass it until the next
+        # fit. A snapshot's table is computed by the worker that fitted it.
+        if source == "fit" and (self._table_task is None or self._table_task.done()):
+            self._table_task = asyncio.create_task(self.refresh_similarity_table())
+        return True
+    
+    async def _apply_content_delta(self, current: ContentBasedFilter) -> Optional[ContentBasedFilter]:
+        """Current model with listings changed since its watermark applied, or None to re-fit"""
+        if current.product_vectors is None or current.watermark is None:
+            return None
+        
+        changes = await database.get_catalog_changes(current.watermark, CONTENT_DELTA_MAX_ROWS + 1)
+        # Hydrated details of changed listings are stale whether or not the delta applies
+        for row in changes:
+            database.product_cache.pop(row['id'], None)
+        if len(changes) > CONTENT_DELTA_MAX_ROWS:
+            logger.info(f"More than {CONTENT_DELTA_MAX_ROWS} listings changed; re-fitting content model")
+            return None
+        
+        try:
+            content = await asyncio.to_thread(current.apply_changes, changes)
+        except Exception as e:
+            logger.error(f"Error applying catalog changes to content model: {e}")
+            return None
+        if content is None:
+            logger.info(
+                f"Content deltas changed too much since the fit "
+                f"(drift {current.vocabulary_drift:.2f}); re-fitting"
+            )
+        return content
+    
+    async def _save_content_snapshot(self):
+        try:
+            await asyncio.to_thread(self.content_based.save_snapshot, self.content_snapshot_dir)
+        except Exception as e:
+            logger.warning(f"Could not save content model snapshot: {e}")
+    
+    async def refresh_similarity_table(self):
+        """
+        Precompute top-k similar products for the fitted catalog, persist
+        the table and swap in its memory-mapped copy.
+        """
+        content = self.content_based
+        if content.product_vectors is None:
+            return
+        
+        table = self.similarity_table
+        if table is not None and table.content_built_at is not None \
+                and content.built_at is not None and table.content_built_at >= content.built_at:
+            return
+        
+        try:
+            table = await asyncio.to_thread(
+                build_similarity_table,
+                content.merged_vectors(),
+                np.asarray(content.product_ids, dtype=np.int64),
+                content.catalog.seller_ids
+            )
+            table.content_built_at = content.built_at
+            await asyncio.to_thread(table.save, self.similarity_table_dir)
+            self.similarity_table = await asyncio.to_thread(SimilarityTable.load, self.similarity_table_dir)
+            logger.info(f"Similarity table refreshed for {len(table)} products")
+        except Exception as e:
+            logger.error(f"Failed to refresh similarity table: {e}")
+    
+    async def sync_similarity_table(self) -> bool:
+        """
+        Swap in the similarity table another worker published, if it
+        differs from the one held.
+        
+        Returns:
+            Whether a table was loaded
+        """
+        held = self.similarity_table
+        try:
+            version = await asyncio.to_thread(current_version, self.similarity_table_dir)
+            if version is None or (held is not None and held.version == version):
+                return False
+            table = await asyncio.to_thread(SimilarityTable.load, self.similarity_table_dir)
+        except Exception as e:
+            logger.warning(f"Could not load similarity table: {e}")
+            return False
+        if table is None:
+            return False
+        self.similarity_table = table
+        logger.info(f"Similarity table {table.version} loaded for {len(table)} products")
+        return True
+    
+    async def refresh_interactions(self) -> int:
+        """
+        Rebuild the collaborative model from all users' interactions.
+        The new snapshot is built off the event loop and swapped in with a
+        single assignment, so requests only ever see a complete model.
+        """
+        async with self._refresh_lock:
+            self._expire_streamed(time.time())
+            carried, carried_count = list(self._streamed), self._streamed_count
+            # Persisted-type deltas from before the read are in its result
+            read_at = time.time()
+            interactions = await database.get_all_interactions()
+            version = self.collaborative.snapshot_version + 1
+            snapshot = await asyncio.to_thread(
+                self._build_collaborative_snapshot, interactions, version, carried, self.collaborative
+            )
+            # Replay deltas streamed during the build and persisted-type deltas
+            # newer than the read; no await until the swap
+            arrived = min(self._streamed_count - carried_count, len(self._streamed))
+            for delta in islice(self._streamed, len(self._streamed) - arrived, None):
+                snapshot.apply_interaction(*delta)
+            self._persisted_deltas = deque(
+                (delta for delta in self._persisted_deltas if delta[3] >= read_at),
+                maxlen=STREAMED_INTERACTIONS_MAX
+            )
+            for delta in self._persisted_deltas:
+                snapshot.apply_interaction(*delta)
+            if snapshot.item_similarity is not None:
+                snapshot.item_similarity.invalidate(version)
+            self.collaborative = snapshot
+            logger.info(
+                f"Interaction snapshot v{version} loaded with "
+                f"{len(interactions)} interactions"
+            )
+            return version
+    
+    async def refresh_trending(self):
+        """Reseed bid counters from the database and re-rank trending lists"""
+        buckets = await database.get_bid_buckets(hours=self.trending.max_window_hours)
+        self.trending.load_bid_buckets(buckets)
+        self.trending.rebuild()
+        logger.info(f"Trending index rebuilt from {len(buckets)} bid buckets")
+    
+    def _expire_streamed(self, now: float) -> None:
+        """Drop streamed interactions older than the retention window"""
+        cutoff = now - STREAMED_INTERACTION_RETENTION_DAYS * 86400
+        while self._streamed and self._streamed[0][3] < cutoff:
+            self._streamed.popleft()
+    
+    @staticmethod
+    def _build_collaborative_snapshot(
+        interactions: List[Dict[str, Any]],
+        version: int,
+        streamed: Sequence[Tuple[int, int, float, float]] = (),
+        previous: Optional[CollaborativeFilter] = None
+    ) -> CollaborativeFilter:
+        """
+        Build a fully indexed collaborative filter from interactions and
+        streamed deltas, with the settings and similarity cache of `previous`
+        """
+        if previous is None:
+            snapshot = CollaborativeFilter()
+        else:
+            snapshot = CollaborativeFilter(
+                use_sparse=previous.use_sparse,
+                metric=previous.metric,
+                top_k=previous.top_k,
+                chunk_size=previous.chunk_size,
+                similarity_cache=previous.item_similarity
+            )
+            snapshot.decay_rate = previous.decay_rate
+        snapshot.build_from_interactions(interactions)
+        for delta in streamed:
+            snapshot.add_decayed_interaction(*delta)
+        if snapshot.use_sparse:
+            snapshot.build_sparse_index()
+        snapshot.snapshot_version = version
+        snapshot.built_at = datetime.utcnow()
+        return snapshot
+    
+    def record_interaction(
+        self,
+        user_id: int,
+        product_id: int,
+        interaction_type: str = 'view',
+        timestamp: Optional[float] = None
+    ) -> None:
+        """Apply a streamed interaction to the live collaborative model and trending counters"""
+        weight = INTERACTION_WEIGHTS.get(interaction_type, 1.0)
+        delta = (user_id, product_id, weight, timestamp or time.time())
+        if interaction_type in PERSISTED_INTERACTION_TYPES:
+            self._persisted_deltas.append(delta)
+        else:
+            self._streamed.append(delta)
+            self._streamed_count += 1
+        
+        self.trending.record(
+            product_id,
+            interaction_type,
+            timestamp=delta[3],
+            category_id=self.content_based.category_of(product_id)
+        )
+        
+        self.collaborative.apply_interaction(*delta)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get statistics for the engine's caches"""
+        stats = {
+            "snapshot_version": self.collaborative.snapshot_version,
+            "products": database.product_cache.get_stats(),
+            "trending": self.trending.get_stats(),
+            "content_model": {
+                "products": len(self.content_based.catalog),
+                "built_at": _isoformat(self.content_based.built_at),
+                "watermark": _isoformat(self.content_based.watermark)
+            }
+        }
+        # Only the set-based similarity walk is cached
+        if self.collaborative.item_similarity is not None:
+            stats["item_similarity"] = self.collaborative.item_similarity.get_stats()
+        return stats
+    
+    async def run_interaction_refresher(
+        self,
+        interval_seconds: int = INTERACTION_REFRESH_SECONDS
+    ):
+        """Periodically rebuild the interaction snapshot in the background"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.refresh_interactions()
+            except Exception as e:
+                logger.error(f"Interaction snapshot refresh failed: {e}")
+    
+    async def run_content_refresher(
+        self,
+        interval_seconds: int = CONTENT_REFRESH_SECONDS,
+        rebuild_seconds: int = CONTENT_REBUILD_SECONDS
+    ):
+        """
+        Poll the catalog watermark and rebuild the content model when it
+        moves, or unconditionally once the model is rebuild_seconds old
+        """
+        while True:
+            await asyncio.sleep(interval_seconds)
+            built_at = self.content_based.built_at
+            force = built_at is None or \
+                (datetime.utcnow() - built_at).total_seconds() > rebuild_seconds
+            try:
+                await self.refresh_content(force=force)
+            except Exception as e:
+                logger.error(f"Content refresh failed: {e}")
+            await self.sync_similarity_table()
+    
+    async def run_trending_refresher(
+        self,
+        interval_seconds: int = TRENDING_REFRESH_SECONDS
+    ):
+        """Periodically re-materialize trending rankings in the background"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.refresh_trending()
+            except Exception as e:
+                logger.error(f"Trending refresh failed: {e}")
     
     async def get_personalized_recommendations(
         self,
@@ -263,29 +1441,18 @@ class RecommendationEngine:
         await self.initialize()
         
         recommendations = []
+        collab_recs: List[Tuple[int, float]] = []
+        content_recs: List[Tuple[int, float]] = []
         
-        # Get user profile and interactions
-        user_profile = await database.get_user_profile(user_id)
-        user_interactions = await database.get_user_interactions(user_id)
+        # Read-only view of the current interaction snapshot
+        collaborative = self.collaborative
         
-        # Build collaborative filter from user's interactions
-        self.collaborative.build_from_interactions(user_interactions)
+        # Get user profile
+        user_profile = await database.get_user_profile(user_id)
         
         if recommendation_type in [RecommendationType.COLLABORATIVE, RecommendationType.HYBRID]:
             # Get collaborative recommendations
-            collab_recs = self.collaborative.recommend_for_user(user_id, limit)
-            
-            for product_id, score in collab_recs:
-                product_data = await database.get_product_by_id(product_id)
-                if product_data:
-                    recommendations.append(
-                        RecommendedProduct(
-                            product=ProductBase(**self._normalize_product(product_data)),
-                            score=min(1.0, score / 5.0),  # Normalize score
-                            recommendation_type=RecommendationType.COLLABORATIVE,
-                            reason="Based on your purchase and browsing history"
-                        )
-                    )
+            collab_recs = collaborative.recommend_for_user(user_id, limit)
         
         if recommendation_type in [RecommendationType.CONTENT_BASED, RecommendationType.HYBRID]:
             # Get content-based recommendations from profile
@@ -295,22 +1462,39 @@ class RecommendationEngine:
                     preferred_categories=preferred_cats,
                     limit=limit
                 )
-                
-                for product_id, score in content_recs:
-                    # Avoid duplicates
-                    if any(r.product.id == product_id for r in recommendations):
-                        continue
-                    
-                    product_data = await database.get_product_by_id(product_id)
-                    if product_data:
-                        recommendations.append(
-                            RecommendedProduct(
-                                product=ProductBase(**self._normalize_product(product_data)),
-                                score=score,
-                                recommendation_type=RecommendationType.CONTENT_BASED,
-                                reason="Matches your preferences"
-                            )
-                        )
+        
+        # Hydrate both candidate lists in a single round-trip
+        products = await self._fetch_products(
+            [pid for pid, _ in collab_recs] + [pid for pid, _ in content_recs]
+        )
+        
+        for product_id, score in collab_recs:
+            product_data = products.get(product_id)
+            if product_data:
+                recommendations.append(
+                    RecommendedProduct(
+                        product=ProductBase(**self._normalize_product(product_data)),
+                        score=min(1.0, score / 5.0),  # Normalize score
+                        recommendation_type=RecommendationType.COLLABORATIVE,
+                        reason="Based on your purchase and browsing history"
+                    )
+                )
+        
+        for product_id, score in content_recs:
+            # Avoid duplicates
+            if any(r.product.id == product_id for r in recommendations):
+                continue
+            
+            product_data = products.get(product_id)
+            if product_data:
+                recommendations.append(
+                    RecommendedProduct(
+                        product=ProductBase(**self._normalize_product(product_data)),
+                        score=score,
+                        recommendation_type=RecommendationType.CONTENT_BASED,
+                        reason="Matches your preferences"
+                    )
+                )
         
         # Sort by score and limit
         recommendations.sort(key=lambda x: x.score, reverse=True)
@@ -332,15 +1516,29 @@ class RecommendationEngine:
         if not source_product:
             return []
         
-        # Content-based similarity
-        content_similar = self.content_based.get_similar_products(
-            product_id, 
-            limit=limit,
-            exclude_same_seller=not include_same_seller
-        )
+        # Content-based similarity, from the precomputed table when available
+        table = self.similarity_table
+        content = self.content_based
+        if table is not None and product_id in table and not content.is_changed(product_id):
+            # The table predates content deltas; drop listings deactivated since
+            content_similar = [
+                (pid, score) for pid, score in table.neighbors(
+                    product_id,
+                    limit=table.k,
+                    exclude_same_seller=not include_same_seller
+                )
+                if not content.is_tombstoned(pid)
+            ][:limit]
+        else:
+            content_similar = self.content_based.get_similar_products(
+                product_id, 
+                limit=limit,
+                exclude_same_seller=not include_same_seller
+            )
         
+        products = await self._fetch_products([pid for pid, _ in content_similar])
         for pid, score in content_similar:
-            product_data = await database.get_product_by_id(pid)
+            product_data = products.get(pid)
             if product_data:
                 recommendations.append(
                     RecommendedProduct(
@@ -385,6 +1583,9 @@ class RecommendationEngine:
         """Get trending products"""
         await self.initialize()
         
+        if self.trending.supports(hours):
+            return await self._get_materialized_trending(category_id, hours, limit)
+        
         trending = await database.get_trending_products(
             hours=hours,
             category_id=category_id,
@@ -409,40 +1610,130 @@ class RecommendationEngine:
         
         return recommendations
     
+    async def _get_materialized_trending(
+        self,
+        category_id: Optional[int],
+        hours: int,
+        limit: int
+    ) -> List[RecommendedProduct]:
+        """Trending products read from the pre-ranked trending index"""
+        ranked = self.trending.top(hours, category_id or None, limit)
+        products = await self._fetch_products([pid for pid, _, _ in ranked])
+        
+        recommendations = []
+        top_score = ranked[0][1] if ranked else 1.0
+        for product_id, score, bid_count in ranked:
+            product_data = products.get(product_id)
+            if product_data:
+                recommendations.append(
+                    RecommendedProduct(
+                        product=ProductBase(**self._normalize_product(product_data)),
+                        score=min(1.0, score / top_score),
+                        recommendation_type=RecommendationType.TRENDING,
+                        reason=f"Trending with {bid_count} recent bids"
+                    )
+                )
+        
+        # Quiet windows: fill up with the most viewed active listings
+        if len(recommendations) < limit:
+            recommendations.extend(
+                await self._popular_fallback(category_id, limit - len(recommendations),
+                                             exclude={r.product.id for r in recommendations})
+            )
+        
+        return recommendations
+    
+    async def _popular_fallback(
+        self,
+        category_id: Optional[int],
+        limit: int,
+        exclude: set
+    ) -> List[RecommendedProduct]:
+        """Most viewed listings of the fitted catalog, as low-score trending"""
+        catalog = self.content_based.catalog
+        if not len(catalog):
+            return []
+        
+        mask = ~np.isin(catalog.product_ids, list(exclude)) & catalog.active
+        if category_id:
+            mask &= catalog.category_ids == category_id
+        
+        popular = [pid for pid, _ in top_k(catalog.product_ids, catalog.view_counts, limit, mask=mask)]
+        products = await self._fetch_products(popular)
+        return [
+            RecommendedProduct(
+                product=ProductBase(**self._normalize_product(products[pid])),
+                score=0.0,
+                recommendation_type=RecommendationType.TRENDING,
+                reason="Popular listing"
+            )
+            for pid in popular if pid in products
+        ]
+    
     async def get_homepage_recommendations(
         self,
         user_id: Optional[int] = None,
-        limit: int = 20
-    ) -> Dict[str, List[RecommendedProduct]]:
-        """Get mixed recommendations for homepage"""
+        limit: int = 20,
+        section_timeout: float = HOMEPAGE_SECTION_TIMEOUT_SECONDS
+    ) -> Dict[str, Any]:
+        """
+        Get mixed recommendations for homepage.
+        Sections are computed concurrently, each within section_timeout; a
+        section that fails or runs over budget is returned empty and listed
+        under 'partial'.
+        """
         await self.initialize()
         
-        result = {
-            'trending': await self.get_trending_products(limit=limit // 2),
-            'featured': []
+        sections = {
+            'trending': self.get_trending_products(limit=limit // 2),
+            'featured': self._get_featured_products(limit=limit // 2)
         }
-        
         if user_id:
-            result['personalized'] = await self.get_personalized_recommendations(
+            sections['personalized'] = self.get_personalized_recommendations(
                 user_id=user_id,
                 limit=limit // 2,
                 recommendation_type=RecommendationType.HYBRID
             )
         
-        # Get featured/new arrivals
-        featured = await database.get_active_products(limit=limit // 2)
-        for product_data in featured:
-            result['featured'].append(
-                RecommendedProduct(
-                    product=ProductBase(**self._normalize_product(product_data)),
-                    score=0.7,
-                    recommendation_type=RecommendationType.CONTENT_BASED,
-                    reason="Featured listing"
-                )
-            )
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(coro, section_timeout) for coro in sections.values()),
+            return_exceptions=True
+        )
+        
+        result: Dict[str, Any] = {'partial': []}
+        for name, outcome in zip(sections, outcomes):
+            if isinstance(outcome, BaseException):
+                if isinstance(outcome, asyncio.TimeoutError):
+                    logger.warning(f"Homepage section '{name}' exceeded {section_timeout}s")
+                else:
+                    logger.error(f"Homepage section '{name}' failed: {outcome}")
+                result[name] = []
+                result['partial'].append(name)
+            else:
+                result[name] = outcome
         
         return result
     
+    async def _get_featured_products(self, limit: int) -> List[RecommendedProduct]:
+        """Get featured/new arrivals"""
+        featured = await database.get_active_products(limit=limit)
+        return [
+            RecommendedProduct(
+                product=ProductBase(**self._normalize_product(product_data)),
+                score=0.7,
+                recommendation_type=RecommendationType.CONTENT_BASED,
+                reason="Featured listing"
+            )
+            for product_data in featured
+        ]
+    
+    async def _fetch_products(self, product_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Fetch product rows for a list of recommended IDs, keyed by ID"""
+        if not product_ids:
+            return {}
+        products = await database.get_products_by_ids(product_ids)
+        return {p['id']: p for p in products}
+    
     def _normalize_product(self, product_data: Dict[str, Any]) -> Dict[str, Any]:
         """Normalize product data to match ProductBase model"""
         return {
@@ -0,0 +1,102 @@
+"""
+Benchmark: list-of-dicts TF-IDF fit vs chunked, hashed catalog streaming
+Rows are synthesized chunk by chunk to stand in for the database cursor.
+Run from the service root: python -m benchmarks.bench_catalog_load
+"""
+import gc
+import importlib.util
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+ENGINE_PATH = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'ai-core', 'src', 'recommendation_engine.py'
+)
+_spec = importlib.util.spec_from_file_location("recommendation_engine", ENGINE_PATH)
+recommendation_engine = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(recommendation_engine)
+
+SIZES = [int(n) for n in os.getenv("BENCH_SIZES", "100000,1000000").split(",")]
+CHUNK_SIZE = 5000
+
+WORDS = (
+    "iphone apple smartphone camera screen sneakers nike running shoes sport laptop "
+    "macbook keyboard ssd display handbag leather luxury strap coffee espresso grinder "
+    "beans kitchen vintage lens watch gold silver bicycle helmet guitar amplifier"
+).split()
+
+
+def synthetic_chunks(n, chunk_size=CHUNK_SIZE, seed=42):
+    """Yield product rows chunk_size at a time, like the catalog cursor"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, n, chunk_size):
+        size = min(chunk_size, n - start)
+        words = rng.integers(0, len(WORDS), (size, 8))
+        categories = rng.integers(0, 40, size)
+        prices = rng.uniform(1, 2000, size).round(2)
+        views = rng.integers(0, 20000, size)
+        sellers = rng.integers(1, 5000, size)
+        yield [
+            {
+                'id': start + i,
+                'title': ' '.join(WORDS[w] for w in words[i, :4]) + f' model{start + i}',
+                'category_id': int(categories[i]),
+                'category_name': f'category {categories[i]}',
+                'condition': 'used',
+                'price': float(prices[i]),
+                'seller_id': int(sellers[i]),
+                'view_count': int(views[i]),
+                'description': ' '.join(WORDS[w] for w in words[i, 4:]),
+            }
+            for i in range(size)
+        ]
+
+
+def dict_fit(n):
+    """The path initialize used before: every row as a dict, then one fit"""
+    content = recommendation_engine.ContentBasedFilter(use_ann=False)
+    products = [p for chunk in synthetic_chunks(n) for p in chunk]
+    vectorizer = TfidfVectorizer(max_features=1000, stop_words='english', ngram_range=(1, 2))
+    product_data = {p['id']: p for p in products}
+    vectors = vectorizer.fit_transform([content._create_product_text(p) for p in products])
+    return vectors, product_data
+
+
+def streaming_fit(n):
+    content = recommendation_engine.ContentBasedFilter(use_ann=False)
+    content.fit_chunks(content.transform_chunk(chunk) for chunk in synthetic_chunks(n))
+    return content
+
+
+def measure(fn, n):
+    """(seconds, peak traced MB); timed and traced in separate runs"""
+    gc.collect()
+    start = time.perf_counter()
+    result = fn(n)
+    elapsed = time.perf_counter() - start
+    del result
+    gc.collect()
+    
+    tracemalloc.start()
+    result = fn(n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak / 2 ** 20
+
+
+def main():
+    print(f"{'products':>12} {'dicts (s)':>10} {'dicts (MB)':>11} "
+          f"{'stream (s)':>11} {'stream (MB)':>12} {'memory':>7}")
+    for n in SIZES:
+        baseline_s, baseline_mb = measure(dict_fit, n)
+        stream_s, stream_mb = measure(streaming_fit, n)
+        print(f"{n:>12,} {baseline_s:>10.1f} {baseline_mb:>11.0f} "
+              f"{stream_s:>11.1f} {stream_mb:>12.0f} {baseline_mb / stream_mb:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
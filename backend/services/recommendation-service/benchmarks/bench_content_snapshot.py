@@ -0,0 +1,42 @@
+"""
+Benchmark: re-fitting the content model vs loading its memory-mapped snapshot
+Run from the service root: python -m benchmarks.bench_content_snapshot
+"""
+import os
+import tempfile
+import time
+
+from benchmarks.bench_catalog_load import recommendation_engine, synthetic_chunks
+
+SIZES = [int(n) for n in os.getenv("BENCH_SIZES", "100000,1000000").split(",")]
+
+
+def main():
+    ContentBasedFilter = recommendation_engine.ContentBasedFilter
+    print(f"{'products':>12} {'fit (s)':>9} {'save (s)':>9} {'load (ms)':>10} {'first query (ms)':>17}")
+    for n in SIZES:
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            content = ContentBasedFilter()
+            content.fit_chunks(content.transform_chunk(chunk) for chunk in synthetic_chunks(n))
+            fit_s = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            content.save_snapshot(directory)
+            save_s = time.perf_counter() - start
+            del content
+            
+            start = time.perf_counter()
+            loaded = ContentBasedFilter.load_snapshot(directory)
+            load_ms = (time.perf_counter() - start) * 1000
+            
+            # Page faults into the map are paid by the first queries
+            start = time.perf_counter()
+            loaded.get_similar_products(n // 2, limit=10)
+            query_ms = (time.perf_counter() - start) * 1000
+            
+            print(f"{n:>12,} {fit_s:>9.1f} {save_s:>9.2f} {load_ms:>10.1f} {query_ms:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: nearby-request lookup with the scalar haversine loop, one
+vectorized NumPy pass, and the grid-cell GeoIndex
+Requests are clustered around the sample request cities plus uniform noise.
+Run from the service root: python -m benchmarks.bench_geo
+"""
+import os
+import time
+
+import numpy as np
+
+from src.geo_index import GeoIndex, RadianCoordinates, haversine_distance, haversine_vector
+from src.logic import SAMPLE_REQUESTS
+
+SIZES = [int(n) for n in os.getenv("BENCH_SIZES", "1000,100000,1000000").split(",")]
+RADIUS_KM = 50.0
+QUERIES = 50
+BATCH = 200
+
+CITIES = np.array([(req["lat"], req["lon"]) for req in SAMPLE_REQUESTS])
+
+
+def synthetic_requests(n, seed=42):
+    """(lats, lons): 80% within a few hundred km of a sample city, 20% anywhere"""
+    rng = np.random.default_rng(seed)
+    clustered = int(n * 0.8)
+    centres = CITIES[rng.integers(0, len(CITIES), clustered)]
+    lats = np.concatenate([
+        centres[:, 0] + rng.normal(0, 1.5, clustered),
+        np.degrees(np.arcsin(rng.uniform(-1, 1, n - clustered)))
+    ])
+    lons = np.concatenate([
+        centres[:, 1] + rng.normal(0, 1.5, clustered),
+        rng.uniform(-180, 180, n - clustered)
+    ])
+    return np.clip(lats, -90, 90), (lons + 180) % 360 - 180
+
+
+def traveler_positions(n, seed=7):
+    rng = np.random.default_rng(seed)
+    centres = CITIES[rng.integers(0, len(CITIES), n)]
+    return centres[:, 0] + rng.normal(0, 0.2, n), centres[:, 1] + rng.normal(0, 0.2, n)
+
+
+def scalar_scan(requests, lat, lon):
+    """The loop find_nearby_requests ran before the index"""
+    nearby = []
+    for req in requests:
+        dist = haversine_distance(lat, lon, req["lat"], req["lon"])
+        if dist <= RADIUS_KM:
+            nearby.append((req["id"], dist))
+    nearby.sort(key=lambda x: x[1])
+    return nearby
+
+
+def vectorized_scan(coords, lat, lon):
+    distances = haversine_vector(lat, lon, coords)
+    hits = np.flatnonzero(distances <= RADIUS_KM)
+    return hits[np.argsort(distances[hits])]
+
+
+def per_call_ms(fn, positions):
+    start = time.perf_counter()
+    for lat, lon in positions:
+        fn(lat, lon)
+    return (time.perf_counter() - start) * 1000 / len(positions)
+
+
+def main():
+    print(f"{'requests':>10} {'scalar (ms)':>12} {'numpy (ms)':>11} {'index (ms)':>11} "
+          f"{'build (s)':>10} {'batch/pos (ms)':>15} {'hits':>6}")
+    for n in SIZES:
+        lats, lons = synthetic_requests(n)
+        requests = [
+            {"id": i, "lat": lat, "lon": lon}
+            for i, (lat, lon) in enumerate(zip(lats.tolist(), lons.tolist()))
+        ]
+        coords = RadianCoordinates.from_degrees(lats, lons)
+        start = time.perf_counter()
+        index = GeoIndex()
+        index.add_many(list(range(n)), lats, lons)
+        build_s = time.perf_counter() - start
+        
+        t_lats, t_lons = traveler_positions(max(QUERIES, BATCH))
+        positions = list(zip(t_lats.tolist(), t_lons.tolist()))
+        # The scalar loop gets a handful of calls at large sizes
+        scalar_positions = positions[:max(1, min(QUERIES, 5_000_000 // n))]
+        
+        scalar_ms = per_call_ms(lambda lat, lon: scalar_scan(requests, lat, lon), scalar_positions)
+        numpy_ms = per_call_ms(lambda lat, lon: vectorized_scan(coords, lat, lon), positions[:QUERIES])
+        index_ms = per_call_ms(lambda lat, lon: index.query_radius(lat, lon, RADIUS_KM), positions[:QUERIES])
+        
+        start = time.perf_counter()
+        batch = index.query_radius_many(t_lats[:BATCH], t_lons[:BATCH], RADIUS_KM)
+        batch_ms = (time.perf_counter() - start) * 1000 / BATCH
+        
+        hits = sum(len(h) for h in batch) / BATCH
+        assert [key for key, _ in index.query_radius(*positions[0], RADIUS_KM)] == \
+            vectorized_scan(coords, *positions[0]).tolist()
+        print(f"{n:>10,} {scalar_ms:>12.2f} {numpy_ms:>11.2f} {index_ms:>11.3f} "
+              f"{build_s:>10.2f} {batch_ms:>15.3f} {hits:>6.0f}")
+
+
+if __name__ == "__main__":
+    main()
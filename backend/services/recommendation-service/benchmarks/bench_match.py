@@ -0,0 +1,70 @@
+"""
+Benchmark: detected-object matching with the full scan over every request
+and with the keyword index
+Request names and keywords are drawn from a product vocabulary.
+Run from the service root: python -m benchmarks.bench_match
+"""
+import os
+import random
+import time
+
+from src import logic
+from src.request_store import RequestSnapshot, RequestStore
+
+SIZES = [int(n) for n in os.getenv("BENCH_SIZES", "1000,10000,100000").split(",")]
+QUERIES = 50
+
+BRANDS = ["apple", "samsung", "sony", "nike", "adidas", "gucci", "zara", "dyson", "canon", "lego"]
+PRODUCTS = ["iphone", "galaxy", "playstation", "jordan", "handbag", "jacket", "vacuum", "camera",
+            "headphones", "watch", "perfume", "laptop", "sneakers", "console", "lens", "blender"]
+MODIFIERS = ["pro", "max", "mini", "air", "ultra", "plus", "lite", "2024", "limited", "edition"]
+DETECTED = ["iphone", "sony headphones", "nike sneakers air", "handbag", "canon lens",
+            "coffee mug", "laptop", "smart watch", "perfume bottle", "lego set"]
+
+
+def synthetic_requests(n, seed=42):
+    rng = random.Random(seed)
+    requests = []
+    for i in range(n):
+        brand, product = rng.choice(BRANDS), rng.choice(PRODUCTS)
+        name = " ".join([brand, product] + rng.sample(MODIFIERS, rng.randint(0, 2))).title()
+        requests.append({
+            "id": f"req_{i}", "item_name": name, "location_name": "Somewhere",
+            "lat": rng.uniform(-60, 60), "lon": rng.uniform(-180, 180), "reward": 50,
+            "category": "electronics", "keywords": [brand, product]
+        })
+    return requests
+
+
+def full_scan(requests, obj, min_score=0.5):
+    """The loop match_detected_objects ran before the index"""
+    return [
+        req["id"] for req in requests
+        if logic.calculate_match_score(obj, req)[0] >= min_score
+    ]
+
+
+def per_call_ms(fn):
+    start = time.perf_counter()
+    for obj in DETECTED * (QUERIES // len(DETECTED)):
+        fn(obj)
+    return (time.perf_counter() - start) * 1000 / QUERIES
+
+
+def main():
+    print(f"{'requests':>10} {'scan (ms)':>10} {'index (ms)':>11} {'build (s)':>10} {'matches':>8}")
+    for n in SIZES:
+        requests = synthetic_requests(n)
+        start = time.perf_counter()
+        RequestSnapshot.build(requests)
+        build_s = time.perf_counter() - start
+        logic.request_store = RequestStore(requests)
+        
+        scan_ms = per_call_ms(lambda obj: full_scan(requests, obj))
+        index_ms = per_call_ms(lambda obj: logic.match_detected_objects([obj], limit=n))
+        matches = sum(len(full_scan(requests, obj)) for obj in DETECTED) / len(DETECTED)
+        print(f"{n:>10,} {scan_ms:>10.2f} {index_ms:>11.2f} {build_s:>10.2f} {matches:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
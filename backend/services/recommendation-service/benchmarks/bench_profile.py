@@ -0,0 +1,76 @@
+"""
+Benchmark: per-product loop vs columnar profile scoring
+Run from the service root: python -m benchmarks.bench_profile
+"""
+import time
+import numpy as np
+
+from src.catalog import ProductCatalog
+from src.topk import top_k
+
+SIZES = [10_000, 100_000, 1_000_000]
+LIMIT = 20
+REPEATS = 3
+PREFERRED_CATEGORIES = [3, 7, 11]
+PRICE_RANGE = (50.0, 500.0)
+
+
+def synthetic_products(n, rng):
+    categories = rng.integers(0, 40, n)
+    prices = rng.uniform(1, 2000, n).round(2)
+    views = rng.integers(0, 20000, n)
+    return [
+        {'id': i, 'category_id': int(categories[i]), 'price': float(prices[i]), 'view_count': int(views[i])}
+        for i in range(n)
+    ]
+
+
+def loop_scores(products, preferred_categories, price_range):
+    """Baseline used by recommend_for_profile before: score one dict at a time"""
+    min_price, max_price = price_range
+    product_ids = [p['id'] for p in products]
+    scores = np.zeros(len(products))
+    for i, product in enumerate(products):
+        score = 0.0
+        if product.get('category_id') in preferred_categories:
+            score += 0.5
+        price = product.get('price', 0)
+        if min_price <= price <= max_price:
+            score += 0.3
+        score += min(0.2, product.get('view_count', 0) / 10000)
+        scores[i] = score
+    return top_k(product_ids, scores, LIMIT, mask=scores > 0)
+
+
+def columnar_scores(catalog, preferred_categories, price_range):
+    min_price, max_price = price_range
+    scores = np.where(np.isin(catalog.category_ids, preferred_categories), 0.5, 0.0)
+    in_range = (catalog.prices >= min_price) & (catalog.prices <= max_price)
+    scores += np.where(in_range, 0.3, 0.0)
+    scores += np.minimum(0.2, catalog.view_counts / 10000)
+    return top_k(catalog.product_ids, scores, LIMIT, mask=scores > 0)
+
+
+def timed(fn, *args):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"{'products':>12} {'loop (ms)':>12} {'columnar (ms)':>14} {'speedup':>9}")
+    for n in SIZES:
+        products = synthetic_products(n, rng)
+        catalog = ProductCatalog.from_products(products)
+        
+        baseline = timed(loop_scores, products, PREFERRED_CATEGORIES, PRICE_RANGE)
+        fast = timed(columnar_scores, catalog, PREFERRED_CATEGORIES, PRICE_RANGE)
+        print(f"{n:>12,} {baseline:>12.2f} {fast:>14.2f} {baseline / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: service cold start (fresh interpreter to an importable app)
+Fails with a non-zero exit when the median run misses COLD_START_TARGET_SECONDS,
+so CI can gate on it. Lifespan steps (model load, connections) are reported
+at runtime by GET /health/startup instead.
+Run from the service root: python -m benchmarks.bench_startup
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from src.startup import COLD_START_TARGET_SECONDS
+
+MODULE = os.getenv("BENCH_STARTUP_MODULE", "src.main")
+RUNS = int(os.getenv("BENCH_RUNS", "5"))
+TOP = 10
+
+# Modules that should only be imported on first use, never by the app import
+DEFERRED = ("sklearn", "aio_pika", "httpx", "redis", "mlflow", "torch")
+
+TIMED_IMPORT = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    f"import {MODULE}\n"
+    "print(time.perf_counter() - start)\n"
+    "print(','.join(sorted({m.split('.')[0] for m in sys.modules})))\n"
+)
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def cold_import():
+    """(seconds, top-level modules loaded) for one fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-c", TIMED_IMPORT],
+        capture_output=True, text=True, check=True
+    )
+    seconds, modules = result.stdout.strip().splitlines()[-2:]
+    return float(seconds), set(modules.split(","))
+
+
+def slowest_imports():
+    """Top-level-ish modules by cumulative import time, from -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {MODULE}"],
+        capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Depth 0-1 entries; deeper ones are already counted by their parents
+        if match and len(match.group(3)) <= 3:
+            rows.append((int(match.group(2)) / 1e6, match.group(4)))
+    return sorted(rows, reverse=True)[:TOP]
+
+
+def main():
+    runs = []
+    for _ in range(RUNS):
+        seconds, modules = cold_import()
+        runs.append(seconds)
+    median = statistics.median(runs)
+    
+    print(f"cold import of {MODULE}: median {median:.2f}s over {RUNS} runs "
+          f"(min {min(runs):.2f}s, max {max(runs):.2f}s, target {COLD_START_TARGET_SECONDS:.2f}s)")
+    print(f"\n{'cumulative (s)':>15}  module")
+    for seconds, name in slowest_imports():
+        print(f"{seconds:>15.3f}  {name}")
+    
+    eager = sorted(set(DEFERRED) & modules)
+    if eager:
+        print(f"\nimported eagerly (should be deferred): {', '.join(eager)}")
+    
+    if median > COLD_START_TARGET_SECONDS:
+        print(f"\nFAIL: cold start {median:.2f}s exceeds {COLD_START_TARGET_SECONDS:.2f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Benchmark: full sort vs argpartition top-k selection
+Run from the service root: python -m benchmarks.bench_topk
+"""
+import time
+import numpy as np
+
+from src.topk import top_k
+
+SIZES = [10_000, 100_000, 1_000_000]
+LIMIT = 20
+REPEATS = 5
+
+
+def sort_top_k(ids, scores, k):
+    """Baseline used by the scorers before: build tuples, sort, slice"""
+    pairs = [(ids[i], float(scores[i])) for i in range(len(ids))]
+    pairs.sort(key=lambda x: x[1], reverse=True)
+    return pairs[:k]
+
+
+def timed(fn, *args):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"{'candidates':>12} {'sort (ms)':>12} {'top_k (ms)':>12} {'speedup':>9}")
+    for n in SIZES:
+        ids = list(range(n))
+        scores = rng.random(n)
+        mask = rng.random(n) > 0.1
+        
+        baseline = timed(sort_top_k, ids, scores, LIMIT)
+        fast = timed(top_k, ids, scores, LIMIT, mask)
+        print(f"{n:>12,} {baseline:>12.2f} {fast:>12.2f} {baseline / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
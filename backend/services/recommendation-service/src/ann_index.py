@@ -0,0 +1,148 @@
+"""
+Approximate Nearest Neighbour Index
+Random-projection LSH for cosine similarity over dense, reduced vectors
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import numpy as np
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RandomProjectionLSH:
+    """
+    Random-projection (SimHash) LSH index for cosine similarity.
+    
+    Each table hashes a vector to n_bits signs of random hyperplane
+    projections. Rows are kept sorted by code per table, so a bucket
+    lookup is a binary search and the index is a few flat arrays.
+    Queries probe the exact bucket plus all buckets at Hamming
+    distance 1 in every table and return the union of their rows.
+    """
+    
+    def __init__(
+        self,
+        n_tables: int = 8,
+        n_bits: Optional[int] = None,
+        bucket_size: int = 8,
+        max_candidates: int = 2000,
+        seed: int = 42
+    ):
+        """
+        Initialize LSH index
+        
+        Args:
+            n_tables: Number of independent hash tables (more = higher recall)
+            n_bits: Hyperplanes per table (None = sized so buckets average bucket_size rows)
+            bucket_size: Target rows per bucket when n_bits is derived
+            max_candidates: Upper bound on rows returned per query
+            seed: Random seed for the hyperplanes
+        """
+        if n_bits is not None and not 0 < n_bits < 31:
+            raise ValueError("n_bits must be between 1 and 30")
+        
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.bucket_size = bucket_size
+        self.max_candidates = max_candidates
+        self.seed = seed
+        
+        self._planes: Optional[np.ndarray] = None
+        self._bit_weights: Optional[np.ndarray] = None
+        self._probe_masks: Optional[np.ndarray] = None
+        self._codes: Optional[np.ndarray] = None          # (n_tables, n_rows)
+        self._sorted_codes: Optional[np.ndarray] = None   # (n_tables, n_rows)
+        self._sorted_rows: Optional[np.ndarray] = None    # (n_tables, n_rows)
+    
+    @property
+    def size(self) -> int:
+        """Number of indexed rows"""
+        return 0 if self._codes is None else self._codes.shape[1]
+    
+    def _hash(self, vectors: np.ndarray) -> np.ndarray:
+        """Hash vectors to one code per table, shape (n_tables, n_vectors)"""
+        projections = np.einsum('nd,tdb->tnb', vectors, self._planes)
+        return (projections > 0).astype(np.int32) @ self._bit_weights
+    
+    def fit(self, vectors: np.ndarray) -> "RandomProjectionLSH":
+        """Build the index over dense row vectors"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n_bits = self.n_bits
+        if n_bits is None:
+            n_bits = int(np.clip(np.round(np.log2(max(len(vectors), 1) / self.bucket_size)), 4, 24))
+        
+        rng = np.random.default_rng(self.seed)
+        self._planes = rng.standard_normal(
+            (self.n_tables, vectors.shape[1], n_bits)
+        ).astype(np.float32)
+        self._bit_weights = (1 << np.arange(n_bits)).astype(np.int32)
+        # Probe offsets: the bucket itself and every single-bit flip
+        self._probe_masks = np.concatenate([[0], self._bit_weights]).astype(np.int32)
+        
+        self._codes = self._hash(vectors)
+        order = np.argsort(self._codes, axis=1, kind='stable').astype(np.int32)
+        self._sorted_rows = order
+        self._sorted_codes = np.take_along_axis(self._codes, order, axis=1)
+        
+        logger.info(
+            f"LSH index built over {vectors.shape[0]} rows "
+            f"({self.n_tables} tables x {n_bits} bits)"
+        )
+        return self
+    
+    def get_arrays(self) -> Dict[str, np.ndarray]:
+        """Index state as flat arrays, for snapshots"""
+        return {
+            "planes": self._planes,
+            "codes": self._codes,
+            "sorted_codes": self._sorted_codes,
+            "sorted_rows": self._sorted_rows
+        }
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], **kwargs) -> "RandomProjectionLSH":
+        """Restore an index from get_arrays output (arrays may be memory-mapped)"""
+        index = cls(**kwargs)
+        index._planes = arrays["planes"]
+        n_bits = index._planes.shape[2]
+        index._bit_weights = (1 << np.arange(n_bits)).astype(np.int32)
+        index._probe_masks = np.concatenate([[0], index._bit_weights]).astype(np.int32)
+        index._codes = arrays["codes"]
+        index._sorted_codes = arrays["sorted_codes"]
+        index._sorted_rows = arrays["sorted_rows"]
+        return index
+    
+    def _lookup(self, codes: np.ndarray) -> np.ndarray:
+        """Collect rows from the probed buckets for per-table codes"""
+        found = []
+        for table, code in enumerate(codes):
+            probes = code ^ self._probe_masks
+            lo = np.searchsorted(self._sorted_codes[table], probes, side='left')
+            hi = np.searchsorted(self._sorted_codes[table], probes, side='right')
+            for start, stop in zip(lo, hi):
+                if stop > start:
+                    found.append(self._sorted_rows[table, start:stop])
+        
+        if not found:
+            return np.empty(0, dtype=np.int32)
+        
+        rows, counts = np.unique(np.concatenate(found), return_counts=True)
+        if rows.size > self.max_candidates:
+            # Keep the rows that collided in the most buckets
+            keep = np.argpartition(-counts, self.max_candidates - 1)[:self.max_candidates]
+            rows = rows[keep]
+        return rows
+    
+    def query(self, vector: np.ndarray) -> np.ndarray:
+        """Candidate rows for an arbitrary vector"""
+        if self._planes is None:
+            return np.empty(0, dtype=np.int32)
+        codes = self._hash(np.asarray(vector, dtype=np.float32).reshape(1, -1))[:, 0]
+        return self._lookup(codes)
+    
+    def query_row(self, row: int) -> np.ndarray:
+        """Candidate rows for an indexed row (includes the row itself)"""
+        if self._codes is None:
+            return np.empty(0, dtype=np.int32)
+        return self._lookup(self._codes[:, row])
@@ -9,6 +9,7 @@ from dataclasses import dataclass, field
 from datetime import datetime
 import logging
 
+from src.topk import top_k
 from .thompson_sampling import ThompsonSamplingBandit, ArmStats
 
 logger = logging.getLogger(__name__)
@@ -207,8 +208,8 @@ class ContextualBandit:
         x = context.to_vector(self.feature_names)
         
         # Compute scores for all arms
-        scores = []
-        for arm_id in available_arms:
+        scores = np.empty(len(available_arms))
+        for i, arm_id in enumerate(available_arms):
             arm = self.arms[arm_id]
             
             if arm.total_pulls < 5:
@@ -224,11 +225,9 @@ class ContextualBandit:
                 else:
                     score = expected + uncertainty
             
-            scores.append((arm_id, score))
+            scores[i] = score
         
-        # Sort and return top K
-        scores.sort(key=lambda x: x[1], reverse=True)
-        return scores[:k]
+        return top_k(available_arms, scores, k)
     
     def update(
         self,
@@ -9,6 +9,8 @@ from dataclasses import dataclass, field
 from datetime import datetime
 import logging
 
+from src.topk import top_k
+
 logger = logging.getLogger(__name__)
 
 
@@ -139,15 +141,12 @@ class ThompsonSamplingBandit:
         for arm_id in available_arms:
             self.add_arm(arm_id)
         
-        # Sample from each arm
-        samples = [
-            (arm_id, self.arms[arm_id].sample())
-            for arm_id in available_arms
-        ]
+        # Sample from every arm's Beta distribution in one call
+        alphas = np.fromiter((self.arms[a].alpha for a in available_arms), dtype=np.float64)
+        betas = np.fromiter((self.arms[a].beta for a in available_arms), dtype=np.float64)
+        samples = np.random.beta(alphas, betas)
         
-        # Sort by sampled value and return top K
-        samples.sort(key=lambda x: x[1], reverse=True)
-        return samples[:k]
+        return top_k(available_arms, samples, k)
     
     def update(self, arm_id: str, reward: float) -> None:
         """
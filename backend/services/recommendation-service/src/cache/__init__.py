@@ -0,0 +1,9 @@
+"""
+Caching Module for Recommendation Serving
+Bounded in-process caches with TTL expiry and hit/miss statistics
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+from .ttl_cache import BaseCache, TTLCache
+from .response_cache import ResponseCache, response_cache
+
+__all__ = ["BaseCache", "TTLCache", "ResponseCache", "response_cache"]
@@ -0,0 +1,243 @@
+"""
+Two-Tier Response Cache
+In-process LRU in front of an optional shared Redis tier, with request
+coalescing and stale-while-revalidate for the recommendation routes
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import asyncio
+import json
+import os
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+# How long an expired response may still be served while it is recomputed
+RESPONSE_CACHE_STALE_SECONDS = float(os.getenv("RESPONSE_CACHE_STALE_SECONDS", "300"))
+RESPONSE_CACHE_KEY_PREFIX = "reco:response:"
+
+# (fresh_until, value); fresh_until is wall-clock so Redis entries are
+# comparable across processes
+Entry = Tuple[float, Any]
+
+
+class ResponseCache:
+    """
+    Caches JSON-serializable route responses keyed by route and normalized
+    request parameters.
+    
+    Lookups go to the in-process LRU first, then Redis when a client is
+    attached. A missing key is computed once no matter how many requests
+    are waiting on it. An expired key is served stale for up to stale_seconds
+    while a single background task recomputes it. Responses the caller marks
+    as not cacheable (e.g. degraded ones) go to the waiting requests only.
+    """
+    
+    def __init__(
+        self,
+        max_size: int = RESPONSE_CACHE_SIZE,
+        stale_seconds: float = RESPONSE_CACHE_STALE_SECONDS,
+        redis_client=None
+    ):
+        """
+        Initialize response cache
+        
+        Args:
+            max_size: Maximum number of responses held in process
+            stale_seconds: Default stale-while-revalidate window
+            redis_client: Optional redis.asyncio client for the shared tier
+        """
+        self.stale_seconds = stale_seconds
+        self.redis = redis_client
+        
+        # Freshness is tracked per entry, so the LRU itself never expires
+        self._local = TTLCache(max_size=max_size, ttl_seconds=0, name="responses")
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats = {
+            "fresh_hits": 0,
+            "redis_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "computations": 0,
+            "uncached": 0,
+            "refresh_errors": 0
+        }
+    
+    @staticmethod
+    def make_key(route: str, params: Dict[str, Any]) -> str:
+        """Build a cache key that ignores parameter order"""
+        return RESPONSE_CACHE_KEY_PREFIX + route + ":" + json.dumps(
+            params, sort_keys=True, default=str, separators=(",", ":")
+        )
+    
+    async def get_or_compute(
+        self,
+        route: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+        ttl_seconds: float,
+        stale_seconds: Optional[float] = None,
+        cacheable: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        Return the cached response for (route, params), computing it if needed
+        
+        Args:
+            route: Route name, used as the key namespace
+            params: Request parameters that determine the response
+            compute: Coroutine function producing a JSON-serializable response
+            ttl_seconds: How long a response stays fresh
+            stale_seconds: Stale-while-revalidate window (defaults to the cache's)
+            cacheable: Whether a computed response may be stored (all are by default)
+        
+        Returns:
+            The cached or freshly computed response
+        """
+        if stale_seconds is None:
+            stale_seconds = self.stale_seconds
+        key = self.make_key(route, params)
+        
+        entry = self._local.get(key)
+        if entry is None:
+            entry = await self._redis_get(key)
+            if entry is not None:
+                self._local.set(key, entry)
+                self._stats["redis_hits"] += 1
+        
+        if entry is not None:
+            fresh_until, value = entry
+            now = time.time()
+            if now < fresh_until:
+                self._stats["fresh_hits"] += 1
+                return value
+            if now < fresh_until + stale_seconds:
+                self._stats["stale_hits"] += 1
+                self._revalidate(key, compute, ttl_seconds, stale_seconds, cacheable)
+                return value
+        
+        self._stats["misses"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start(key, compute, ttl_seconds, stale_seconds, cacheable)
+        else:
+            self._stats["coalesced"] += 1
+        # Shielded so a disconnecting client doesn't cancel other waiters
+        return await asyncio.shield(task)
+    
+    def _start(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl_seconds: float,
+        stale_seconds: float,
+        cacheable: Optional[Callable[[Any], bool]]
+    ) -> asyncio.Task:
+        """Start the single computation for a key"""
+        task = asyncio.create_task(
+            self._compute(key, compute, ttl_seconds, stale_seconds, cacheable)
+        )
+        self._inflight[key] = task
+        return task
+    
+    def _revalidate(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl_seconds: float,
+        stale_seconds: float,
+        cacheable: Optional[Callable[[Any], bool]]
+    ) -> None:
+        """Recompute a stale key in the background unless already in progress"""
+        if key in self._inflight:
+            return
+        task = self._start(key, compute, ttl_seconds, stale_seconds, cacheable)
+        
+        def report(finished: asyncio.Task) -> None:
+            if not finished.cancelled() and finished.exception() is not None:
+                self._stats["refresh_errors"] += 1
+                logger.warning(f"Background refresh of {key} failed: {finished.exception()}")
+        
+        task.add_done_callback(report)
+    
+    async def _compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl_seconds: float,
+        stale_seconds: float,
+        cacheable: Optional[Callable[[Any], bool]]
+    ) -> Any:
+        """Compute a response and store it in both tiers unless it is not cacheable"""
+        self._stats["computations"] += 1
+        entry = None
+        try:
+            value = await compute()
+            if cacheable is None or cacheable(value):
+                entry = (time.time() + ttl_seconds, value)
+                self._local.set(key, entry)
+            else:
+                # Any stale entry is kept; it is still better than this response
+                self._stats["uncached"] += 1
+        finally:
+            # Released here rather than in a done callback, which runs a loop
+            # iteration later and would hand the finished result to new callers
+            del self._inflight[key]
+        if entry is not None:
+            await self._redis_set(key, entry, ttl_seconds + stale_seconds)
+        return value
+    
+    async def _redis_get(self, key: str) -> Optional[Entry]:
+        if self.redis is None:
+            return None
+        try:
+            cached = await self.redis.get(key)
+            if cached:
+                data = json.loads(cached)
+                return data["fresh_until"], data["value"]
+        except Exception as e:
+            logger.warning(f"Redis get error: {e}")
+        return None
+    
+    async def _redis_set(self, key: str, entry: Entry, expire_seconds: float) -> None:
+        if self.redis is None:
+            return
+        fresh_until, value = entry
+        try:
+            await self.redis.set(
+                key,
+                json.dumps({"fresh_until": fresh_until, "value": value}, default=str),
+                ex=max(1, int(expire_seconds))
+            )
+        except Exception as e:
+            logger.warning(f"Redis set error: {e}")
+    
+    def clear(self) -> None:
+        """Drop all in-process responses"""
+        self._local.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        local = self._local.get_stats()
+        served = self._stats["fresh_hits"] + self._stats["stale_hits"] + self._stats["misses"]
+        return {
+            "name": "responses",
+            "size": local["size"],
+            "max_size": local["max_size"],
+            "evictions": local["evictions"],
+            "redis_enabled": self.redis is not None,
+            "inflight": len(self._inflight),
+            **self._stats,
+            "hit_rate": (
+                (self._stats["fresh_hits"] + self._stats["stale_hits"]) / served
+                if served else 0.0
+            )
+        }
+
+
+# Shared by the recommendation routes; main attaches Redis when configured
+response_cache = ResponseCache()
@@ -0,0 +1,143 @@
+"""
+Bounded LRU Cache with TTL Expiry
+Used for similarity lookups and other hot read paths
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BaseCache(ABC):
+    """Interface for pluggable caches"""
+    
+    @abstractmethod
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value, or default if missing or expired"""
+    
+    @abstractmethod
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value"""
+    
+    @abstractmethod
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove and return a value"""
+    
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all values"""
+    
+    @abstractmethod
+    def invalidate(self, version: Optional[int] = None) -> None:
+        """Drop all values, optionally recording the data version they now track"""
+    
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+
+
+class TTLCache(BaseCache):
+    """
+    Thread-safe LRU cache with a size bound and per-entry TTL.
+    Entries are evicted least-recently-used first once max_size is reached.
+    """
+    
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl_seconds: float = 3600.0,
+        name: str = "cache"
+    ):
+        """
+        Initialize TTL cache
+        
+        Args:
+            max_size: Maximum number of entries
+            ttl_seconds: Time to live per entry (0 = no expiry)
+            name: Name reported in statistics
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self.version: Optional[int] = None
+        
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0
+        }
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value, refreshing its LRU position"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            
+            expires_at, value = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+    
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entries if full"""
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0.0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove and return a value"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else default
+    
+    def clear(self) -> None:
+        """Remove all values"""
+        with self._lock:
+            self._data.clear()
+    
+    def invalidate(self, version: Optional[int] = None) -> None:
+        """Drop all values after the underlying data changed"""
+        with self._lock:
+            self._data.clear()
+            self._stats["invalidations"] += 1
+            if version is not None:
+                self.version = version
+        logger.debug(f"Cache {self.name} invalidated (version={version})")
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "version": self.version,
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0
+            }
@@ -0,0 +1,77 @@
+"""
+Columnar Product Catalog
+Array-per-attribute view of the active catalog for vectorized scoring
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+# Code for products without a category
+NO_CATEGORY = -1
+
+COLUMNS = ('product_ids', 'category_ids', 'prices', 'view_counts', 'seller_ids', 'active')
+
+
+@dataclass
+class ProductCatalog:
+    """
+    Product attributes stored as aligned NumPy columns.
+    Row i of every column describes the same product.
+    """
+    product_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    category_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    prices: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    view_counts: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    seller_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    # False for tombstoned rows (listings deactivated since the last full fit)
+    active: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=bool))
+    # Row order sorting product_ids; computed on first lookup unless given
+    id_order: Optional[np.ndarray] = None
+    
+    def __len__(self) -> int:
+        return len(self.product_ids)
+    
+    def sorted_order(self) -> np.ndarray:
+        """Row order sorting product_ids, computed once"""
+        if self.id_order is None:
+            self.id_order = np.argsort(self.product_ids, kind='stable')
+        return self.id_order
+    
+    def row_of(self, product_id: int) -> Optional[int]:
+        """Row holding a product ID, or None if it is not in the catalog"""
+        order = self.sorted_order()
+        pos = int(np.searchsorted(self.product_ids, product_id, sorter=order))
+        if pos < len(order) and self.product_ids[order[pos]] == product_id:
+            return int(order[pos])
+        return None
+    
+    @classmethod
+    def from_products(cls, products: Sequence[Mapping[str, Any]]) -> "ProductCatalog":
+        """Build columns from product dicts or Records as returned by the database layer"""
+        n = len(products)
+        
+        def column(key: str, dtype, default) -> np.ndarray:
+            values = (p.get(key) for p in products)
+            return np.fromiter(
+                (default if v is None else v for v in values), dtype=dtype, count=n
+            )
+        
+        return cls(
+            product_ids=column('id', np.int64, 0),
+            category_ids=column('category_id', np.int64, NO_CATEGORY),
+            prices=column('price', np.float64, 0.0),
+            view_counts=column('view_count', np.int64, 0),
+            seller_ids=column('seller_id', np.int64, 0),
+            active=column('active', bool, True)
+        )
+    
+    @classmethod
+    def concat(cls, parts: List["ProductCatalog"]) -> "ProductCatalog":
+        """Join catalogs built from consecutive chunks into one"""
+        if not parts:
+            return cls()
+        return cls(**{
+            name: np.concatenate([getattr(part, name) for part in parts]) for name in COLUMNS
+        })
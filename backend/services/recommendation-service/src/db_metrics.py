@@ -0,0 +1,129 @@
+"""
+Database Pool Metrics
+Acquire wait, connection usage and per-query latency for the asyncpg pool
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, cumulative like Prometheus buckets"""
+    
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, value: float) -> None:
+        """Record one observation"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bound)
+        return self.max
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Summary with quantile estimates and cumulative bucket counts"""
+        cumulative = {}
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            cumulative[f"le_{bound}"] = seen
+        cumulative["le_inf"] = self.count
+        return {
+            "count": self.count,
+            "sum_ms": self.sum,
+            "mean_ms": self.sum / self.count if self.count else 0.0,
+            "max_ms": self.max,
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": cumulative
+        }
+
+
+class PoolMetrics:
+    """Counters updated by Database.connection and PreparedConnection"""
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self) -> None:
+        """Start all metrics from zero"""
+        self.acquire_wait = Histogram()
+        self.acquire_timeouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.query_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.query_errors: Dict[str, int] = defaultdict(int)
+    
+    def connection_acquired(self, wait_ms: float) -> None:
+        """Record a successful acquire and how long it waited"""
+        self.acquire_wait.observe(wait_ms)
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+    
+    def connection_released(self) -> None:
+        """Record a connection returned to the pool"""
+        self.in_use -= 1
+    
+    def record_query(self, name: str, latency_ms: float, failed: bool = False) -> None:
+        """Record the latency of a named query"""
+        self.query_latency[name].observe(latency_ms)
+        if failed:
+            self.query_errors[name] += 1
+    
+    @contextmanager
+    def timed_query(self, name: str) -> Iterator[None]:
+        """Record the latency of the enclosed query under a stable name, counting errors"""
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            self.record_query(name, (time.perf_counter() - start) * 1000, failed)
+    
+    def get_stats(self, pool=None) -> Dict[str, Any]:
+        """Get pool metrics, with live pool sizes when a pool is given"""
+        stats = {
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "acquire_timeouts": self.acquire_timeouts,
+            "acquire_wait": self.acquire_wait.snapshot(),
+            "queries": {
+                name: {**histogram.snapshot(), "errors": self.query_errors.get(name, 0)}
+                for name, histogram in self.query_latency.items()
+            }
+        }
+        if pool is not None:
+            stats.update({
+                "size": pool.get_size(),
+                "idle": pool.get_idle_size(),
+                "min_size": pool.get_min_size(),
+                "max_size": pool.get_max_size()
+            })
+        return stats
+
+
+pool_metrics = PoolMetrics()
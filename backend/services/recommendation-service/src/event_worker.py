@@ -12,16 +12,19 @@ import asyncio
 import json
 import logging
 import os
-import httpx
-from typing import Dict, Any, Optional, List, Callable
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, Callable
 from datetime import datetime, timedelta
 from enum import Enum
-import aio_pika
-from aio_pika import Message, DeliveryMode, ExchangeType
 from pydantic import BaseModel, Field
 
 from src import logic
 from src.database import Database
+from src.startup import lazy_import
+
+# RabbitMQ and HTTP clients are imported by connect(); the worker is optional
+if TYPE_CHECKING:
+    import aio_pika
+    import httpx
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +40,14 @@ MAX_RETRIES = 3
 RETRY_DELAY_SECONDS = 5
 BATCH_SIZE = 10
 
+# Location updates are matched in batches: a batch is flushed when it reaches
+# LOCATION_BATCH_SIZE events and every LOCATION_BATCH_INTERVAL_SECONDS, so a
+# proximity alert is delayed by at most the interval
+LOCATION_BATCH_SIZE = int(os.getenv("LOCATION_BATCH_SIZE", str(BATCH_SIZE)))
+LOCATION_BATCH_INTERVAL_SECONDS = float(os.getenv("LOCATION_BATCH_INTERVAL_SECONDS", "5"))
+PROXIMITY_ALERT_KM = 2.0
+URGENT_PROXIMITY_KM = 0.5
+
 
 class EventType(str, Enum):
     CAMERA_DETECTION = "camera_detection"
@@ -116,7 +127,8 @@ class EventWorker:
             "events_processed": 0,
             "notifications_sent": 0,
             "errors": 0,
-            "retries": 0
+            "retries": 0,
+            "location_batches": 0
         }
         
         # Register event handlers
@@ -136,6 +148,8 @@ class EventWorker:
     async def connect(self):
         """Connect to RabbitMQ and set up queues"""
         try:
+            aio_pika = lazy_import("aio_pika")
+            httpx = lazy_import("httpx")
             self.connection = await aio_pika.connect_robust(
                 RABBITMQ_URL,
                 client_properties={"connection_name": "event_worker"}
@@ -146,7 +160,7 @@ class EventWorker:
             # Declare dead letter exchange and queue
             dlx = await self.channel.declare_exchange(
                 "traveler_events_dlx",
-                ExchangeType.DIRECT,
+                aio_pika.ExchangeType.DIRECT,
                 durable=True
             )
             
@@ -203,9 +217,10 @@ class EventWorker:
         
         try:
             # Publish to RabbitMQ queue for async processing
-            message = Message(
+            aio_pika = lazy_import("aio_pika")
+            message = aio_pika.Message(
                 body=notification.model_dump_json().encode(),
-                delivery_mode=DeliveryMode.PERSISTENT,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
                 content_type="application/json",
                 headers={
                     "priority": notification.priority,
@@ -255,9 +270,10 @@ class EventWorker:
             logger.error("Not connected to RabbitMQ")
             return
         
-        message = Message(
+        aio_pika = lazy_import("aio_pika")
+        message = aio_pika.Message(
             body=event.model_dump_json().encode(),
-            delivery_mode=DeliveryMode.PERSISTENT,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
             content_type="application/json",
             headers={
                 "event_type": event.event_type.value,
@@ -465,7 +481,8 @@ class EventWorker:
         """
         Process location update event.
         Checks for nearby opportunities when traveler moves.
-        Uses batching to avoid notification spam.
+        Updates are batched; the event that fills the batch returns the
+        proximity alerts for every traveler in it.
         
         Payload expected:
         - speed: Optional[float] - Speed in m/s
@@ -485,24 +502,59 @@ class EventWorker:
         if lat is None or lon is None:
             return notifications
         
-        # Add to batch for aggregation (prevents notification spam)
+        # Matched with the rest of the batch; one traveler's fixes collapse
+        # into one alert, which also prevents notification spam
         async with self._batch_lock:
             self._location_batch.append(event)
-            
-            # Process batch if it reaches threshold or has old events
-            if len(self._location_batch) >= BATCH_SIZE:
-                await self._process_location_batch()
+            if len(self._location_batch) < LOCATION_BATCH_SIZE:
+                return notifications
+            batch = self._take_location_batch()
+        
+        # This event filled the batch; process_event publishes the alerts
+        return await self._process_location_batch(batch)
+    
+    def _take_location_batch(self) -> List[TravelerEvent]:
+        """Swap out the pending location batch (caller holds _batch_lock)"""
+        batch = self._location_batch
+        self._location_batch = []
+        return batch
+    
+    async def _process_location_batch(self, batch: List[TravelerEvent]) -> List[NotificationPayload]:
+        """
+        Match a batch of location updates against open requests.
         
-        # Find nearby requests
-        nearby = logic.find_nearby_requests(lat, lon, radius_km=10.0)
+        Only each traveler's latest fix is matched, and all of them go
+        through one many-to-many proximity query, so the cost grows with
+        the number of travelers rather than the number of events.
         
-        # Only notify for very close opportunities (within 2km)
-        close_requests = [r for r in nearby if r.get("distance_km", 100) <= 2.0]
+        Args:
+            batch: Location events taken from the batch
         
-        if close_requests:
-            closest = close_requests[0]
-            # Check if we recently notified about this request (simple dedup)
-            notification = NotificationPayload(
+        Returns:
+            At most one proximity alert per traveler
+        """
+        latest: Dict[str, TravelerEvent] = {}
+        for event in batch:
+            current = latest.get(event.traveler_id)
+            if current is None or event.timestamp >= current.timestamp:
+                latest[event.traveler_id] = event
+        
+        events = list(latest.values())
+        positions = [(event.location["lat"], event.location["lon"]) for event in events]
+        try:
+            nearby_per_traveler = await asyncio.to_thread(
+                logic.find_nearby_requests_many, positions, radius_km=PROXIMITY_ALERT_KM, limit=1
+            )
+        except Exception as e:
+            logger.error(f"Failed to match location batch of {len(batch)} events: {e}")
+            return []
+        
+        notifications = []
+        for event, (lat, lon), nearby in zip(events, positions, nearby_per_traveler):
+            if not nearby:
+                continue
+            closest = nearby[0]
+            notifications.append(NotificationPayload(
                 user_id=event.traveler_id,
                 notification_type="proximity_alert",
                 title="🚨 You're Close!",
@@ -518,29 +570,24 @@ class EventWorker:
                     "traveler_location": {"lat": lat, "lon": lon},
                     "timestamp": event.timestamp.isoformat()
                 },
-                priority="high" if closest.get("distance_km", 100) <= 0.5 else "normal"
-            )
-            notifications.append(notification)
+                priority="high" if closest["distance_km"] <= URGENT_PROXIMITY_KM else "normal"
+            ))
         
+        self._stats["location_batches"] += 1
+        logger.debug(
+            f"Matched {len(batch)} location updates from {len(events)} travelers, "
+            f"{len(notifications)} proximity alerts"
+        )
         return notifications
     
-    async def _process_location_batch(self):
-        """Process batched location updates for analytics"""
-        if not self._location_batch:
+    async def _flush_location_batch(self):
+        """Match and publish whatever location updates are pending"""
+        async with self._batch_lock:
+            batch = self._take_location_batch()
+        if not batch:
             return
-        
-        # Group by traveler
-        by_traveler: Dict[str, List[TravelerEvent]] = {}
-        for event in self._location_batch:
-            if event.traveler_id not in by_traveler:
-                by_traveler[event.traveler_id] = []
-            by_traveler[event.traveler_id].append(event)
-        
-        # Log aggregated location data (could be stored for analytics)
-        for traveler_id, events in by_traveler.items():
-            logger.debug(f"Processed {len(events)} location updates for traveler {traveler_id}")
-        
-        self._location_batch.clear()
+        for notification in await self._process_location_batch(batch):
+            await self.publish_notification(notification)
     
     async def process_object_match_event(self, event: TravelerEvent) -> List[NotificationPayload]:
         """
@@ -725,7 +772,7 @@ class EventWorker:
         
         return notifications
     
-    async def process_event(self, message: aio_pika.IncomingMessage):
+    async def process_event(self, message: "aio_pika.IncomingMessage"):
         """Process a single event from the queue with retry support"""
         start_time = datetime.utcnow()
         
@@ -745,6 +792,8 @@ class EventWorker:
                     logger.warning(f"No handler for event type: {event.event_type}")
                     notifications = []
                 
+                self._record_product_interaction(event)
+                
                 # Publish all generated notifications
                 sent_count = 0
                 for notification in notifications:
@@ -774,7 +823,24 @@ class EventWorker:
                 else:
                     logger.error(f"Event exceeded max retries, moving to DLQ")
     
-    async def _retry_event(self, message: aio_pika.IncomingMessage, retry_count: int):
+    def _record_product_interaction(self, event: TravelerEvent):
+        """Stream product interactions carried by an event into the collaborative model"""
+        product_id = event.payload.get("product_id")
+        if product_id is None or not event.traveler_id.isdigit():
+            return
+        
+        try:
+            from src.recommendation_engine import recommendation_engine
+            recommendation_engine.record_interaction(
+                user_id=int(event.traveler_id),
+                product_id=int(product_id),
+                interaction_type=event.payload.get("interaction_type", "view"),
+                timestamp=event.timestamp.timestamp()
+            )
+        except Exception as e:
+            logger.warning(f"Could not record interaction for event {event.event_id}: {e}")
+    
+    async def _retry_event(self, message: "aio_pika.IncomingMessage", retry_count: int):
         """Retry a failed event with exponential backoff"""
         self._stats["retries"] += 1
         
@@ -783,9 +849,10 @@ class EventWorker:
         await asyncio.sleep(delay)
         
         # Re-publish with updated retry count
-        new_message = Message(
+        aio_pika = lazy_import("aio_pika")
+        new_message = aio_pika.Message(
             body=message.body,
-            delivery_mode=DeliveryMode.PERSISTENT,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
             content_type="application/json",
             headers={
                 **(message.headers or {}),
@@ -820,10 +887,8 @@ class EventWorker:
     async def _batch_processor_loop(self):
         """Periodically process location batches"""
         while self._running:
-            await asyncio.sleep(30)  # Process every 30 seconds
-            async with self._batch_lock:
-                if self._location_batch:
-                    await self._process_location_batch()
+            await asyncio.sleep(LOCATION_BATCH_INTERVAL_SECONDS)
+            await self._flush_location_batch()
     
     async def stop(self):
         """Stop the worker gracefully"""
@@ -831,9 +896,7 @@ class EventWorker:
         self._running = False
         
         # Process remaining batch
-        async with self._batch_lock:
-            if self._location_batch:
-                await self._process_location_batch()
+        await self._flush_location_batch()
         
         await self.disconnect()
         logger.info(f"Event worker stopped. Stats: {self._stats}")
@@ -0,0 +1,475 @@
+"""
+Geospatial Request Index
+Latitude/longitude grid cells for radius and nearest-neighbour queries
+Requirements: 13.1, 13.2 - Camera/mic event handling and matching
+"""
+import os
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.topk import top_k_indices
+
+EARTH_RADIUS_KM = 6371.0
+# Length of one degree of latitude (and of longitude at the equator)
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+# Farthest any two points can be apart
+MAX_DISTANCE_KM = EARTH_RADIUS_KM * math.pi
+
+# Cell edge in degrees (0.5 = ~55 km of latitude); a 50 km query touches ~9 cells
+GEO_CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", "0.5"))
+# Largest origins x candidates distance matrix computed in one pass
+GEO_MATRIX_MAX_ELEMENTS = int(os.getenv("GEO_MATRIX_MAX_ELEMENTS", str(4_000_000)))
+
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Calculate the great circle distance between two points
+    on the earth (specified in decimal degrees)
+    Returns distance in kilometers.
+    """
+    d_lat = math.radians(lat2 - lat1)
+    d_lon = math.radians(lon2 - lon1)
+    
+    a = (math.sin(d_lat / 2) * math.sin(d_lat / 2) +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(d_lon / 2) * math.sin(d_lon / 2))
+    
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+@dataclass
+class RadianCoordinates:
+    """Points in radians with cos(latitude) cached for repeated distance passes"""
+    lat: np.ndarray
+    lon: np.ndarray
+    cos_lat: np.ndarray
+    
+    @classmethod
+    def from_degrees(cls, lats: Iterable[float], lons: Iterable[float]) -> "RadianCoordinates":
+        lat = np.radians(np.asarray(lats, dtype=np.float64))
+        lon = np.radians(np.asarray(lons, dtype=np.float64))
+        return cls(lat=lat, lon=lon, cos_lat=np.cos(lat))
+    
+    def __len__(self) -> int:
+        return self.lat.size
+    
+    def take(self, rows: np.ndarray) -> "RadianCoordinates":
+        return RadianCoordinates(lat=self.lat[rows], lon=self.lon[rows], cos_lat=self.cos_lat[rows])
+
+
+def _haversine(lat1, lon1, cos_lat1, lat2, lon2, cos_lat2) -> np.ndarray:
+    """Broadcasting haversine over radians with precomputed cosines"""
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + cos_lat1 * cos_lat2 * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_vector(lat: float, lon: float, points: RadianCoordinates) -> np.ndarray:
+    """
+    Distances from one point to every point, in one NumPy pass.
+    
+    Args:
+        lat: Origin latitude in degrees
+        lon: Origin longitude in degrees
+        points: Destinations
+    
+    Returns:
+        Distances in kilometers, shape (len(points),)
+    """
+    lat_rad, lon_rad = math.radians(lat), math.radians(lon)
+    return _haversine(lat_rad, lon_rad, math.cos(lat_rad), points.lat, points.lon, points.cos_lat)
+
+
+def haversine_matrix(origins: RadianCoordinates, points: RadianCoordinates) -> np.ndarray:
+    """
+    Distances between every origin and every point.
+    
+    Returns:
+        Distances in kilometers, shape (len(origins), len(points))
+    """
+    return _haversine(
+        origins.lat[:, None], origins.lon[:, None], origins.cos_lat[:, None],
+        points.lat[None, :], points.lon[None, :], points.cos_lat[None, :]
+    )
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, Optional[float]]:
+    """
+    Latitude band and longitude half-width enclosing a spherical cap.
+    
+    Args:
+        lat: Centre latitude in degrees
+        lon: Centre longitude in degrees
+        radius_km: Cap radius
+    
+    Returns:
+        (min_lat, max_lat, max_lon_delta); max_lon_delta is None when the
+        cap spans every longitude (it contains a pole)
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    d_lat = math.degrees(angular)
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+    if min_lat <= -90 or max_lat >= 90 or angular >= math.pi / 2:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None
+    
+    # Widest longitude offset of the cap, reached north or south of the centre
+    ratio = math.sin(angular) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return min_lat, max_lat, None
+    return min_lat, max_lat, math.degrees(math.asin(ratio))
+
+
+def _lon_delta(lon1: float, lon2: np.ndarray) -> np.ndarray:
+    """Absolute longitude difference across the antimeridian, in [0, 180]"""
+    return np.abs((lon2 - lon1 + 180) % 360 - 180)
+
+
+class GeoIndex:
+    """
+    Points bucketed by fixed-size latitude/longitude cells.
+    
+    A radius query visits only the cells overlapping the query's bounding
+    box (wrapped at the antimeridian and widened to every longitude near
+    the poles), drops candidates outside the box and computes the exact
+    haversine distance for the rest in one NumPy pass. Points are added,
+    moved and removed one at a time, so the index follows requests as they
+    are created and closed without being rebuilt.
+    
+    Coordinates live in flat arrays (degrees for the box test, radians
+    and cos(latitude) for distances) addressed by slot; cells hold slots,
+    and slots freed by removals are reused. Each cell's slots are cached
+    as an array until the cell changes, so gathering candidates is a
+    concatenation rather than a walk over Python sets.
+    """
+    
+    def __init__(self, cell_degrees: float = GEO_CELL_DEGREES, capacity: int = 1024):
+        """
+        Initialize geo index
+        
+        Args:
+            cell_degrees: Cell edge in degrees of latitude and longitude
+            capacity: Initial number of slots
+        """
+        if not 0 < cell_degrees <= 180:
+            raise ValueError("cell_degrees must be in (0, 180]")
+        
+        self.cell_degrees = cell_degrees
+        self._n_rows = math.ceil(180 / cell_degrees)
+        self._n_cols = math.ceil(360 / cell_degrees)
+        
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: List[Optional[Hashable]] = []
+        self._free: List[int] = []
+        self._lat = np.zeros(max(capacity, 1), dtype=np.float64)
+        self._lon = np.zeros(max(capacity, 1), dtype=np.float64)
+        self._coords = RadianCoordinates.from_degrees(self._lat, self._lon)
+        self._cells: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        self._cell_arrays: Dict[Tuple[int, int], np.ndarray] = {}
+    
+    def __len__(self) -> int:
+        return len(self._slots)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+    
+    def _row(self, lat: float) -> int:
+        return min(max(int((lat + 90) // self.cell_degrees), 0), self._n_rows - 1)
+    
+    def _col(self, lon: float) -> int:
+        return int(((lon + 180) % 360) // self.cell_degrees) % self._n_cols
+    
+    def _cell_ids(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized _row and _col"""
+        rows = np.clip((lats + 90) // self.cell_degrees, 0, self._n_rows - 1).astype(np.int64)
+        cols = (((lons + 180) % 360) // self.cell_degrees).astype(np.int64) % self._n_cols
+        return rows, cols
+    
+    def _cell_slots(self, cell: Tuple[int, int]) -> np.ndarray:
+        slots = self._cell_arrays.get(cell)
+        if slots is None:
+            slots = np.fromiter(self._cells[cell], dtype=np.int64)
+            self._cell_arrays[cell] = slots
+        return slots
+    
+    def _reserve(self, n: int) -> None:
+        """Grow the coordinate arrays geometrically to hold n more slots"""
+        used = len(self._keys)
+        capacity = self._lat.size
+        if used + n <= capacity:
+            return
+        while capacity < used + n:
+            capacity *= 2
+        
+        def grow(array: np.ndarray) -> np.ndarray:
+            grown = np.zeros(capacity, dtype=np.float64)
+            grown[:used] = array[:used]
+            return grown
+        
+        self._lat, self._lon = grow(self._lat), grow(self._lon)
+        coords = self._coords
+        self._coords = RadianCoordinates(
+            lat=grow(coords.lat), lon=grow(coords.lon), cos_lat=grow(coords.cos_lat)
+        )
+    
+    def _write(self, slots: np.ndarray, lats: np.ndarray, lons: np.ndarray) -> None:
+        self._lat[slots] = lats
+        self._lon[slots] = lons
+        lat_rad = np.radians(lats)
+        self._coords.lat[slots] = lat_rad
+        self._coords.lon[slots] = np.radians(lons)
+        self._coords.cos_lat[slots] = np.cos(lat_rad)
+    
+    def add(self, key: Hashable, lat: float, lon: float) -> None:
+        """Insert a point, or move it if the key is already indexed"""
+        if not -90 <= lat <= 90:
+            raise ValueError(f"Latitude out of range: {lat}")
+        if key in self._slots:
+            self.remove(key)
+        
+        if self._free:
+            slot = self._free.pop()
+            self._keys[slot] = key
+        else:
+            self._reserve(1)
+            slot = len(self._keys)
+            self._keys.append(key)
+        self._slots[key] = slot
+        self._write(np.array([slot]), np.array([lat]), np.array([lon]))
+        cell = (self._row(lat), self._col(lon))
+        self._cells[cell].add(slot)
+        self._cell_arrays.pop(cell, None)
+    
+    def add_many(self, keys: List[Hashable], lats: Iterable[float], lons: Iterable[float]) -> None:
+        """
+        Bulk-insert points with vectorized coordinate and cell computation.
+        
+        Args:
+            keys: Point keys; already indexed keys are moved
+            lats: Latitudes in degrees
+            lons: Longitudes in degrees
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if lats.size and (lats.min() < -90 or lats.max() > 90):
+            raise ValueError("Latitude out of range")
+        for key in keys:
+            if key in self._slots:
+                self.remove(key)
+        
+        self._reserve(len(keys))
+        start = len(self._keys)
+        slots = np.arange(start, start + len(keys))
+        self._keys.extend(keys)
+        self._slots.update(zip(keys, slots.tolist()))
+        self._write(slots, lats, lons)
+        
+        # One set update per cell rather than per point
+        rows, cols = self._cell_ids(lats, lons)
+        cell_ids = rows * self._n_cols + cols
+        order = np.argsort(cell_ids, kind='stable')
+        cell_ids, slots = cell_ids[order], slots[order]
+        bounds = np.flatnonzero(np.diff(cell_ids)) + 1
+        for cell_id, group in zip(cell_ids[np.r_[0, bounds]].tolist(), np.split(slots, bounds)):
+            cell = divmod(cell_id, self._n_cols)
+            self._cells[cell].update(group.tolist())
+            self._cell_arrays.pop(cell, None)
+    
+    def remove(self, key: Hashable) -> bool:
+        """Remove a point; returns whether it was indexed"""
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return False
+        cell = (self._row(self._lat[slot]), self._col(self._lon[slot]))
+        bucket = self._cells[cell]
+        bucket.discard(slot)
+        if not bucket:
+            del self._cells[cell]
+        self._cell_arrays.pop(cell, None)
+        self._keys[slot] = None
+        self._free.append(slot)
+        return True
+    
+    def _candidate_cells(
+        self, min_lat: float, max_lat: float, lon: float, max_lon_delta: Optional[float]
+    ) -> Iterator[Tuple[int, int]]:
+        rows = range(self._row(min_lat), self._row(max_lat) + 1)
+        if max_lon_delta is None:
+            cols = None
+        else:
+            first = int((lon - max_lon_delta + 180) // self.cell_degrees)
+            last = int((lon + max_lon_delta + 180) // self.cell_degrees)
+            cols = None if last - first + 1 >= self._n_cols else \
+                [c % self._n_cols for c in range(first, last + 1)]
+        
+        n_box_cells = len(rows) * (self._n_cols if cols is None else len(cols))
+        if n_box_cells > len(self._cells):
+            # Wide queries: walking the occupied cells is cheaper than the box
+            col_set = None if cols is None else set(cols)
+            for row, col in self._cells:
+                if row in rows and (col_set is None or col in col_set):
+                    yield row, col
+            return
+        
+        for row in rows:
+            for col in (range(self._n_cols) if cols is None else cols):
+                if (row, col) in self._cells:
+                    yield row, col
+    
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Slots inside the bounding box of a query"""
+        min_lat, max_lat, max_lon_delta = bounding_box(lat, lon, radius_km)
+        cells = list(self._candidate_cells(min_lat, max_lat, lon, max_lon_delta))
+        if not cells:
+            return np.empty(0, dtype=np.int64)
+        slots = np.concatenate([self._cell_slots(cell) for cell in cells])
+        lats = self._lat[slots]
+        inside = (lats >= min_lat) & (lats <= max_lat)
+        if max_lon_delta is not None:
+            inside &= _lon_delta(lon, self._lon[slots]) <= max_lon_delta
+        return slots[inside]
+    
+    def _filter(self, slots: np.ndarray, predicate: Optional[Callable[[Hashable], bool]]) -> np.ndarray:
+        if predicate is None or not slots.size:
+            return slots
+        keys = self._keys
+        return slots[np.fromiter((predicate(keys[s]) for s in slots.tolist()), dtype=bool, count=slots.size)]
+    
+    def _nearest_first(
+        self, slots: np.ndarray, distances: np.ndarray, radius_km: float, limit: Optional[int]
+    ) -> List[Tuple[Hashable, float]]:
+        within = distances <= radius_km
+        slots, distances = slots[within], distances[within]
+        order = top_k_indices(-distances, slots.size if limit is None else limit)
+        keys = self._keys
+        return [(keys[s], d) for s, d in zip(slots[order].tolist(), distances[order].tolist())]
+    
+    def query_radius(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        predicate: Optional[Callable[[Hashable], bool]] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[Hashable, float]]:
+        """
+        Points within a great-circle radius, nearest first.
+        
+        Args:
+            lat: Query latitude
+            lon: Query longitude
+            radius_km: Search radius in kilometers
+            predicate: Optional filter on keys, applied before distances
+            limit: Maximum number of results
+        
+        Returns:
+            List of (key, distance_km)
+        """
+        if radius_km < 0 or not self._slots:
+            return []
+        
+        slots = self._filter(self._candidates(lat, lon, radius_km), predicate)
+        distances = haversine_vector(lat, lon, self._coords.take(slots))
+        return self._nearest_first(slots, distances, radius_km, limit)
+    
+    def query_radius_many(
+        self,
+        lats: Iterable[float],
+        lons: Iterable[float],
+        radius_km: float,
+        predicate: Optional[Callable[[Hashable], bool]] = None,
+        limit: Optional[int] = None
+    ) -> List[List[Tuple[Hashable, float]]]:
+        """
+        Radius queries for a batch of positions with one distance matrix.
+        
+        Positions are grouped by cell; each group's candidates are gathered
+        once and scored against all of its positions in one distance matrix
+        (in blocks of at most GEO_MATRIX_MAX_ELEMENTS distances). Travelers
+        close together, the common case in a batch, share nearly all their
+        candidates, so the cost grows with the number of occupied cells
+        rather than the number of positions.
+        
+        Args:
+            lats: Query latitudes
+            lons: Query longitudes
+            radius_km: Search radius in kilometers
+            predicate: Optional filter on keys, applied before distances
+            limit: Maximum number of results per position
+        
+        Returns:
+            For each position, a list of (key, distance_km), nearest first
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        results: List[List[Tuple[Hashable, float]]] = [[] for _ in range(lats.size)]
+        if radius_km < 0 or not self._slots or not lats.size:
+            return results
+        
+        rows, cols = self._cell_ids(lats, lons)
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for position, cell_id in enumerate((rows * self._n_cols + cols).tolist()):
+            groups[cell_id].append(position)
+        
+        origins = RadianCoordinates.from_degrees(lats, lons)
+        for positions in groups.values():
+            # Union of the positions' cells; cells are disjoint, so no slot repeats
+            cells = set()
+            for p in positions:
+                min_lat, max_lat, max_lon_delta = bounding_box(lats[p], lons[p], radius_km)
+                cells.update(self._candidate_cells(min_lat, max_lat, lons[p], max_lon_delta))
+            if not cells:
+                continue
+            slots = np.concatenate([self._cell_slots(cell) for cell in cells])
+            slots = self._filter(slots, predicate)
+            if not slots.size:
+                continue
+            
+            points = self._coords.take(slots)
+            block = max(1, GEO_MATRIX_MAX_ELEMENTS // slots.size)
+            for start in range(0, len(positions), block):
+                chunk = np.array(positions[start:start + block])
+                matrix = haversine_matrix(origins.take(chunk), points)
+                for position, distances in zip(chunk.tolist(), matrix):
+                    results[position] = self._nearest_first(slots, distances, radius_km, limit)
+        return results
+    
+    def query_nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        max_radius_km: float = MAX_DISTANCE_KM,
+        predicate: Optional[Callable[[Hashable], bool]] = None
+    ) -> List[Tuple[Hashable, float]]:
+        """
+        The k nearest points, optionally within a maximum radius.
+        
+        Searches a radius of one cell first and doubles it until k points
+        are found, so the cost follows the local density rather than the
+        index size.
+        
+        Args:
+            lat: Query latitude
+            lon: Query longitude
+            k: Number of neighbours
+            max_radius_km: Points farther than this are never returned
+            predicate: Optional filter on keys, applied before distances
+        
+        Returns:
+            List of (key, distance_km), nearest first
+        """
+        if k <= 0:
+            return []
+        
+        radius = min(self.cell_degrees * KM_PER_DEGREE, max_radius_km)
+        while True:
+            hits = self.query_radius(lat, lon, radius, predicate=predicate)
+            # Everything within the radius was found, so the k nearest are among the hits
+            if len(hits) >= k or radius >= min(max_radius_km, MAX_DISTANCE_KM):
+                return hits[:k]
+            radius = min(radius * 2, max_radius_km)
@@ -0,0 +1,159 @@
+"""
+Keyword Index
+Inverted index from item names, keywords and their words to travel requests,
+for matching detected objects without scoring every request
+Requirements: 13.1, 13.2 - Camera/mic event handling and matching
+"""
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Set, Tuple
+
+_WORD = re.compile(r'\w+')
+
+# Substring lookups intersect posting lists of character n-grams of this length
+NGRAM = 3
+
+
+def words(text: str) -> Set[str]:
+    """Distinct \\w+ tokens of already lowercased text"""
+    return set(_WORD.findall(text))
+
+
+def _ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+@dataclass
+class MatchTerms:
+    """A request's item name and keywords, normalized once for scoring"""
+    name: str                   # lowercased item name
+    words: Set[str]             # tokens of the lowercased item name
+    keywords: Tuple[str, ...]   # as given; matched case-sensitively
+    
+    @classmethod
+    def of(cls, request: Dict) -> "MatchTerms":
+        name = request["item_name"].lower()
+        return cls(name=name, words=words(name), keywords=tuple(request.get("keywords", [])))
+
+
+def score_terms(detected: str, detected_words: Set[str], terms: MatchTerms) -> Tuple[float, str]:
+    """
+    Match score between a detected object and a request.
+    
+    Args:
+        detected: Lowercased detected object name
+        detected_words: words(detected)
+        terms: The request's MatchTerms
+    
+    Returns:
+        Tuple of (score, match_reason)
+    """
+    # Exact match in item name
+    if detected == terms.name:
+        return (1.0, "exact_match")
+    
+    # Detected is part of item name
+    if detected in terms.name:
+        return (0.9, "partial_match")
+    
+    # Item name is part of detected
+    if terms.name in detected:
+        return (0.85, "contains_match")
+    
+    # Keyword match
+    for keyword in terms.keywords:
+        if keyword in detected or detected in keyword:
+            return (0.7, f"keyword_match:{keyword}")
+    
+    # Word overlap
+    overlap = detected_words & terms.words
+    if overlap:
+        score = len(overlap) / max(len(detected_words), len(terms.words))
+        return (score * 0.6, f"word_overlap:{','.join(overlap)}")
+    
+    return (0.0, "no_match")
+
+
+class KeywordIndex:
+    """
+    Inverted index over the requests' item names and keywords.
+    
+    A request can only score above zero against a detected object if it
+    shares a word with it, or its name or a keyword is a substring of the
+    object, or the object is a substring of its name or a keyword.
+    candidates() looks up each case: words and whole phrases by exact key,
+    the last case by intersecting character n-gram postings. The result
+    is a superset of the requests with a non-zero score, so scoring only
+    the candidates gives the same matches as scoring every request.
+    """
+    
+    def __init__(self, requests: Dict[str, Dict]):
+        """
+        Args:
+            requests: Requests by id, in matching order
+        """
+        self.terms: Dict[str, MatchTerms] = {}
+        self.position: Dict[str, int] = {}
+        self._by_word: Dict[str, Set[str]] = defaultdict(set)
+        self._by_phrase: Dict[str, Set[str]] = defaultdict(set)   # whole name or keyword
+        self._by_ngram: Dict[str, Set[str]] = defaultdict(set)
+        # Requests with an empty name or keyword are a substring of everything
+        self._always: Set[str] = set()
+        
+        for position, (request_id, request) in enumerate(requests.items()):
+            terms = MatchTerms.of(request)
+            self.terms[request_id] = terms
+            self.position[request_id] = position
+            for word in terms.words:
+                self._by_word[word].add(request_id)
+            for phrase in (terms.name,) + terms.keywords:
+                if not phrase:
+                    self._always.add(request_id)
+                    continue
+                self._by_phrase[phrase].add(request_id)
+                for gram in _ngrams(phrase):
+                    self._by_ngram[gram].add(request_id)
+        
+        self._phrase_lengths = sorted({len(phrase) for phrase in self._by_phrase})
+    
+    def __len__(self) -> int:
+        return len(self.terms)
+    
+    def candidates(self, detected: str, detected_words: Set[str]) -> Set[str]:
+        """
+        Requests that can score above zero against a detected object.
+        
+        Args:
+            detected: Lowercased detected object name
+            detected_words: words(detected)
+        
+        Returns:
+            Request IDs, unordered
+        """
+        found = set(self._always)
+        for word in detected_words:
+            found.update(self._by_word.get(word, ()))
+        
+        # Names and keywords contained in the detected object
+        for length in self._phrase_lengths:
+            if length > len(detected):
+                break
+            for start in range(len(detected) - length + 1):
+                found.update(self._by_phrase.get(detected[start:start + length], ()))
+        
+        # Names and keywords containing the detected object
+        if len(detected) >= NGRAM:
+            postings = sorted(
+                (self._by_ngram.get(gram, set()) for gram in _ngrams(detected)), key=len
+            )
+            found.update(set.intersection(*postings))
+        else:
+            for phrase, ids in self._by_phrase.items():
+                if detected in phrase:
+                    found.update(ids)
+        return found
+    
+    def in_order(self, request_ids: Iterable[str]) -> List[str]:
+        """Request IDs sorted into matching order"""
+        return sorted(request_ids, key=self.position.__getitem__)
@@ -3,15 +3,19 @@ Logic module for traveler event processing
 Requirements: 13.1, 13.2 - Camera/mic event handling and matching
 
 This module provides:
-- Geo-spatial matching using Haversine formula
+- Matching against open requests served by a RequestStore snapshot
+- Geo-spatial matching using Haversine formula over a grid-cell index
 - Object detection matching against travel requests
 - Keyword extraction and matching
 """
-import math
-import re
+from itertools import islice
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
+from src.geo_index import haversine_distance
+from src.keyword_index import MatchTerms, score_terms, words
+from src.request_store import RequestSnapshot, RequestStore
+
 # Sample Request Data (In-Memory Database for Demo)
 # Distributed across key regions relevant to Mnbara (MENA + Global Hubs)
 SAMPLE_REQUESTS = [
@@ -36,25 +40,44 @@ CATEGORY_SYNONYMS = {
     "home": ["household", "kitchen", "decor"]
 }
 
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """
-    Calculate the great circle distance between two points 
-    on the earth (specified in decimal degrees)
-    Returns distance in kilometers.
+# Open requests and their indexes; serves the sample requests until the
+# first load from the database
+request_store = RequestStore(SAMPLE_REQUESTS)
+
+
+def add_request(request: Dict) -> None:
     """
-    R = 6371  # Radius of earth in km
+    Index a new or updated request for matching.
     
-    d_lat = math.radians(lat2 - lat1)
-    d_lon = math.radians(lon2 - lon1)
-    
-    a = (math.sin(d_lat / 2) * math.sin(d_lat / 2) +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(d_lon / 2) * math.sin(d_lon / 2))
-    
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    d = R * c
+    Args:
+        request: Request dict with at least id, lat and lon
+    """
+    request_store.upsert(request)
+
+
+def close_request(request_id: str) -> bool:
+    """
+    Stop matching a fulfilled or cancelled request.
     
-    return d
+    Returns:
+        Whether the request was open
+    """
+    return request_store.remove(request_id)
+
+
+def _category_filter(snapshot: RequestSnapshot, category: Optional[str]):
+    if not category:
+        return None
+    return snapshot.in_category(category).__contains__
+
+
+def _with_distances(snapshot: RequestSnapshot, hits: List[Tuple[str, float]]) -> List[Dict]:
+    nearby = []
+    for request_id, dist in hits:
+        req_with_dist = snapshot.requests[request_id].copy()
+        req_with_dist["distance_km"] = round(dist, 2)
+        nearby.append(req_with_dist)
+    return nearby
 
 
 def find_nearby_requests(
@@ -77,21 +100,67 @@ def find_nearby_requests(
     Returns:
         List of nearby requests sorted by distance
     """
-    nearby = []
-    for req in SAMPLE_REQUESTS:
-        # Category filter
-        if category and req.get("category") != category:
-            continue
-            
-        dist = haversine_distance(lat, lon, req["lat"], req["lon"])
-        if dist <= radius_km:
-            req_with_dist = req.copy()
-            req_with_dist["distance_km"] = round(dist, 2)
-            nearby.append(req_with_dist)
+    snapshot = request_store.snapshot
+    hits = snapshot.geo.query_radius(
+        lat, lon, radius_km, predicate=_category_filter(snapshot, category), limit=limit
+    )
+    return _with_distances(snapshot, hits)
+
+
+def find_nearby_requests_many(
+    positions: List[Tuple[float, float]],
+    radius_km: float = 50.0,
+    category: Optional[str] = None,
+    limit: int = 20
+) -> List[List[Dict]]:
+    """
+    Find requests near each of many travelers with one batched query.
     
-    # Sort by distance
-    nearby.sort(key=lambda x: x["distance_km"])
-    return nearby[:limit]
+    Args:
+        positions: (lat, lon) of each traveler
+        radius_km: Search radius in kilometers
+        category: Optional category filter
+        limit: Maximum number of results per traveler
+    
+    Returns:
+        For each position, its nearby requests sorted by distance
+    """
+    if not positions:
+        return []
+    lats, lons = zip(*positions)
+    snapshot = request_store.snapshot
+    batch = snapshot.geo.query_radius_many(
+        lats, lons, radius_km, predicate=_category_filter(snapshot, category), limit=limit
+    )
+    return [_with_distances(snapshot, hits) for hits in batch]
+
+
+def find_nearest_requests(
+    lat: float,
+    lon: float,
+    k: int = 5,
+    category: Optional[str] = None,
+    max_radius_km: Optional[float] = None
+) -> List[Dict]:
+    """
+    Find the k requests closest to the traveler, however far away.
+    
+    Args:
+        lat: Latitude of traveler
+        lon: Longitude of traveler
+        k: Number of requests to return
+        category: Optional category filter
+        max_radius_km: Optional cap on distance
+    
+    Returns:
+        Up to k requests sorted by distance
+    """
+    kwargs = {} if max_radius_km is None else {"max_radius_km": max_radius_km}
+    snapshot = request_store.snapshot
+    hits = snapshot.geo.query_nearest(
+        lat, lon, k, predicate=_category_filter(snapshot, category), **kwargs
+    )
+    return _with_distances(snapshot, hits)
 
 
 def calculate_match_score(detected: str, request: Dict) -> Tuple[float, str]:
@@ -102,35 +171,7 @@ def calculate_match_score(detected: str, request: Dict) -> Tuple[float, str]:
         Tuple of (score, match_reason)
     """
     detected_lower = detected.lower()
-    item_name_lower = request["item_name"].lower()
-    keywords = request.get("keywords", [])
-    
-    # Exact match in item name
-    if detected_lower == item_name_lower:
-        return (1.0, "exact_match")
-    
-    # Detected is part of item name
-    if detected_lower in item_name_lower:
-        return (0.9, "partial_match")
-    
-    # Item name is part of detected
-    if item_name_lower in detected_lower:
-        return (0.85, "contains_match")
-    
-    # Keyword match
-    for keyword in keywords:
-        if keyword in detected_lower or detected_lower in keyword:
-            return (0.7, f"keyword_match:{keyword}")
-    
-    # Word overlap
-    detected_words = set(re.findall(r'\w+', detected_lower))
-    item_words = set(re.findall(r'\w+', item_name_lower))
-    overlap = detected_words & item_words
-    if overlap:
-        score = len(overlap) / max(len(detected_words), len(item_words))
-        return (score * 0.6, f"word_overlap:{','.join(overlap)}")
-    
-    return (0.0, "no_match")
+    return score_terms(detected_lower, words(detected_lower), MatchTerms.of(request))
 
 
 def match_detected_objects(
@@ -140,7 +181,8 @@ def match_detected_objects(
 ) -> List[Dict]:
     """
     Find requests that match objects detected by the traveler's camera.
-    Uses fuzzy matching with scoring.
+    Uses fuzzy matching with scoring; only requests sharing a word or a
+    substring with an object (from the keyword index) are scored.
     
     Args:
         detected_objects: List of detected object names
@@ -155,21 +197,29 @@ def match_detected_objects(
         return matches
     
     matched_request_ids = set()
+    snapshot = request_store.snapshot
+    index = snapshot.keywords
     
     for obj in detected_objects:
         obj_normalized = obj.strip()
         if not obj_normalized:
             continue
-            
-        for req in SAMPLE_REQUESTS:
+        
+        detected = obj_normalized.lower()
+        detected_words = words(detected)
+        # With min_score <= 0 even non-matching requests qualify
+        candidates = index.candidates(detected, detected_words) if min_score > 0 else snapshot.requests
+        
+        for request_id in index.in_order(candidates):
             # Skip already matched requests
-            if req["id"] in matched_request_ids:
+            if request_id in matched_request_ids:
                 continue
-                
-            score, reason = calculate_match_score(obj_normalized, req)
+            
+            req = snapshot.requests[request_id]
+            score, reason = score_terms(detected, detected_words, index.terms[request_id])
             
             if score >= min_score:
-                matched_request_ids.add(req["id"])
+                matched_request_ids.add(request_id)
                 matches.append({
                     "type": "camera_match",
                     "message": f"You found a '{obj}'! This matches a request for '{req['item_name']}' in {req['location_name']}.",
@@ -237,7 +287,5 @@ def get_requests_by_category(category: str, limit: int = 10) -> List[Dict]:
             normalized_category = cat
             break
     
-    return [
-        req for req in SAMPLE_REQUESTS 
-        if req.get("category") == normalized_category
-    ][:limit]
+    in_category = request_store.snapshot.in_category(normalized_category)
+    return list(islice(in_category.values(), limit))
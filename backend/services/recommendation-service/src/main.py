@@ -1,18 +1,23 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from src.startup import startup_profile, lazy_import
+
 from contextlib import asynccontextmanager
 import logging
 import asyncio
 import os
 
-from src.routes import context
-from src.routes import recommendations
-from src.routes import events
-from src.routes import bandits
-from src.routes import ml_pipeline
+with startup_profile.step("import", "fastapi"):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+
+# Heavy optional modules (scikit-learn, aio_pika, httpx, redis) are imported
+# lazily by the code that needs them; see src.startup.lazy_import
+with startup_profile.step("import", "src.recommendation_engine"):
+    from src.recommendation_engine import recommendation_engine
+with startup_profile.step("import", "src.event_worker"):
+    from src.event_worker import event_worker
 from src.database import Database
-from src.recommendation_engine import recommendation_engine
-from src.event_worker import event_worker
+from src.logic import request_store
+from src.cache import response_cache
 
 # Configure logging
 logging.basicConfig(
@@ -23,6 +28,8 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 ENABLE_EVENT_WORKER = os.getenv("ENABLE_EVENT_WORKER", "false").lower() == "true"
+# Shared tier for the response cache; in-process only when unset
+REDIS_URL = os.getenv("REDIS_URL")
 
 
 @asynccontextmanager
@@ -32,26 +39,56 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Recommendation Service...")
     
     try:
-        await recommendation_engine.initialize()
+        with startup_profile.step("init", "recommendation_engine"):
+            await recommendation_engine.initialize()
         logger.info("Recommendation engine initialized successfully")
     except Exception as e:
         logger.warning(f"Could not initialize recommendation engine: {e}")
     
+    try:
+        with startup_profile.step("init", "request_store"):
+            await request_store.load()
+    except Exception as e:
+        logger.warning(f"Could not load travel requests, serving sample requests: {e}")
+    
+    if REDIS_URL:
+        with startup_profile.step("init", "redis"):
+            aioredis = lazy_import("redis.asyncio")
+            response_cache.redis = aioredis.from_url(REDIS_URL)
+        logger.info("Response cache using Redis")
+    
+    # Keep the collaborative interaction snapshot fresh in the background
+    refresher_task = asyncio.create_task(recommendation_engine.run_interaction_refresher())
+    trending_task = asyncio.create_task(recommendation_engine.run_trending_refresher())
+    # Rebuild the content model when listings change; requests keep the old one meanwhile
+    content_task = asyncio.create_task(recommendation_engine.run_content_refresher())
+    # Apply travel request changes to the matching indexes
+    request_task = asyncio.create_task(request_store.run_sync_loop())
+    
     # Optionally start event worker in background
     worker_task = None
     if ENABLE_EVENT_WORKER:
         try:
-            await event_worker.connect()
+            with startup_profile.step("init", "event_worker"):
+                await event_worker.connect()
             worker_task = asyncio.create_task(event_worker.start())
             logger.info("Event worker started in background")
         except Exception as e:
             logger.warning(f"Could not start event worker: {e}")
     
+    startup_profile.mark_ready()
     yield
     
     # Shutdown
     logger.info("Shutting down Recommendation Service...")
     
+    for task in (refresher_task, trending_task, content_task, request_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
     if worker_task:
         await event_worker.stop()
         worker_task.cancel()
@@ -60,6 +97,10 @@ async def lifespan(app: FastAPI):
         except asyncio.CancelledError:
             pass
     
+    if response_cache.redis is not None:
+        await response_cache.redis.aclose()
+        response_cache.redis = None
+    
     await Database.close_pool()
 
 
@@ -70,12 +111,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Include routers
-app.include_router(context.router, prefix="/api/v1/context", tags=["Context"])
-app.include_router(recommendations.router, prefix="/api/v1/recommendations", tags=["Recommendations"])
-app.include_router(events.router, prefix="/api/v1/events", tags=["Events"])
-app.include_router(bandits.router, prefix="/api/v1/bandits", tags=["Bandits"])
-app.include_router(ml_pipeline.router, prefix="/api/v1/ml", tags=["ML Pipeline"])
+# Include routers, timing each module's import
+ROUTERS = [
+    ("context", "/api/v1/context", "Context"),
+    ("recommendations", "/api/v1/recommendations", "Recommendations"),
+    ("events", "/api/v1/events", "Events"),
+    ("bandits", "/api/v1/bandits", "Bandits"),
+    ("ml_pipeline", "/api/v1/ml", "ML Pipeline"),
+]
+for module_name, prefix, tag in ROUTERS:
+    module = startup_profile.import_module(f"src.routes.{module_name}")
+    app.include_router(module.router, prefix=prefix, tags=[tag])
 
 app.add_middleware(
     CORSMiddleware,
@@ -103,3 +149,15 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "service": "recommendation-service"}
+
+
+@app.get("/health/startup")
+def startup_report():
+    """Import and initialization cost of each startup step"""
+    return {"status": "success", "startup": startup_profile.report()}
+
+
+@app.get("/health/db")
+def database_metrics():
+    """Connection pool saturation and per-query latency"""
+    return {"status": "success", "pool": Database.get_stats()}
@@ -5,12 +5,16 @@ Requirements: 17.4 - Personalized recommendations based on browsing history
 """
 import os
 import logging
-from typing import Optional, Dict, Any, List
+from typing import TYPE_CHECKING, Optional, Dict, Any, List
 from dataclasses import dataclass
 from enum import Enum
 from datetime import datetime
 
-import httpx
+from src.startup import lazy_import
+
+# The HTTP client is imported by the first request
+if TYPE_CHECKING:
+    import httpx
 
 logger = logging.getLogger(__name__)
 
@@ -65,15 +69,24 @@ class MLflowModelRegistry:
             "http://mlflow-server:5000"
         )
         self.timeout = timeout
-        self._client = httpx.AsyncClient(
-            base_url=self.tracking_uri,
-            timeout=timeout
-        )
+        self._http: Optional["httpx.AsyncClient"] = None
         logger.info(f"MLflow client initialized with URI: {self.tracking_uri}")
     
+    @property
+    def _client(self) -> "httpx.AsyncClient":
+        """HTTP client, opened by the first request rather than at import"""
+        if self._http is None:
+            self._http = lazy_import("httpx").AsyncClient(
+                base_url=self.tracking_uri,
+                timeout=self.timeout
+            )
+        return self._http
+    
     async def close(self):
         """Close the HTTP client"""
-        await self._client.aclose()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
     
     async def health_check(self) -> bool:
         """Check if MLflow server is healthy"""
@@ -97,6 +110,7 @@ class MLflowModelRegistry:
         if tags:
             payload["tags"] = [{"key": k, "value": v} for k, v in tags.items()]
         
+        httpx = lazy_import("httpx")
         try:
             response = await self._client.post(
                 "/api/2.0/mlflow/registered-models/create",
@@ -125,6 +139,7 @@ class MLflowModelRegistry:
     
     async def get_registered_model(self, name: str) -> Optional[RegisteredModel]:
         """Get a registered model by name"""
+        httpx = lazy_import("httpx")
         try:
             response = await self._client.get(
                 "/api/2.0/mlflow/registered-models/get",
@@ -189,6 +204,7 @@ class MLflowModelRegistry:
         version: str
     ) -> Optional[ModelVersion]:
         """Get a specific model version"""
+        httpx = lazy_import("httpx")
         try:
             response = await self._client.get(
                 "/api/2.0/mlflow/model-versions/get",
@@ -5,14 +5,19 @@ Requirements: 17.4 - Personalized recommendations based on browsing history
 """
 import os
 import logging
-from typing import Optional, Dict, Any, List, Union
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Union
 from dataclasses import dataclass
 from enum import Enum
 import asyncio
 
-import httpx
 import numpy as np
 
+from src.startup import lazy_import
+
+# The HTTP client is imported by the first request
+if TYPE_CHECKING:
+    import httpx
+
 logger = logging.getLogger(__name__)
 
 
@@ -76,24 +81,35 @@ class ModelServer:
             )
             self.management_url = self.inference_url
         
-        self._inference_client = httpx.AsyncClient(
-            base_url=self.inference_url,
-            timeout=timeout
-        )
-        self._management_client = httpx.AsyncClient(
-            base_url=self.management_url,
-            timeout=timeout
-        )
+        # HTTP clients are opened by the first request rather than at import
+        self._clients: Dict[str, "httpx.AsyncClient"] = {}
         
         logger.info(
             f"Model server client initialized: {server_type.value} "
             f"at {self.inference_url}"
         )
     
+    def _get_client(self, base_url: str) -> "httpx.AsyncClient":
+        if base_url not in self._clients:
+            self._clients[base_url] = lazy_import("httpx").AsyncClient(
+                base_url=base_url,
+                timeout=self.timeout
+            )
+        return self._clients[base_url]
+    
+    @property
+    def _inference_client(self) -> "httpx.AsyncClient":
+        return self._get_client(self.inference_url)
+    
+    @property
+    def _management_client(self) -> "httpx.AsyncClient":
+        return self._get_client(self.management_url)
+    
     async def close(self):
         """Close HTTP clients"""
-        await self._inference_client.aclose()
-        await self._management_client.aclose()
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
     
     async def health_check(self) -> bool:
         """Check if model server is healthy"""
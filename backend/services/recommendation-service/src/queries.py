@@ -0,0 +1,186 @@
+"""
+Prepared Query Registry
+Fixed SQL for the hot recommendation queries, prepared once per pooled connection
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import logging
+from typing import Dict, List
+
+import asyncpg
+
+from src.db_metrics import pool_metrics
+
+logger = logging.getLogger(__name__)
+
+_LISTING_COLUMNS = """
+    l.id, l.title, l."categoryId" as category_id,
+    c.name as category_name,
+    l.price, l.condition, l."sellerId" as seller_id
+"""
+
+_ACTIVE_PRODUCTS = """
+    SELECT {columns},
+        u.rating as seller_rating, l."viewCount" as view_count,
+        l.images, l.city, l.country
+    FROM "Listing" l
+    LEFT JOIN "Category" c ON l."categoryId" = c.id
+    LEFT JOIN "User" u ON l."sellerId" = u.id
+    WHERE l.status = 'ACTIVE' AND l."isActive" = true{filters}
+    ORDER BY l."viewCount" DESC, l."createdAt" DESC
+    LIMIT ${limit}
+"""
+
+_TRENDING_PRODUCTS = """
+    SELECT {columns},
+        l."viewCount" as view_count, l.images,
+        COUNT(b.id) as bid_count
+    FROM "Listing" l
+    LEFT JOIN "Category" c ON l."categoryId" = c.id
+    LEFT JOIN "Bid" b ON l.id = b."listingId"
+        AND b."createdAt" > NOW() - make_interval(hours => $1)
+    WHERE l.status = 'ACTIVE' AND l."isActive" = true{filters}
+    GROUP BY l.id, c.name
+    ORDER BY bid_count DESC, l."viewCount" DESC
+    LIMIT ${limit}
+"""
+
+_SIMILAR_BY_CATEGORY = """
+    SELECT {columns},
+        u.rating as seller_rating, l."viewCount" as view_count,
+        l.images,
+        ABS(l.price - $2) as price_diff
+    FROM "Listing" l
+    LEFT JOIN "Category" c ON l."categoryId" = c.id
+    LEFT JOIN "User" u ON l."sellerId" = u.id
+    WHERE l.status = 'ACTIVE'
+      AND l."isActive" = true
+      AND l."categoryId" = $1
+      AND l.id != $3{filters}
+    ORDER BY price_diff ASC, l."viewCount" DESC
+    LIMIT ${limit}
+"""
+
+_PRODUCT_DETAILS = """
+    SELECT {columns},
+        u.rating as seller_rating, l."viewCount" as view_count,
+        l.images, l.city, l.country, l.description
+    FROM "Listing" l
+    LEFT JOIN "Category" c ON l."categoryId" = c.id
+    LEFT JOIN "User" u ON l."sellerId" = u.id
+    WHERE l.id = ANY($1)
+"""
+
+_CATALOG_STREAM = """
+    SELECT {columns},
+        l."viewCount" as view_count, l.description
+    FROM "Listing" l
+    LEFT JOIN "Category" c ON l."categoryId" = c.id
+    WHERE l.status = 'ACTIVE' AND l."isActive" = true
+    ORDER BY l.id
+"""
+
+# Every listing touched since a watermark, including ones no longer active
+_CATALOG_CHANGES = """
+    SELECT {columns},
+        l."viewCount" as view_count, l.description,
+        (l.status = 'ACTIVE' AND l."isActive" = true) as active,
+        l."updatedAt" as updated_at
+    FROM "Listing" l
+    LEFT JOIN "Category" c ON l."categoryId" = c.id
+    WHERE l."updatedAt" >= $1
+    ORDER BY l."updatedAt", l.id
+    LIMIT $2
+"""
+
+
+def _variant(template: str, filters: List[str], first_param: int) -> str:
+    """Render a query with its optional filters numbered from first_param"""
+    clauses = "".join(
+        f"\n      AND {clause.format(first_param + i)}" for i, clause in enumerate(filters)
+    )
+    return template.format(
+        columns=_LISTING_COLUMNS.strip(),
+        filters=clauses,
+        limit=first_param + len(filters)
+    )
+
+
+def active_products_query(by_category: bool, excluding: bool) -> str:
+    """Registry name for a get_active_products filter combination"""
+    return "active_products" + ("_by_category" if by_category else "") + ("_excluding" if excluding else "")
+
+
+def trending_products_query(by_category: bool) -> str:
+    """Registry name for a get_trending_products filter combination"""
+    return "trending_products" + ("_by_category" if by_category else "")
+
+
+def similar_by_category_query(other_sellers: bool) -> str:
+    """Registry name for a get_similar_products_by_category filter combination"""
+    return "similar_by_category" + ("_other_sellers" if other_sellers else "")
+
+
+QUERIES: Dict[str, str] = {
+    "product_details": _PRODUCT_DETAILS.format(columns=_LISTING_COLUMNS.strip()),
+    "catalog_stream": _CATALOG_STREAM.format(columns=_LISTING_COLUMNS.strip()),
+    "catalog_changes": _CATALOG_CHANGES.format(columns=_LISTING_COLUMNS.strip()),
+    # Any insert, edit or deactivation moves this forward
+    "catalog_watermark": 'SELECT MAX("updatedAt") as updated_at FROM "Listing"'
+}
+
+for _by_category in (False, True):
+    for _excluding in (False, True):
+        QUERIES[active_products_query(_by_category, _excluding)] = _variant(
+            _ACTIVE_PRODUCTS,
+            (['l."categoryId" = ${}'] if _by_category else [])
+            + (['l.id != ALL(${})'] if _excluding else []),
+            first_param=1
+        )
+    QUERIES[trending_products_query(_by_category)] = _variant(
+        _TRENDING_PRODUCTS, ['l."categoryId" = ${}'] if _by_category else [], first_param=2
+    )
+
+for _other_sellers in (False, True):
+    QUERIES[similar_by_category_query(_other_sellers)] = _variant(
+        _SIMILAR_BY_CATEGORY, ['l."sellerId" != ${}'] if _other_sellers else [], first_param=4
+    )
+
+
+class PreparedConnection(asyncpg.Connection):
+    """Pool connection holding one prepared statement per registry query"""
+    
+    async def prepare_registry(self) -> None:
+        """Prepare every registry query; used as the pool's init hook"""
+        self.statements: Dict[str, asyncpg.prepared_stmt.PreparedStatement] = {}
+        for name, sql in QUERIES.items():
+            self.statements[name] = await self.prepare(sql)
+    
+    async def fetch_prepared(self, name: str, *args) -> List[asyncpg.Record]:
+        """Run a registry query through its prepared statement, timing it"""
+        with pool_metrics.timed_query(name):
+            return await self._fetch_prepared(name, *args)
+    
+    async def _fetch_prepared(self, name: str, *args) -> List[asyncpg.Record]:
+        statements = getattr(self, "statements", None)
+        if statements is None:
+            return await self.fetch(QUERIES[name], *args)
+        
+        try:
+            return await statements[name].fetch(*args)
+        except asyncpg.exceptions.InvalidCachedStatementError:
+            # Schema changed under the statement; prepare it again once
+            logger.info(f"Re-preparing statement {name}")
+            statements[name] = await self.prepare(QUERIES[name])
+            return await statements[name].fetch(*args)
+    
+    async def cursor_prepared(self, name: str, *args) -> asyncpg.cursor.Cursor:
+        """Open a server-side cursor over a registry query; needs an open transaction"""
+        statements = getattr(self, "statements", None)
+        if statements is None:
+            return await self.cursor(QUERIES[name], *args)
+        return await statements[name].cursor(*args)
+
+
+async def prepare_statements(conn: PreparedConnection) -> None:
+    """Pool init hook"""
+    await conn.prepare_registry()
@@ -0,0 +1,24 @@
+"""
+Recommendation Engine
+The engine is maintained in ai-core and imports this service's src.* modules;
+this module loads it in place so the service imports src.recommendation_engine
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import importlib.util
+import os
+import sys
+
+# Engine source; override when ai-core is not checked out next to this service
+AI_CORE_ENGINE_PATH = os.getenv(
+    "AI_CORE_ENGINE_PATH",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "..", "..", "ai-core", "src", "recommendation_engine.py"
+    )
+)
+
+_spec = importlib.util.spec_from_file_location(__name__, AI_CORE_ENGINE_PATH)
+_engine = importlib.util.module_from_spec(_spec)
+# The import system returns sys.modules[__name__], so importers get the engine itself
+sys.modules[__name__] = _engine
+_spec.loader.exec_module(_engine)
@@ -0,0 +1,449 @@
+"""
+Travel Request Store
+Open travel requests and their geo, keyword and category indexes, served as
+one snapshot and kept in sync with Postgres
+Requirements: 13.1, 13.2 - Camera/mic event handling and matching
+"""
+import asyncio
+import heapq
+import logging
+import os
+import threading
+from collections import defaultdict
+from collections.abc import Mapping
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+from src import database
+from src.geo_index import MAX_DISTANCE_KM, GeoIndex
+from src.keyword_index import KeywordIndex
+
+logger = logging.getLogger(__name__)
+
+# How often the request table is polled for changes since the snapshot's watermark
+REQUEST_SYNC_SECONDS = float(os.getenv("REQUEST_SYNC_SECONDS", "10"))
+# Full reload interval even without a watermark change (catches hard deletes)
+REQUEST_RELOAD_SECONDS = float(os.getenv("REQUEST_RELOAD_SECONDS", "3600"))
+# Most changed requests applied in one sync; more triggers a full reload
+REQUEST_SYNC_MAX_ROWS = int(os.getenv("REQUEST_SYNC_MAX_ROWS", "10000"))
+# Changes held in a snapshot's overlay before the sync loop compacts it
+REQUEST_OVERLAY_MAX_CHANGES = int(os.getenv("REQUEST_OVERLAY_MAX_CHANGES", "1000"))
+
+
+def request_from_row(row: Mapping[str, Any]) -> Dict:
+    """Request dict in the shape matching expects, from a database row"""
+    return {
+        "id": str(row["id"]),
+        "item_name": row["item_name"],
+        "location_name": row["location_name"],
+        "lat": float(row["lat"]),
+        "lon": float(row["lon"]),
+        "reward": row["reward"],
+        "category": row.get("category"),
+        "keywords": list(row.get("keywords") or [])
+    }
+
+
+@dataclass
+class RequestIndexes:
+    """A set of requests and their geo, category and keyword indexes, never modified once built"""
+    requests: Dict[str, Dict]                 # by id, oldest first
+    geo: GeoIndex
+    by_category: Dict[str, Dict[str, Dict]]   # category -> requests by id
+    keywords: KeywordIndex
+    
+    @classmethod
+    def build(cls, requests: Dict[str, Dict]) -> "RequestIndexes":
+        geo = GeoIndex(capacity=max(len(requests), 1))
+        if requests:
+            geo.add_many(
+                list(requests),
+                [request["lat"] for request in requests.values()],
+                [request["lon"] for request in requests.values()]
+            )
+        
+        by_category: Dict[str, Dict[str, Dict]] = defaultdict(dict)
+        for request_id, request in requests.items():
+            by_category[request.get("category")][request_id] = request
+        
+        return cls(
+            requests=requests,
+            geo=geo,
+            by_category=dict(by_category),
+            keywords=KeywordIndex(requests)
+        )
+
+
+class _Merged(Mapping):
+    """Read-only view of the base entries not hidden, followed by the overlay entries"""
+    
+    def __init__(self, base: Mapping, overlay: Mapping, hidden: FrozenSet[str]):
+        self._base = base
+        self._overlay = overlay
+        self._hidden = hidden
+    
+    def __getitem__(self, key: str):
+        if key in self._overlay:
+            return self._overlay[key]
+        if key in self._hidden:
+            raise KeyError(key)
+        return self._base[key]
+    
+    def __contains__(self, key) -> bool:
+        return key in self._overlay or (key not in self._hidden and key in self._base)
+    
+    def __iter__(self) -> Iterator[str]:
+        hidden = self._hidden
+        for key in self._base:
+            if key not in hidden:
+                yield key
+        yield from self._overlay
+    
+    def __len__(self) -> int:
+        hidden_in_base = sum(1 for key in self._hidden if key in self._base)
+        return len(self._base) - hidden_in_base + len(self._overlay)
+
+
+def _merge_hits(base: List[Tuple[str, float]], overlay: List[Tuple[str, float]],
+                limit: Optional[int]) -> List[Tuple[str, float]]:
+    merged = list(heapq.merge(base, overlay, key=lambda hit: hit[1]))
+    return merged if limit is None else merged[:limit]
+
+
+class _MergedGeo:
+    """GeoIndex queries over a base index minus hidden keys, plus an overlay index"""
+    
+    def __init__(self, base: GeoIndex, overlay: GeoIndex, hidden: FrozenSet[str]):
+        self._base = base
+        self._overlay = overlay
+        self._hidden = hidden
+    
+    def _base_predicate(self, predicate: Optional[Callable[[str], bool]]):
+        hidden = self._hidden
+        if not hidden:
+            return predicate
+        if predicate is None:
+            return lambda key: key not in hidden
+        return lambda key: key not in hidden and predicate(key)
+    
+    def query_radius(self, lat: float, lon: float, radius_km: float,
+                     predicate: Optional[Callable[[str], bool]] = None,
+                     limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        base = self._base.query_radius(lat, lon, radius_km, self._base_predicate(predicate), limit)
+        if not len(self._overlay):
+            return base
+        overlay = self._overlay.query_radius(lat, lon, radius_km, predicate, limit)
+        return _merge_hits(base, overlay, limit)
+    
+    def query_radius_many(self, lats: Iterable[float], lons: Iterable[float], radius_km: float,
+                          predicate: Optional[Callable[[str], bool]] = None,
+                          limit: Optional[int] = None) -> List[List[Tuple[str, float]]]:
+        base = self._base.query_radius_many(lats, lons, radius_km, self._base_predicate(predicate), limit)
+        if not len(self._overlay):
+            return base
+        overlay = self._overlay.query_radius_many(lats, lons, radius_km, predicate, limit)
+        return [_merge_hits(b, o, limit) for b, o in zip(base, overlay)]
+    
+    def query_nearest(self, lat: float, lon: float, k: int, max_radius_km: float = MAX_DISTANCE_KM,
+                      predicate: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        base = self._base.query_nearest(lat, lon, k, max_radius_km, self._base_predicate(predicate))
+        if not len(self._overlay):
+            return base
+        overlay = self._overlay.query_nearest(lat, lon, k, max_radius_km, predicate)
+        return _merge_hits(base, overlay, k)
+
+
+class _MergedKeywords:
+    """KeywordIndex lookups over a base index minus hidden ids, plus an overlay index"""
+    
+    def __init__(self, base: KeywordIndex, overlay: KeywordIndex, hidden: FrozenSet[str]):
+        self._base = base
+        self._overlay = overlay
+        self._hidden = hidden
+        self.terms = _Merged(base.terms, overlay.terms, hidden)
+    
+    def candidates(self, detected: str, detected_words: Set[str]) -> Set[str]:
+        found = self._base.candidates(detected, detected_words)
+        if self._hidden:
+            found -= self._hidden
+        if len(self._overlay):
+            found |= self._overlay.candidates(detected, detected_words)
+        return found
+    
+    def in_order(self, request_ids: Iterable[str]) -> List[str]:
+        """Base requests in their order, then overlay requests in theirs"""
+        base_position, overlay_position = self._base.position, self._overlay.position
+        offset = len(self._base)
+        return sorted(
+            request_ids,
+            key=lambda request_id: offset + overlay_position[request_id]
+            if request_id in overlay_position else base_position[request_id]
+        )
+
+
+@dataclass
+class RequestSnapshot:
+    """
+    Open requests and their indexes at one point in time.
+    
+    A full build indexes every request in the base. Later changes go to a
+    small overlay (added or updated requests, in their own indexes) and a
+    set of hidden base ids (closed or updated requests), so applying a
+    change costs the size of the overlay, not of the whole set. Lookups
+    merge base and overlay; compacted() folds the overlay back into a new
+    base. A snapshot is never modified: changes produce a new one, and
+    callers holding a reference keep a consistent view across all indexes.
+    """
+    base: RequestIndexes
+    overlay: RequestIndexes = field(default_factory=lambda: RequestIndexes.build({}))
+    hidden: FrozenSet[str] = frozenset()
+    watermark: Optional[datetime] = None
+    built_at: datetime = field(default_factory=datetime.utcnow)
+    
+    def __post_init__(self):
+        self.requests: Mapping[str, Dict] = _Merged(self.base.requests, self.overlay.requests, self.hidden)
+        self.geo = _MergedGeo(self.base.geo, self.overlay.geo, self.hidden)
+        self.keywords = _MergedKeywords(self.base.keywords, self.overlay.keywords, self.hidden)
+    
+    @classmethod
+    def build(cls, requests: Iterable[Dict], watermark: Optional[datetime] = None) -> "RequestSnapshot":
+        """
+        Index a set of requests.
+        
+        Args:
+            requests: Request dicts, oldest first; a repeated id replaces the earlier one
+            watermark: Latest updatedAt the requests reflect, if loaded from the database
+        
+        Returns:
+            The snapshot
+        """
+        by_id: Dict[str, Dict] = {}
+        for request in requests:
+            if _valid(request):
+                by_id.pop(request["id"], None)
+                by_id[request["id"]] = request
+        return cls(base=RequestIndexes.build(by_id), watermark=watermark)
+    
+    def in_category(self, category: str) -> Mapping[str, Dict]:
+        """Open requests in a category by id, oldest first"""
+        return _Merged(
+            self.base.by_category.get(category, {}),
+            self.overlay.by_category.get(category, {}),
+            self.hidden
+        )
+    
+    @property
+    def pending_changes(self) -> int:
+        """Changes held in the overlay since the base was built"""
+        return len(self.overlay.requests) + len(self.hidden)
+    
+    def with_changes(self, upserts: Iterable[Dict], removals: Iterable[str],
+                     watermark: Optional[datetime] = None) -> "RequestSnapshot":
+        """
+        A new snapshot with requests added, moved or closed.
+        
+        Only the overlay is rebuilt; the base indexes are shared with this
+        snapshot, which stays valid for readers still holding it.
+        
+        Args:
+            upserts: New or updated requests; updated ones move to the end
+            removals: IDs of requests no longer open
+            watermark: New watermark; defaults to this snapshot's
+        
+        Returns:
+            The new snapshot
+        """
+        overlay = dict(self.overlay.requests)
+        hidden = set(self.hidden)
+        for request_id in removals:
+            overlay.pop(request_id, None)
+            if request_id in self.base.requests:
+                hidden.add(request_id)
+        for request in upserts:
+            if not _valid(request):
+                continue
+            overlay.pop(request["id"], None)
+            overlay[request["id"]] = request
+            if request["id"] in self.base.requests:
+                hidden.add(request["id"])
+        return RequestSnapshot(
+            base=self.base,
+            overlay=RequestIndexes.build(overlay),
+            hidden=frozenset(hidden),
+            watermark=watermark or self.watermark
+        )
+    
+    def with_watermark(self, watermark: datetime) -> "RequestSnapshot":
+        """The same requests and indexes at a later watermark"""
+        return replace(self, watermark=watermark)
+    
+    def compacted(self) -> "RequestSnapshot":
+        """The same requests with the overlay merged into a new base; costs a full build"""
+        return RequestSnapshot.build(self.requests.values(), self.watermark)
+    
+    def __len__(self) -> int:
+        return len(self.requests)
+
+
+def _valid(request: Dict) -> bool:
+    if -90 <= request["lat"] <= 90:
+        return True
+    logger.warning(f"Skipping request {request['id']} with latitude {request['lat']}")
+    return False
+
+
+class RequestStore:
+    """
+    Holds the current RequestSnapshot and replaces it as requests change.
+    
+    Readers use .snapshot without locking; swapping it is a single
+    attribute assignment. Writers (load, sync, compact, upsert, remove)
+    are serialized so that no change is built on a stale snapshot and
+    lost. The lock is only held to apply changes to the overlay; full
+    builds happen off the event loop and outside it. Until the first
+    successful load, the store serves the seed requests it was created
+    with.
+    """
+    
+    def __init__(self, seed: Iterable[Dict] = ()):
+        self._snapshot = RequestSnapshot.build(seed)
+        self._write_lock = threading.Lock()
+        self.loaded_at: Optional[datetime] = None
+    
+    @property
+    def snapshot(self) -> RequestSnapshot:
+        """Current snapshot; hold on to it for the duration of one lookup"""
+        return self._snapshot
+    
+    def _update(self, upserts: List[Dict], removals: List[str],
+                watermark: Optional[datetime] = None) -> RequestSnapshot:
+        with self._write_lock:
+            self._snapshot = self._snapshot.with_changes(upserts, removals, watermark)
+            return self._snapshot
+    
+    def upsert(self, request: Dict) -> None:
+        """Index a new or updated request"""
+        self._update([request], [])
+    
+    def remove(self, request_id: str) -> bool:
+        """Stop serving a request; returns whether it was open"""
+        with self._write_lock:
+            if request_id not in self._snapshot.requests:
+                return False
+            self._snapshot = self._snapshot.with_changes([], [request_id])
+            return True
+    
+    async def compact(self) -> bool:
+        """
+        Fold the current overlay into a new base, off the event loop.
+        
+        Returns:
+            Whether the compacted snapshot was swapped in; a change made
+            during the build leaves the overlay for the next compaction
+        """
+        current = self._snapshot
+        if not current.pending_changes:
+            return False
+        compacted = await asyncio.to_thread(current.compacted)
+        with self._write_lock:
+            if self._snapshot is not current:
+                return False
+            self._snapshot = compacted
+        logger.debug(f"Compacted {current.pending_changes} travel request changes")
+        return True
+    
+    async def load(self) -> int:
+        """
+        Replace the snapshot with every open request in the database.
+        
+        Rows are streamed in chunks and indexed off the event loop. Local
+        upserts made before the load are dropped; the database is the
+        source of truth.
+        
+        Returns:
+            Number of requests loaded
+        """
+        requests: List[Dict] = []
+        watermark = None
+        async for watermark, rows in database.iter_open_request_chunks():
+            requests.extend(request_from_row(row) for row in rows)
+        
+        snapshot = await asyncio.to_thread(RequestSnapshot.build, requests, watermark)
+        with self._write_lock:
+            self._snapshot = snapshot
+        self.loaded_at = datetime.utcnow()
+        logger.info(f"Loaded {len(snapshot)} open travel requests (watermark {watermark})")
+        return len(snapshot)
+    
+    async def sync(self) -> bool:
+        """
+        Apply requests changed since the snapshot's watermark.
+        
+        Changes are read with an inclusive watermark, so rows already
+        applied come back and are skipped; a new snapshot is only made when
+        something differs. When nothing does (e.g. requests closed before
+        they were ever loaded), only the watermark moves, so those rows are
+        not read again. Changes go to the snapshot's overlay, which is
+        compacted once it holds REQUEST_OVERLAY_MAX_CHANGES. Too many
+        changes fall back to a full load.
+        
+        Returns:
+            Whether the snapshot changed
+        """
+        current = self._snapshot
+        if self.loaded_at is None or current.watermark is None:
+            await self.load()
+            return True
+        
+        changes = await database.get_request_changes(current.watermark, REQUEST_SYNC_MAX_ROWS + 1)
+        if len(changes) > REQUEST_SYNC_MAX_ROWS:
+            logger.info(f"More than {REQUEST_SYNC_MAX_ROWS} travel requests changed; reloading")
+            await self.load()
+            return True
+        
+        upserts, removals = [], []
+        for row in changes:
+            request_id = str(row["id"])
+            if row["open"]:
+                request = request_from_row(row)
+                if current.requests.get(request_id) != request:
+                    upserts.append(request)
+            elif request_id in current.requests:
+                removals.append(request_id)
+        
+        watermark = max([current.watermark] + [row["updated_at"] for row in changes])
+        if not upserts and not removals:
+            if watermark > current.watermark:
+                with self._write_lock:
+                    if self._snapshot.watermark is not None and watermark > self._snapshot.watermark:
+                        self._snapshot = self._snapshot.with_watermark(watermark)
+            return False
+        snapshot = await asyncio.to_thread(self._update, upserts, removals, watermark)
+        if snapshot.pending_changes > REQUEST_OVERLAY_MAX_CHANGES:
+            await self.compact()
+        logger.debug(
+            f"Applied {len(upserts)} updated and {len(removals)} closed travel requests "
+            f"({len(snapshot)} open)"
+        )
+        return True
+    
+    async def run_sync_loop(
+        self,
+        interval_seconds: float = REQUEST_SYNC_SECONDS,
+        reload_seconds: float = REQUEST_RELOAD_SECONDS
+    ):
+        """Poll for request changes, with a full reload every reload_seconds"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                if self.loaded_at is not None and \
+                        (datetime.utcnow() - self.loaded_at).total_seconds() > reload_seconds:
+                    await self.load()
+                else:
+                    await self.sync()
+                    # Local upserts and removals also land in the overlay
+                    if self._snapshot.pending_changes > REQUEST_OVERLAY_MAX_CHANGES:
+                        await self.compact()
+            except Exception as e:
+                logger.error(f"Travel request sync failed: {e}")
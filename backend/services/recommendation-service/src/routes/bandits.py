@@ -11,11 +11,11 @@ import uuid
 
 from src.bandits import (
     ThompsonSamplingBandit,
-    ContextualBandit,
-    RewardTracker
+    ContextualBandit
 )
 from src.bandits.contextual_bandit import ContextFeatures
-from src.bandits.reward_tracker import RewardType
+from src.bandits.reward_tracker import RewardType, reward_tracker
+from src.recommendation_engine import recommendation_engine
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -27,7 +27,6 @@ contextual_bandit = ContextualBandit(
     alpha=1.0,
     use_thompson=True
 )
-reward_tracker = RewardTracker()
 
 # Register callback to update bandits on rewards
 def update_bandits_callback(arm_rewards: Dict[str, List[float]]):
@@ -38,6 +37,19 @@ def update_bandits_callback(arm_rewards: Dict[str, List[float]]):
 reward_tracker.register_callback(update_bandits_callback)
 
 
+def record_collaborative_interaction(user_id: str, arm_id: str, reward_type: RewardType):
+    """Stream product rewards into the collaborative model as interaction deltas"""
+    if reward_type == RewardType.IMPRESSION:
+        return
+    if not (user_id.isdigit() and arm_id.isdigit()):
+        return  # Arm is not a product listing
+    recommendation_engine.record_interaction(
+        user_id=int(user_id),
+        product_id=int(arm_id),
+        interaction_type=reward_type.value
+    )
+
+
 class BanditSelectRequest(BaseModel):
     """Request for bandit arm selection"""
     user_id: str
@@ -215,6 +227,8 @@ async def track_reward(request: RewardEventRequest):
             recommendation_id=request.recommendation_id
         )
         
+        record_collaborative_interaction(request.user_id, request.arm_id, reward_type)
+        
         # Update contextual bandit if we have context
         if request.context:
             ctx = request.context
@@ -8,20 +8,16 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
 
-from src.ml_pipeline import FeatureStore, RetrainingPipeline, ModelMonitor
+# Shared with the rest of the service: one instance of each per process
+from src.ml_pipeline.feature_store import feature_store
 from src.ml_pipeline.retraining_pipeline import (
-    RetrainingConfig, TriggerType, PipelineStatus
+    RetrainingConfig, TriggerType, PipelineStatus, retraining_pipeline
 )
-from src.ml_pipeline.model_monitor import MetricType, AlertSeverity
+from src.ml_pipeline.model_monitor import MetricType, AlertSeverity, model_monitor
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize components
-feature_store = FeatureStore()
-retraining_pipeline = RetrainingPipeline()
-model_monitor = ModelMonitor()
-
 
 # Request/Response Models
 class FeatureRequest(BaseModel):
@@ -5,6 +5,7 @@ Requirements: 17.4 - Personalized recommendations based on browsing history
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List
 import logging
+import os
 
 from src.models import (
     RecommendationRequest, RecommendationResponse, RecommendationType,
@@ -12,10 +13,17 @@ from src.models import (
     RecommendedProduct
 )
 from src.recommendation_engine import recommendation_engine
+from src.cache import response_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# How long each route's responses stay fresh in the response cache
+TRENDING_CACHE_TTL_SECONDS = float(os.getenv("TRENDING_CACHE_TTL_SECONDS", "60"))
+HOMEPAGE_CACHE_TTL_SECONDS = float(os.getenv("HOMEPAGE_CACHE_TTL_SECONDS", "30"))
+PRODUCT_RECS_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_RECS_CACHE_TTL_SECONDS", "300"))
+USER_RECS_CACHE_TTL_SECONDS = float(os.getenv("USER_RECS_CACHE_TTL_SECONDS", "60"))
+
 
 @router.post("/personalized", response_model=RecommendationResponse)
 async def get_personalized_recommendations(request: RecommendationRequest):
@@ -72,7 +80,7 @@ async def get_trending_products(request: TrendingRequest):
     """
     Get trending products based on recent activity (bids, views).
     """
-    try:
+    async def compute():
         recommendations = await recommendation_engine.get_trending_products(
             category_id=request.category_id,
             hours=request.time_window_hours,
@@ -86,6 +94,11 @@ async def get_trending_products(request: TrendingRequest):
                 "time_window_hours": request.time_window_hours,
                 "category_id": request.category_id
             }
+        ).model_dump(mode="json")
+    
+    try:
+        return await response_cache.get_or_compute(
+            "trending", request.model_dump(mode="json"), compute, TRENDING_CACHE_TTL_SECONDS
         )
     except Exception as e:
         logger.error(f"Error getting trending products: {e}")
@@ -100,8 +113,9 @@ async def get_homepage_recommendations(
     """
     Get mixed recommendations for homepage display.
     Returns trending, featured, and personalized (if user_id provided) sections.
+    Responses with sections that timed out or failed are not cached.
     """
-    try:
+    async def compute():
         result = await recommendation_engine.get_homepage_recommendations(
             user_id=user_id,
             limit=limit
@@ -111,11 +125,18 @@ async def get_homepage_recommendations(
             "status": "success",
             "user_id": user_id,
             "sections": {
-                "trending": [r.model_dump() for r in result.get('trending', [])],
-                "featured": [r.model_dump() for r in result.get('featured', [])],
-                "personalized": [r.model_dump() for r in result.get('personalized', [])] if user_id else []
-            }
+                "trending": [r.model_dump(mode="json") for r in result.get('trending', [])],
+                "featured": [r.model_dump(mode="json") for r in result.get('featured', [])],
+                "personalized": [r.model_dump(mode="json") for r in result.get('personalized', [])] if user_id else []
+            },
+            "partial_sections": result.get('partial', [])
         }
+    
+    try:
+        return await response_cache.get_or_compute(
+            "homepage", {"user_id": user_id, "limit": limit}, compute, HOMEPAGE_CACHE_TTL_SECONDS,
+            cacheable=lambda response: not response["partial_sections"]
+        )
     except Exception as e:
         logger.error(f"Error getting homepage recommendations: {e}")
         raise HTTPException(status_code=500, detail="Failed to get homepage recommendations")
@@ -131,7 +152,7 @@ async def get_recommendations_for_product(
     Get product recommendations to show on a product detail page.
     Combines similar products and trending in same category.
     """
-    try:
+    async def compute():
         similar = await recommendation_engine.get_similar_products(
             product_id=product_id,
             limit=limit,
@@ -141,8 +162,16 @@ async def get_recommendations_for_product(
         return {
             "status": "success",
             "product_id": product_id,
-            "similar_products": [r.model_dump() for r in similar]
+            "similar_products": [r.model_dump(mode="json") for r in similar]
         }
+    
+    try:
+        return await response_cache.get_or_compute(
+            "for-product",
+            {"product_id": product_id, "limit": limit, "include_same_seller": include_same_seller},
+            compute,
+            PRODUCT_RECS_CACHE_TTL_SECONDS
+        )
     except Exception as e:
         logger.error(f"Error getting product recommendations: {e}")
         raise HTTPException(status_code=500, detail="Failed to get product recommendations")
@@ -158,7 +187,7 @@ async def get_recommendations_for_user(
     Get personalized recommendations for a specific user.
     Shorthand endpoint for quick access.
     """
-    try:
+    async def compute():
         recommendations = await recommendation_engine.get_personalized_recommendations(
             user_id=user_id,
             limit=limit,
@@ -169,8 +198,31 @@ async def get_recommendations_for_user(
             "status": "success",
             "user_id": user_id,
             "recommendation_type": recommendation_type.value,
-            "recommendations": [r.model_dump() for r in recommendations]
+            "recommendations": [r.model_dump(mode="json") for r in recommendations]
         }
+    
+    try:
+        return await response_cache.get_or_compute(
+            "for-user",
+            {"user_id": user_id, "limit": limit, "recommendation_type": recommendation_type.value},
+            compute,
+            USER_RECS_CACHE_TTL_SECONDS
+        )
     except Exception as e:
         logger.error(f"Error getting user recommendations: {e}")
         raise HTTPException(status_code=500, detail="Failed to get user recommendations")
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Get recommendation cache statistics (size, hit rate, evictions).
+    Use to size caches in production.
+    """
+    return {
+        "status": "success",
+        "caches": {
+            **recommendation_engine.get_cache_stats(),
+            "responses": response_cache.get_stats()
+        }
+    }
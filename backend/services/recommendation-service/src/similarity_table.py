@@ -0,0 +1,238 @@
+"""
+Precomputed Top-K Similar Products Table
+Offline blocked sparse similarity with a memory-mapped, array-backed store
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from src.snapshot_store import load_arrays, save_arrays
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_TABLE_DIR = os.getenv("SIMILARITY_TABLE_DIR", "/tmp/mnbara/similarity_table")
+SIMILARITY_TABLE_K = int(os.getenv("SIMILARITY_TABLE_K", "50"))
+
+# Catalogs at least this large are split across worker processes
+PARALLEL_MIN_PRODUCTS = 50000
+# Upper bound for one dense block of similarity scores
+BLOCK_BUDGET_BYTES = 256 * 1024 * 1024
+
+_ARRAYS = ("product_ids", "seller_ids", "neighbor_idx", "neighbor_sim")
+
+# Matrix and its transpose shared with worker processes (set by _init_worker)
+_worker_vectors: Optional[sparse.csr_matrix] = None
+_worker_vectors_t: Optional[sparse.csc_matrix] = None
+
+
+def _top_k_block(
+    vectors: sparse.csr_matrix,
+    vectors_t: sparse.csc_matrix,
+    start: int,
+    stop: int,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k cosine neighbours for rows [start, stop) (rows are L2-normalized)"""
+    scores = (vectors[start:stop] @ vectors_t).toarray().astype(np.float32)
+    scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf  # exclude self
+    
+    k = min(k, scores.shape[1] - 1)
+    if k <= 0:
+        empty = np.empty((stop - start, 0))
+        return empty.astype(np.int32), empty.astype(np.float32)
+    
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1).astype(np.int32)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    
+    # Products with no shared terms are not neighbours
+    top[top_scores <= 0] = -1
+    top_scores[top_scores <= 0] = 0.0
+    return top, top_scores
+
+
+def _init_worker(vectors: sparse.csr_matrix, vectors_t: sparse.csc_matrix):
+    global _worker_vectors, _worker_vectors_t
+    _worker_vectors = vectors
+    _worker_vectors_t = vectors_t
+
+
+def _worker_range(args: Tuple[int, int, int, int]) -> Tuple[int, np.ndarray, np.ndarray]:
+    """Compute top-k for rows [start, stop) in block_rows steps inside a worker"""
+    start, stop, block_rows, k = args
+    idx_parts, sim_parts = [], []
+    for block_start in range(start, stop, block_rows):
+        block_stop = min(block_start + block_rows, stop)
+        idx, sim = _top_k_block(_worker_vectors, _worker_vectors_t, block_start, block_stop, k)
+        idx_parts.append(idx)
+        sim_parts.append(sim)
+    return start, np.vstack(idx_parts), np.vstack(sim_parts)
+
+
+class SimilarityTable:
+    """
+    Top-k similar products per product, stored as flat arrays.
+    
+    Rows are aligned across product_ids, seller_ids, neighbor_idx and
+    neighbor_sim; neighbour lists are sorted by similarity and padded
+    with -1. Loaded tables are memory-mapped so worker processes share
+    the same pages.
+    
+    content_built_at records the fit of the content model the table was
+    computed from, so workers can tell whether a saved table is current.
+    """
+    
+    def __init__(
+        self,
+        product_ids: np.ndarray,
+        seller_ids: np.ndarray,
+        neighbor_idx: np.ndarray,
+        neighbor_sim: np.ndarray,
+        built_at: Optional[datetime] = None,
+        content_built_at: Optional[datetime] = None,
+        version: Optional[str] = None
+    ):
+        self.product_ids = product_ids
+        self.seller_ids = seller_ids
+        self.neighbor_idx = neighbor_idx
+        self.neighbor_sim = neighbor_sim
+        self.built_at = built_at or datetime.utcnow()
+        self.content_built_at = content_built_at
+        # On-disk version name once saved or loaded
+        self.version = version
+        self.index: Dict[int, int] = {int(pid): i for i, pid in enumerate(product_ids)}
+    
+    @property
+    def k(self) -> int:
+        return self.neighbor_idx.shape[1]
+    
+    def __len__(self) -> int:
+        return len(self.product_ids)
+    
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self.index
+    
+    def neighbors(
+        self,
+        product_id: int,
+        limit: int = 10,
+        exclude_same_seller: bool = True
+    ) -> List[Tuple[int, float]]:
+        """Get precomputed similar products, filtering the source's seller"""
+        row = self.index.get(product_id)
+        if row is None:
+            return []
+        
+        cols = np.asarray(self.neighbor_idx[row])
+        sims = np.asarray(self.neighbor_sim[row])
+        valid = cols >= 0
+        
+        source_seller = self.seller_ids[row]
+        if exclude_same_seller and source_seller:
+            valid &= self.seller_ids[np.where(valid, cols, 0)] != source_seller
+        
+        cols, sims = cols[valid][:limit], sims[valid][:limit]
+        return [(int(pid), float(sim)) for pid, sim in zip(self.product_ids[cols], sims)]
+    
+    def save(self, directory: str = SIMILARITY_TABLE_DIR) -> str:
+        """
+        Write the arrays to a new versioned subdirectory and atomically
+        point CURRENT at it. Older versions except the previous one are removed.
+        """
+        content_built_at = self.content_built_at.isoformat() if self.content_built_at else None
+        target = save_arrays(
+            directory,
+            {name: getattr(self, name) for name in _ARRAYS},
+            {"size": len(self), "k": self.k, "content_built_at": content_built_at},
+            self.built_at
+        )
+        self.version = os.path.basename(target)
+        logger.info(f"Similarity table saved to {target}")
+        return target
+    
+    @classmethod
+    def load(cls, directory: str = SIMILARITY_TABLE_DIR) -> Optional["SimilarityTable"]:
+        """Memory-map the current table version, or None if none was saved"""
+        snapshot = load_arrays(directory)
+        if snapshot is None:
+            return None
+        arrays, meta = snapshot
+        content_built_at = meta.get("content_built_at")
+        return cls(
+            built_at=meta["built_at"],
+            content_built_at=datetime.fromisoformat(content_built_at) if content_built_at else None,
+            version=meta["version"],
+            **arrays
+        )
+
+
+def build_similarity_table(
+    product_vectors: sparse.csr_matrix,
+    product_ids: np.ndarray,
+    seller_ids: np.ndarray,
+    k: int = SIMILARITY_TABLE_K,
+    n_workers: Optional[int] = None
+) -> SimilarityTable:
+    """
+    Compute the top-k cosine neighbours of every product.
+    
+    Similarities are computed block by block as sparse products, with the
+    block height chosen so a dense block stays under BLOCK_BUDGET_BYTES.
+    Large catalogs are split into row ranges across worker processes.
+    
+    Args:
+        product_vectors: L2-normalized product vectors (e.g. TF-IDF)
+        product_ids: Product ID per row
+        seller_ids: Seller ID per row (0 if unknown)
+        k: Neighbours kept per product
+        n_workers: Worker processes (None = CPU count for large catalogs)
+    """
+    vectors = sparse.csr_matrix(product_vectors, dtype=np.float32)
+    n = vectors.shape[0]
+    block_rows = max(1, min(n, BLOCK_BUDGET_BYTES // (4 * max(n, 1))))
+    width = min(k, max(n - 1, 0))
+    
+    neighbor_idx = np.full((n, width), -1, dtype=np.int32)
+    neighbor_sim = np.zeros((n, width), dtype=np.float32)
+    
+    if n_workers is None:
+        n_workers = (os.cpu_count() or 1) if n >= PARALLEL_MIN_PRODUCTS else 1
+    
+    # Transposed once for every block, here or in the workers
+    vectors_t = vectors.T.tocsc()
+    if n_workers > 1 and n > block_rows:
+        # Whole blocks per worker range, a few ranges per worker for balance
+        n_ranges = n_workers * 4
+        range_rows = max(block_rows, -(-n // n_ranges // block_rows) * block_rows)
+        ranges = [
+            (start, min(start + range_rows, n), block_rows, width)
+            for start in range(0, n, range_rows)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_init_worker, initargs=(vectors, vectors_t)
+        ) as pool:
+            for start, idx, sim in pool.map(_worker_range, ranges):
+                neighbor_idx[start:start + len(idx)] = idx
+                neighbor_sim[start:start + len(sim)] = sim
+    else:
+        for start in range(0, n, block_rows):
+            stop = min(start + block_rows, n)
+            neighbor_idx[start:stop], neighbor_sim[start:stop] = _top_k_block(
+                vectors, vectors_t, start, stop, width
+            )
+    
+    logger.info(f"Similarity table computed for {n} products (k={width}, workers={n_workers})")
+    return SimilarityTable(
+        product_ids=np.asarray(product_ids, dtype=np.int64),
+        seller_ids=np.asarray(seller_ids, dtype=np.int64),
+        neighbor_idx=neighbor_idx,
+        neighbor_sim=neighbor_sim
+    )
@@ -0,0 +1,125 @@
+"""
+Versioned Array Snapshots
+On-disk .npy snapshots swapped atomically and loaded memory-mapped
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import os
+import re
+import json
+import shutil
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+# Versions kept on disk: the current one and the one before it
+KEEP_VERSIONS = 2
+
+# Version directories are numbered in write order
+_VERSION = re.compile(r"^v(\d+)$")
+
+
+def _version_order(name: str) -> Tuple[int, int]:
+    """Sort key for version directories; unnumbered (legacy) ones sort first"""
+    match = _VERSION.match(name)
+    return (1, int(match.group(1))) if match else (0, 0)
+
+
+def _allocate_version(directory: str) -> str:
+    """Create the next numbered version directory; safe across processes"""
+    os.makedirs(directory, exist_ok=True)
+    while True:
+        numbers = [
+            _version_order(d)[1] for d in os.listdir(directory) if _VERSION.match(d)
+        ]
+        version = f"v{max(numbers, default=0) + 1:08d}"
+        try:
+            os.mkdir(os.path.join(directory, version))
+            return version
+        except FileExistsError:
+            continue  # another writer took this number
+
+
+def save_arrays(
+    directory: str,
+    arrays: Dict[str, np.ndarray],
+    meta: Dict[str, Any],
+    built_at: datetime
+) -> str:
+    """
+    Write arrays to a new versioned subdirectory and atomically point
+    CURRENT at it. Versions are numbered in write order, so the last
+    save wins whatever its built_at. Older versions except the previous
+    one are removed, never the one CURRENT points at.
+    
+    Args:
+        directory: Snapshot root directory
+        arrays: Arrays saved as <name>.npy
+        meta: JSON-serializable metadata saved as meta.json
+        built_at: Build time, saved in meta.json
+    
+    Returns:
+        Path of the written version
+    """
+    version = _allocate_version(directory)
+    target = os.path.join(directory, version)
+    
+    for name, array in arrays.items():
+        np.save(os.path.join(target, f"{name}.npy"), array)
+    with open(os.path.join(target, "meta.json"), "w") as f:
+        json.dump({**meta, "built_at": built_at.isoformat(), "arrays": sorted(arrays)}, f)
+    
+    pointer = os.path.join(directory, CURRENT_FILE)
+    with open(pointer + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+    
+    # Another writer may have moved CURRENT since; keep whatever it points at
+    current = current_version(directory)
+    versions = sorted(
+        (d for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d))),
+        key=_version_order
+    )
+    for old in versions[:-KEEP_VERSIONS]:
+        if old != current:
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    
+    return target
+
+
+def current_version(directory: str) -> Optional[str]:
+    """Name of the version CURRENT points at, or None if nothing was saved"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def load_arrays(directory: str) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+    """
+    Memory-map every array of the current version.
+    
+    Returns:
+        (arrays, meta) with meta["built_at"] parsed and meta["version"] set,
+        or None if nothing was saved
+    """
+    version = current_version(directory)
+    if version is None:
+        return None
+    
+    target = os.path.join(directory, version)
+    with open(os.path.join(target, "meta.json")) as f:
+        meta = json.load(f)
+    
+    arrays = {
+        name: np.load(os.path.join(target, f"{name}.npy"), mmap_mode="r")
+        for name in meta.pop("arrays")
+    }
+    meta["built_at"] = datetime.fromisoformat(meta["built_at"])
+    meta["version"] = version
+    return arrays, meta
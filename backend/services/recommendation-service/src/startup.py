@@ -0,0 +1,94 @@
+"""
+Startup Profiling
+Per-module import and per-step initialization cost of service startup
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import importlib
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cold-start budget from the first service import to a ready app. CI gates the
+# import part with benchmarks/bench_startup.py; /health/startup reports the rest
+COLD_START_TARGET_SECONDS = float(os.getenv("COLD_START_TARGET_SECONDS", "1.5"))
+
+
+class StartupProfile:
+    """
+    Ordered timings of startup steps.
+    
+    Each step is an "import" (a module loaded) or an "init" (a client
+    connected, a model loaded). Imports deferred with lazy_import are
+    recorded whenever they first happen, so the report also shows which
+    heavy modules were paid for by the first request instead of startup.
+    """
+    
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.steps: List[Dict[str, Any]] = []
+        self.ready_seconds: Optional[float] = None
+    
+    @contextmanager
+    def step(self, kind: str, name: str) -> Iterator[None]:
+        """Time the enclosed block as one startup step"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append({
+                "kind": kind,
+                "name": name,
+                "seconds": round(time.perf_counter() - start, 4),
+                "before_ready": self.ready_seconds is None
+            })
+    
+    def import_module(self, name: str) -> ModuleType:
+        """Import a module as a timed step"""
+        with self.step("import", name):
+            return importlib.import_module(name)
+    
+    def mark_ready(self) -> None:
+        """Record the time to ready and log the slowest steps"""
+        self.ready_seconds = round(time.perf_counter() - self.started_at, 4)
+        slowest = sorted(self.steps, key=lambda s: s["seconds"], reverse=True)[:5]
+        logger.info(
+            f"Service ready in {self.ready_seconds:.2f}s "
+            f"(target {COLD_START_TARGET_SECONDS:.2f}s); slowest steps: "
+            + ", ".join(f"{s['kind']} {s['name']} {s['seconds']:.2f}s" for s in slowest)
+        )
+    
+    def report(self) -> Dict[str, Any]:
+        """Startup report for the health endpoint"""
+        return {
+            "ready_seconds": self.ready_seconds,
+            "target_seconds": COLD_START_TARGET_SECONDS,
+            "within_target": self.ready_seconds is not None
+                and self.ready_seconds <= COLD_START_TARGET_SECONDS,
+            "steps": list(self.steps)
+        }
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Import a heavy module on first use instead of at service import.
+    
+    Args:
+        name: Dotted module name
+    
+    Returns:
+        The module; the first call records its import cost in startup_profile
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return startup_profile.import_module(name)
+
+
+# Global instance, created by the first service import
+startup_profile = StartupProfile()
@@ -0,0 +1,67 @@
+"""
+Top-K Selection Utilities
+Shared NumPy-backed top-k used by all recommendation scorers
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import numpy as np
+from typing import Any, List, Optional, Sequence, Tuple
+
+
+def top_k_indices(
+    scores: np.ndarray,
+    k: int,
+    mask: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Indices of the k largest scores, best first.
+    
+    Uses argpartition (O(n)) and only sorts the k selected entries. Ties
+    are broken by lower index, so the result equals a stable descending
+    sort truncated to k.
+    
+    Args:
+        scores: 1-D array of scores
+        k: Number of indices to return
+        mask: Optional boolean array; False entries are excluded
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    candidates = np.flatnonzero(mask) if mask is not None else None
+    if candidates is not None:
+        scores = scores[candidates]
+    
+    n = scores.size
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    
+    if k < n:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - above.size]
+        selected = np.concatenate([above, ties])
+    else:
+        selected = np.arange(n)
+    
+    # Sort by score descending, then index ascending
+    selected = selected[np.lexsort((selected, -scores[selected]))]
+    return candidates[selected] if candidates is not None else selected
+
+
+def top_k(
+    ids: Sequence[Any],
+    scores: np.ndarray,
+    k: int,
+    mask: Optional[np.ndarray] = None
+) -> List[Tuple[Any, float]]:
+    """
+    Top k (id, score) pairs, best first.
+    
+    Args:
+        ids: IDs aligned with scores (list or array)
+        scores: 1-D array of scores
+        k: Number of pairs to return
+        mask: Optional boolean array; False entries are excluded
+    """
+    indices = top_k_indices(scores, k, mask)
+    if isinstance(ids, np.ndarray):
+        return [(ids[i].item(), float(scores[i])) for i in indices]
+    return [(ids[i], float(scores[i])) for i in indices]
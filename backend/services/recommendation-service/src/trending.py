@@ -0,0 +1,193 @@
+"""
+Materialized Trending Index
+Hourly bid/view counters per listing, ranked with Hacker-News-style gravity
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import os
+import time
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.topk import top_k
+
+logger = logging.getLogger(__name__)
+
+# Windows (hours) with materialized rankings; other windows query the database
+TRENDING_WINDOWS_HOURS = [
+    int(h) for h in os.getenv("TRENDING_WINDOWS_HOURS", "24,168").split(",") if h.strip()
+]
+# Score decay: activity h hours old counts 1 / (h + 2) ** gravity
+TRENDING_GRAVITY = float(os.getenv("TRENDING_GRAVITY", "1.8"))
+TRENDING_BID_WEIGHT = float(os.getenv("TRENDING_BID_WEIGHT", "1.0"))
+TRENDING_VIEW_WEIGHT = float(os.getenv("TRENDING_VIEW_WEIGHT", "0.05"))
+# Longest ranked list kept per category
+TRENDING_LIST_SIZE = int(os.getenv("TRENDING_LIST_SIZE", "200"))
+
+BIDS, VIEWS = 0, 1
+
+
+def current_hour(timestamp: Optional[float] = None) -> int:
+    """Hour bucket (hours since the epoch) for a Unix timestamp"""
+    return int((timestamp if timestamp is not None else time.time()) // 3600)
+
+
+class TrendingIndex:
+    """
+    Sliding-window activity counters bucketed per hour.
+    
+    Bid counts are reseeded from the database on each refresh; views and
+    bids streamed between refreshes are added to the current bucket. A
+    refresh also re-ranks every listing, so reads are a slice of a
+    pre-ranked list.
+    """
+    
+    def __init__(
+        self,
+        windows_hours: Optional[List[int]] = None,
+        gravity: float = TRENDING_GRAVITY,
+        bid_weight: float = TRENDING_BID_WEIGHT,
+        view_weight: float = TRENDING_VIEW_WEIGHT,
+        list_size: int = TRENDING_LIST_SIZE
+    ):
+        """
+        Initialize trending index
+        
+        Args:
+            windows_hours: Time windows to materialize rankings for
+            gravity: Decay exponent applied to bucket age
+            bid_weight: Score per bid
+            view_weight: Score per view
+            list_size: Listings kept per ranked list
+        """
+        self.windows_hours = sorted(set(windows_hours or TRENDING_WINDOWS_HOURS))
+        self.max_window_hours = max(self.windows_hours)
+        self.gravity = gravity
+        self.bid_weight = bid_weight
+        self.view_weight = view_weight
+        self.list_size = list_size
+        
+        # hour -> listing -> [bids, views]
+        self._buckets: Dict[int, Dict[int, List[float]]] = defaultdict(dict)
+        self._categories: Dict[int, Optional[int]] = {}
+        
+        # (window, category or None for all) -> [(listing, score, bids)]
+        self._ranked: Dict[Tuple[int, Optional[int]], List[Tuple[int, float, int]]] = {}
+        self.built_at: Optional[datetime] = None
+    
+    def supports(self, hours: int) -> bool:
+        """Whether rankings for this window are materialized"""
+        return self.built_at is not None and hours in self.windows_hours
+    
+    def record(
+        self,
+        product_id: int,
+        interaction_type: str,
+        timestamp: Optional[float] = None,
+        category_id: Optional[int] = None
+    ) -> None:
+        """Count a streamed bid or view"""
+        if interaction_type == 'bid':
+            column = BIDS
+        elif interaction_type in ('view', 'click'):
+            column = VIEWS
+        else:
+            return
+        
+        hour = current_hour(timestamp)
+        if hour <= current_hour() - self.max_window_hours:
+            return
+        counts = self._buckets[hour].setdefault(product_id, [0.0, 0.0])
+        counts[column] += 1
+        if category_id is not None or product_id not in self._categories:
+            self._categories[product_id] = category_id
+    
+    def load_bid_buckets(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Replace bid counts with database totals.
+        
+        Args:
+            rows: Dicts with product_id, category_id, hour and bid_count
+        """
+        for listings in self._buckets.values():
+            for counts in listings.values():
+                counts[BIDS] = 0.0
+        
+        for row in rows:
+            counts = self._buckets[int(row['hour'])].setdefault(row['product_id'], [0.0, 0.0])
+            counts[BIDS] = float(row['bid_count'])
+            self._categories[row['product_id']] = row.get('category_id')
+    
+    def rebuild(self, now_hour: Optional[int] = None) -> None:
+        """Drop expired buckets and re-rank every listing for each window"""
+        if now_hour is None:
+            now_hour = current_hour()
+        
+        for hour in [h for h in self._buckets if h <= now_hour - self.max_window_hours]:
+            del self._buckets[hour]
+        active = set().union(*self._buckets.values())
+        self._categories = {
+            pid: category for pid, category in self._categories.items() if pid in active
+        }
+        
+        ranked: Dict[Tuple[int, Optional[int]], List[Tuple[int, float, int]]] = {}
+        for window in self.windows_hours:
+            scores: Dict[int, float] = defaultdict(float)
+            bids: Dict[int, float] = defaultdict(float)
+            for hour, listings in self._buckets.items():
+                age = now_hour - hour
+                if age >= window:
+                    continue
+                decay = 1.0 / (max(age, 0) + 2) ** self.gravity
+                for product_id, (bid_count, view_count) in listings.items():
+                    activity = self.bid_weight * bid_count + self.view_weight * view_count
+                    if activity > 0:
+                        scores[product_id] += activity * decay
+                        bids[product_id] += bid_count
+            
+            if not scores:
+                ranked[(window, None)] = []
+                continue
+            
+            product_ids = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+            values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+            categories = np.array(
+                [self._categories.get(pid) for pid in product_ids.tolist()], dtype=object
+            )
+            
+            groups = {None: None}
+            groups.update({c: categories == c for c in set(categories.tolist()) if c is not None})
+            for category, mask in groups.items():
+                ranked[(window, category)] = [
+                    (pid, score, int(bids[pid]))
+                    for pid, score in top_k(product_ids, values, self.list_size, mask=mask)
+                ]
+        
+        self._ranked = ranked
+        self.built_at = datetime.utcnow()
+    
+    def top(
+        self,
+        hours: int,
+        category_id: Optional[int] = None,
+        limit: int = 10
+    ) -> List[Tuple[int, float, int]]:
+        """
+        Highest-scoring listings for a materialized window
+        
+        Returns:
+            List of (listing_id, score, bids_in_window), best first
+        """
+        return self._ranked.get((hours, category_id), [])[:limit]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index statistics"""
+        return {
+            "windows_hours": self.windows_hours,
+            "buckets": len(self._buckets),
+            "listings": len(self._categories),
+            "built_at": self.built_at.isoformat() if self.built_at else None
+        }
@@ -0,0 +1,493 @@
+"""
+Traveler Matching Tests
+Tests for geo-spatial request lookups and object matching
+Requirements: 13.1, 13.2 - Camera/mic event handling and matching
+"""
+import pytest
+import random
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src import logic
+from src.geo_index import (
+    GeoIndex, RadianCoordinates, haversine_distance, haversine_matrix, haversine_vector
+)
+
+
+def _random_points(n, seed=7):
+    rng = random.Random(seed)
+    return {i: (rng.uniform(-90, 90), rng.uniform(-180, 180)) for i in range(n)}
+
+
+def _brute_force(points, lat, lon, radius_km):
+    hits = [
+        (key, haversine_distance(lat, lon, p_lat, p_lon))
+        for key, (p_lat, p_lon) in points.items()
+    ]
+    return sorted((hit for hit in hits if hit[1] <= radius_km), key=lambda hit: hit[1])
+
+
+def _assert_same_hits(hits, expected):
+    assert [key for key, _ in hits] == [key for key, _ in expected]
+    assert [d for _, d in hits] == pytest.approx([d for _, d in expected])
+
+
+class TestGeoIndex:
+    """Tests for the grid-cell geo index"""
+    
+    @pytest.fixture
+    def points(self):
+        points = _random_points(3000)
+        # Clusters around the antimeridian and the poles
+        points.update({f"am{i}": (-16.5 + i * 0.01, 179.99 if i % 2 else -179.99) for i in range(20)})
+        points.update({f"np{i}": (89.9, i * 18.0 - 180) for i in range(20)})
+        return points
+    
+    @pytest.fixture
+    def index(self, points):
+        index = GeoIndex(cell_degrees=2.0)
+        for key, (lat, lon) in points.items():
+            index.add(key, lat, lon)
+        return index
+    
+    @pytest.mark.parametrize("lat,lon,radius_km", [
+        (25.2, 55.3, 50.0),
+        (-16.5, 180.0, 30.0),      # straddles the antimeridian
+        (89.5, 10.0, 100.0),       # covers the north pole
+        (-60.0, -70.0, 1500.0),
+        (0.0, 0.0, 25000.0),       # the whole globe
+        (10.0, 20.0, 0.0),
+    ])
+    def test_radius_matches_brute_force(self, index, points, lat, lon, radius_km):
+        expected = _brute_force(points, lat, lon, radius_km)
+        hits = index.query_radius(lat, lon, radius_km)
+        
+        assert {key for key, _ in hits} == {key for key, _ in expected}
+        assert [d for _, d in hits] == sorted(d for _, d in hits)
+    
+    def test_nearest_matches_brute_force(self, index, points):
+        for lat, lon in [(25.2, 55.3), (-16.5, -179.9), (89.0, 0.0), (-89.0, 45.0)]:
+            expected = _brute_force(points, lat, lon, float("inf"))[:7]
+            _assert_same_hits(index.query_nearest(lat, lon, 7), expected)
+        
+        _assert_same_hits(
+            index.query_nearest(0.0, 0.0, 5, max_radius_km=1.0),
+            _brute_force(points, 0.0, 0.0, 1.0)[:5]
+        )
+    
+    def test_predicate_and_limit(self, index, points):
+        even = lambda key: isinstance(key, int) and key % 2 == 0
+        hits = index.query_radius(40.0, 10.0, 2000.0, predicate=even, limit=5)
+        expected = [hit for hit in _brute_force(points, 40.0, 10.0, 2000.0) if even(hit[0])][:5]
+        
+        _assert_same_hits(hits, expected)
+    
+    def test_incremental_add_move_remove(self):
+        index = GeoIndex()
+        index.add("a", 25.20, 55.27)
+        index.add("b", 25.21, 55.28)
+        assert [key for key, _ in index.query_radius(25.2, 55.27, 5.0)] == ["a", "b"]
+        
+        index.add("a", 48.87, 2.31)  # moved to Paris
+        assert [key for key, _ in index.query_radius(25.2, 55.27, 5.0)] == ["b"]
+        assert [key for key, _ in index.query_radius(48.87, 2.31, 5.0)] == ["a"]
+        
+        assert index.remove("b") and not index.remove("b")
+        assert index.query_radius(25.2, 55.27, 5.0) == []
+        assert len(index) == 1 and "a" in index
+        
+        with pytest.raises(ValueError):
+            index.add("c", 91.0, 0.0)
+
+
+class TestVectorizedDistances:
+    """Tests for the NumPy haversine forms and batch queries"""
+    
+    def test_vector_and_matrix_match_scalar(self):
+        points = list(_random_points(200).values())
+        coords = RadianCoordinates.from_degrees([p[0] for p in points], [p[1] for p in points])
+        origins = [(25.2, 55.3), (-33.9, 151.2), (90.0, 0.0)]
+        
+        matrix = haversine_matrix(
+            RadianCoordinates.from_degrees([o[0] for o in origins], [o[1] for o in origins]), coords
+        )
+        for i, (lat, lon) in enumerate(origins):
+            expected = [haversine_distance(lat, lon, p_lat, p_lon) for p_lat, p_lon in points]
+            assert haversine_vector(lat, lon, coords) == pytest.approx(expected)
+            assert matrix[i] == pytest.approx(expected)
+    
+    def test_bulk_load_and_batch_queries_match_single(self):
+        points = _random_points(5000)
+        bulk = GeoIndex(cell_degrees=1.0, capacity=16)
+        bulk.add_many(list(points), [p[0] for p in points.values()], [p[1] for p in points.values()])
+        single = GeoIndex(cell_degrees=1.0)
+        for key, (lat, lon) in points.items():
+            single.add(key, lat, lon)
+        
+        travelers = [(25.2, 55.3), (25.3, 55.4), (48.9, 2.3), (-16.5, 179.9), (0.0, 0.0)]
+        batch = bulk.query_radius_many([t[0] for t in travelers], [t[1] for t in travelers], 400.0)
+        for (lat, lon), hits in zip(travelers, batch):
+            _assert_same_hits(hits, single.query_radius(lat, lon, 400.0))
+            _assert_same_hits(hits, _brute_force(points, lat, lon, 400.0))
+    
+    def test_removed_slots_are_reused(self):
+        index = GeoIndex(capacity=2)
+        for i in range(10):
+            index.add(i, 10.0 + i * 0.01, 20.0)
+        for i in range(0, 10, 2):
+            index.remove(i)
+        index.add("new", 10.0, 20.0)
+        
+        assert len(index._keys) == 10
+        assert [key for key, _ in index.query_nearest(10.0, 20.0, 3)] == ["new", 1, 3]
+
+
+class TestNearbyRequests:
+    """Tests for request lookups by traveler location"""
+    
+    @staticmethod
+    def _scan(lat, lon, radius_km, category=None):
+        """The full scan find_nearby_requests replaced"""
+        requests = logic.request_store.snapshot.requests
+        return sorted(
+            (req["id"] for req in requests.values()
+             if (not category or req["category"] == category)
+             and haversine_distance(lat, lon, req["lat"], req["lon"]) <= radius_km),
+            key=lambda rid: haversine_distance(lat, lon, requests[rid]["lat"], requests[rid]["lon"])
+        )
+    
+    @pytest.mark.parametrize("lat,lon,radius_km,category", [
+        (25.2, 55.3, 50.0, None),
+        (25.2, 55.3, 3000.0, None),
+        (25.2, 55.3, 3000.0, "electronics"),
+        (45.0, 10.0, 20000.0, "fashion"),
+    ])
+    def test_matches_full_scan(self, lat, lon, radius_km, category):
+        nearby = logic.find_nearby_requests(lat, lon, radius_km, category=category, limit=100)
+        
+        assert [req["id"] for req in nearby] == self._scan(lat, lon, radius_km, category)
+        assert all(req["distance_km"] <= radius_km for req in nearby)
+    
+    def test_nearest_requests(self):
+        nearest = logic.find_nearest_requests(48.86, 2.35, k=2)
+        assert [req["id"] for req in nearest] == ["req_005", "req_004"]
+        assert logic.find_nearest_requests(48.86, 2.35, k=2, category="home")[0]["id"] == "req_007"
+    
+    def test_added_and_closed_requests(self):
+        request = {
+            "id": "req_test", "item_name": "Dates Gift Box", "location_name": "Jeddah Corniche",
+            "lat": 21.5433, "lon": 39.1728, "reward": 30, "category": "home", "keywords": ["dates"]
+        }
+        logic.add_request(request)
+        try:
+            nearby = logic.find_nearby_requests(21.54, 39.17, radius_km=5.0)
+            assert [req["id"] for req in nearby] == ["req_test"]
+            assert "distance_km" not in request
+            
+            logic.add_request({**request, "lat": 21.4858, "lon": 39.1925})  # moved south
+            assert logic.find_nearby_requests(21.54, 39.17, radius_km=2.0) == []
+        finally:
+            assert logic.close_request("req_test")
+        
+        assert not logic.close_request("req_test")
+        assert logic.find_nearby_requests(21.49, 39.19, radius_km=5.0) == []
+        assert "req_test" not in logic.request_store.snapshot.requests
+        assert all(req["id"] != "req_test" for req in logic.get_requests_by_category("home"))
+    
+    def test_batch_matches_single_queries(self):
+        positions = [(25.2, 55.3), (48.86, 2.35), (0.0, 0.0), (41.0, 29.0)]
+        batch = logic.find_nearby_requests_many(positions, radius_km=500.0, limit=3)
+        
+        assert batch == [
+            logic.find_nearby_requests(lat, lon, radius_km=500.0, limit=3) for lat, lon in positions
+        ]
+        assert logic.find_nearby_requests_many([]) == []
+
+
+class TestLocationBatch:
+    """Tests for batched location-event matching in the event worker"""
+    
+    @staticmethod
+    def _event(traveler_id, lat, lon, minute):
+        from datetime import datetime
+        from src.event_worker import EventType, TravelerEvent
+        return TravelerEvent(
+            event_id=f"{traveler_id}-{minute}", event_type=EventType.LOCATION_UPDATE,
+            traveler_id=traveler_id, timestamp=datetime(2026, 1, 1, 12, minute),
+            payload={}, location={"lat": lat, "lon": lon}
+        )
+    
+    @pytest.mark.asyncio
+    async def test_batch_alerts_latest_fix_per_traveler(self, monkeypatch):
+        from src import event_worker
+        monkeypatch.setattr(event_worker, "LOCATION_BATCH_SIZE", 4)
+        worker = event_worker.EventWorker()
+        events = [
+            self._event("t1", 25.1975, 55.2745, 5),   # at Dubai Mall
+            self._event("t1", 24.0, 54.0, 1),         # older fix, far away
+            self._event("t2", 48.8600, 2.3400, 2),    # ~2.5 km from Champs-Elysees
+            self._event("t3", 48.8698, 2.3200, 3),    # ~0.9 km from Champs-Elysees
+        ]
+        
+        assert await worker.process_location_event(events[0]) == []
+        assert await worker.process_location_event(events[1]) == []
+        assert await worker.process_location_event(events[2]) == []
+        alerts = await worker.process_location_event(events[3])
+        
+        assert {(n.user_id, n.data["request_id"], n.priority) for n in alerts} == {
+            ("t1", "req_001", "high"), ("t3", "req_005", "normal")
+        }
+        assert worker._location_batch == []
+        assert worker.get_stats()["location_batches"] == 1
+
+
+class TestRequestStore:
+    """Tests for the travel request store and its snapshots"""
+    
+    @staticmethod
+    def _row(request_id, lat, lon, updated_day, open=True, category="electronics", name="iPhone 15 Pro"):
+        from datetime import datetime
+        return {
+            "id": request_id, "item_name": name, "location_name": f"Spot {request_id}",
+            "lat": lat, "lon": lon, "reward": 100.0, "category": category,
+            "keywords": ["iphone", "Apple"], "open": open, "updated_at": datetime(2026, 1, updated_day)
+        }
+    
+    @pytest.fixture
+    def table(self, monkeypatch):
+        """Fake travel request table behind the database functions the store uses"""
+        from src import request_store as store_module
+        rows = {}
+        
+        async def iter_open_request_chunks(chunk_size=2):
+            open_rows = [row for row in rows.values() if row["open"]]
+            watermark = max((row["updated_at"] for row in rows.values()), default=None)
+            for start in range(0, len(open_rows), chunk_size):
+                yield watermark, open_rows[start:start + chunk_size]
+        
+        async def get_request_changes(since, limit):
+            changed = sorted(
+                (row for row in rows.values() if row["updated_at"] >= since),
+                key=lambda row: (row["updated_at"], row["id"])
+            )
+            return changed[:limit]
+        
+        monkeypatch.setattr(store_module.database, "iter_open_request_chunks", iter_open_request_chunks)
+        monkeypatch.setattr(store_module.database, "get_request_changes", get_request_changes)
+        return rows
+    
+    @pytest.mark.asyncio
+    async def test_load_streams_and_indexes(self, table):
+        from src.request_store import RequestStore
+        for i in range(5):
+            table[i] = self._row(i, 25.0 + i, 55.0, 1 + i, open=i != 3)
+        store = RequestStore(logic.SAMPLE_REQUESTS)
+        
+        assert await store.load() == 4
+        snapshot = store.snapshot
+        assert list(snapshot.requests) == ["0", "1", "2", "4"]
+        assert list(snapshot.in_category("electronics")) == ["0", "1", "2", "4"]
+        assert snapshot.keywords.candidates("pro", {"pro"}) == {"0", "1", "2", "4"}
+        assert [key for key, _ in snapshot.geo.query_radius(25.9, 55.0, 150.0)] == ["1", "0", "2"]
+        assert snapshot.watermark == table[4]["updated_at"]
+    
+    @pytest.mark.asyncio
+    async def test_sync_swaps_in_a_new_snapshot(self, table, monkeypatch):
+        from src import request_store as store_module
+        for i in range(3):
+            table[i] = self._row(i, 25.0 + i, 55.0, 1)
+        store = store_module.RequestStore()
+        await store.load()
+        before = store.snapshot
+        
+        assert not await store.sync()  # rows at the watermark are already applied
+        assert store.snapshot is before
+        
+        table[1] = self._row(1, 48.87, 2.31, 2, category="fashion", name="Zara Jacket")
+        table[2] = self._row(2, 27.0, 55.0, 3, open=False)
+        table[7] = self._row(7, 25.0, 55.1, 3)
+        assert await store.sync()
+        
+        after = store.snapshot
+        assert list(after.requests) == ["0", "1", "7"]
+        assert list(after.in_category("fashion")) == ["1"]
+        assert list(after.in_category("electronics")) == ["0", "7"]
+        assert [key for key, _ in after.geo.query_radius(25.0, 55.0, 500.0)] == ["0", "7"]
+        assert after.keywords.candidates("jacket", {"jacket"}) == {"1"}
+        assert "2" not in after.keywords.candidates("iphone", {"iphone"})
+        # Readers holding the old snapshot keep a consistent view
+        assert list(before.requests) == ["0", "1", "2"]
+        assert [key for key, _ in before.geo.query_radius(25.0, 55.0, 500.0)] == ["0", "1", "2"]
+        
+        # Too many changes fall back to a full load
+        monkeypatch.setattr(store_module, "REQUEST_SYNC_MAX_ROWS", 1)
+        table[8] = self._row(8, 30.0, 31.0, 4)
+        table[9] = self._row(9, 30.0, 31.0, 4)
+        assert await store.sync()
+        assert list(store.snapshot.requests) == ["0", "1", "7", "8", "9"]
+    
+    @pytest.mark.asyncio
+    async def test_sync_advances_past_no_op_changes(self, table, monkeypatch):
+        from src import request_store as store_module
+        for i in range(3):
+            table[i] = self._row(i, 25.0 + i, 55.0, 1)
+        store = store_module.RequestStore()
+        await store.load()
+        before = store.snapshot
+        
+        # Closed before ever being loaded, and rewritten with the same content
+        table[5] = self._row(5, 30.0, 31.0, 2, open=False)
+        table[1] = {**table[1], "updated_at": table[5]["updated_at"]}
+        
+        assert not await store.sync()
+        after = store.snapshot
+        assert after.watermark == table[5]["updated_at"]
+        assert after.base is before.base and list(after.requests) == ["0", "1", "2"]
+        
+        # The no-op rows are not re-read, so later polls stay within the limit
+        async def must_not_load():
+            raise AssertionError("expected an incremental sync")
+        
+        monkeypatch.setattr(store, "load", must_not_load)
+        monkeypatch.setattr(store_module, "REQUEST_SYNC_MAX_ROWS", 3)
+        table[6] = self._row(6, 30.0, 31.0, 3)
+        assert await store.sync()
+        assert list(store.snapshot.requests) == ["0", "1", "2", "6"]
+    
+    @pytest.mark.asyncio
+    async def test_changes_go_to_an_overlay(self):
+        from src.request_store import RequestSnapshot, RequestStore
+        rng = random.Random(3)
+        requests = [self._row(f"r{i}", rng.uniform(20, 30), rng.uniform(50, 60), 1,
+                              category=rng.choice(["a", "b"]), name=rng.choice(["Smart Watch", "Air Max"]))
+                    for i in range(300)]
+        store = RequestStore(requests)
+        base = store.snapshot.base
+        
+        for step in range(200):
+            if rng.random() < 0.4:
+                store.remove(f"r{rng.randrange(320)}")
+            else:
+                store.upsert(self._row(f"r{rng.randrange(320)}", rng.uniform(20, 30), rng.uniform(50, 60), 2,
+                                       category=rng.choice(["a", "b"]), name=rng.choice(["Smart Phone", "Max Bag"])))
+        snapshot = store.snapshot
+        assert snapshot.base is base and snapshot.pending_changes > 0
+        
+        fresh = RequestSnapshot.build(snapshot.requests.values())
+        assert list(snapshot.requests) == list(fresh.requests) and len(snapshot) == len(fresh)
+        assert list(snapshot.in_category("a")) == list(fresh.in_category("a"))
+        for lat, lon in [(25.0, 55.0), (21.0, 59.0)]:
+            assert snapshot.geo.query_radius(lat, lon, 200.0, limit=15) == fresh.geo.query_radius(lat, lon, 200.0, limit=15)
+            assert snapshot.geo.query_nearest(lat, lon, 7) == fresh.geo.query_nearest(lat, lon, 7)
+            assert snapshot.geo.query_radius_many([lat], [lon], 300.0) == fresh.geo.query_radius_many([lat], [lon], 300.0)
+        for detected in ["max", "smart phone", "watch"]:
+            expected = fresh.keywords.in_order(fresh.keywords.candidates(detected, {detected}))
+            assert snapshot.keywords.in_order(snapshot.keywords.candidates(detected, {detected})) == expected
+        
+        assert await store.compact()
+        assert store.snapshot.pending_changes == 0 and store.snapshot.base is not base
+        assert list(store.snapshot.requests) == list(fresh.requests)
+    
+    def test_lookups_share_one_snapshot(self, monkeypatch):
+        from src.request_store import RequestStore
+        store = RequestStore(logic.SAMPLE_REQUESTS)
+        monkeypatch.setattr(logic, "request_store", store)
+        
+        assert [req["id"] for req in logic.get_requests_by_category("gadgets", limit=2)] == ["req_001", "req_002"]
+        assert logic.match_detected_objects(["gucci bag"])[0]["request_id"] == "req_010"
+        
+        store.remove("req_010")
+        assert logic.match_detected_objects(["gucci bag"]) == []
+        assert logic.find_nearby_requests(45.4685, 9.1954, radius_km=1.0) == []
+
+
+def _reference_score(detected, request):
+    """calculate_match_score as it was before the keyword index"""
+    import re
+    detected_lower = detected.lower()
+    item_name_lower = request["item_name"].lower()
+    if detected_lower == item_name_lower:
+        return (1.0, "exact_match")
+    if detected_lower in item_name_lower:
+        return (0.9, "partial_match")
+    if item_name_lower in detected_lower:
+        return (0.85, "contains_match")
+    for keyword in request.get("keywords", []):
+        if keyword in detected_lower or detected_lower in keyword:
+            return (0.7, f"keyword_match:{keyword}")
+    detected_words = set(re.findall(r'\w+', detected_lower))
+    item_words = set(re.findall(r'\w+', item_name_lower))
+    overlap = detected_words & item_words
+    if overlap:
+        score = len(overlap) / max(len(detected_words), len(item_words))
+        return (score * 0.6, f"word_overlap:{','.join(overlap)}")
+    return (0.0, "no_match")
+
+
+def _reference_matches(requests, detected_objects, min_score, limit):
+    """match_detected_objects as the full scan it replaced"""
+    matches, matched = [], set()
+    for obj in detected_objects:
+        obj_normalized = obj.strip()
+        if not obj_normalized:
+            continue
+        for req in requests:
+            if req["id"] in matched:
+                continue
+            score, reason = _reference_score(obj_normalized, req)
+            if score >= min_score:
+                matched.add(req["id"])
+                matches.append((req["id"], round(score, 2), reason))
+    matches.sort(key=lambda m: m[1], reverse=True)
+    return matches[:limit]
+
+
+class TestKeywordIndex:
+    """Tests that indexed object matching equals scoring every request"""
+    
+    VOCABULARY = ["iphone", "pro", "max", "galaxy", "air", "jordan", "coffee", "set", "mini",
+                  "bag", "leather", "watch", "smart", "phone", "case", "s24", "m3", "15"]
+    
+    @pytest.fixture
+    def requests(self):
+        rng = random.Random(11)
+        requests = [dict(req) for req in logic.SAMPLE_REQUESTS]
+        for i in range(400):
+            name = " ".join(rng.sample(self.VOCABULARY, rng.randint(1, 4))).title()
+            keywords = rng.sample(self.VOCABULARY + ["Apple", "X", ""], rng.randint(0, 3))
+            requests.append({
+                "id": f"gen_{i}", "item_name": name, "location_name": "Somewhere",
+                "lat": 0.0, "lon": 0.0, "reward": 10, "category": "electronics", "keywords": keywords
+            })
+        return requests
+    
+    @pytest.fixture
+    def detected(self, requests):
+        rng = random.Random(5)
+        objects = ["iPhone 15 Pro", "a", "ph", "x", "Apple", "pple", "  gucci bag  ", "leather bag case",
+                   "PlayStation", "zz", "coffee set turkish", "Smart Watch Max", ""]
+        for _ in range(150):
+            name = rng.choice(requests)["item_name"]
+            start = rng.randrange(len(name))
+            objects.append(name[start:start + rng.randint(1, 12)])
+            objects.append(" ".join(rng.sample(self.VOCABULARY, rng.randint(1, 3))))
+        return objects
+    
+    @pytest.mark.parametrize("min_score", [0.5, 0.2, 0.0])
+    def test_matches_equal_full_scan(self, requests, detected, monkeypatch, min_score):
+        from src.request_store import RequestStore
+        monkeypatch.setattr(logic, "request_store", RequestStore(requests))
+        
+        for i in range(0, len(detected), 3):
+            batch = detected[i:i + 3]
+            matches = logic.match_detected_objects(batch, min_score=min_score, limit=1000)
+            assert [(m["request_id"], m["match_score"], m["match_reason"]) for m in matches] == \
+                _reference_matches(requests, batch, min_score, 1000)
+    
+    def test_match_score_unchanged(self, requests, detected):
+        for obj in detected[:60]:
+            if obj.strip():
+                for request in requests[:60]:
+                    assert logic.calculate_match_score(obj.strip(), request) == _reference_score(obj.strip(), request)
@@ -17,6 +17,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from ml_serving.model_server import ModelServer, ModelServerType, InferenceResult
+from ml_serving.mlflow_client import MLflowModelRegistry
 from ml_pipeline.model_monitor import (
     ModelMonitor, MetricType, MetricThreshold, AlertSeverity
 )
@@ -453,5 +454,34 @@ class TestAlertManagement:
         assert len(active_alerts) == 0
 
 
+class TestLazyServingClients:
+    """Tests that serving clients open HTTP connections on first use only"""
+    
+    @pytest.mark.asyncio
+    async def test_model_server_clients_created_on_first_request(self):
+        server = ModelServer(
+            inference_url="http://localhost:8080",
+            management_url="http://localhost:8081"
+        )
+        assert server._clients == {}
+        
+        assert server._inference_client is server._inference_client
+        assert str(server._management_client.base_url) == "http://localhost:8081"
+        assert len(server._clients) == 2
+        
+        await server.close()
+        assert server._clients == {}
+    
+    @pytest.mark.asyncio
+    async def test_mlflow_client_created_on_first_request(self):
+        registry = MLflowModelRegistry(tracking_uri="http://localhost:5000")
+        assert registry._http is None
+        await registry.close()  # nothing opened, nothing to close
+        
+        assert registry._client is registry._client
+        await registry.close()
+        assert registry._http is None
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
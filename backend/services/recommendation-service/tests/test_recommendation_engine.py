@@ -0,0 +1,1696 @@
+"""
+Recommendation Engine Tests
+Tests for collaborative and content-based filtering
+Requirements: 17.4 - Personalized recommendations based on browsing history
+"""
+import pytest
+import importlib
+import importlib.util
+import asyncio
+import random
+import re
+import subprocess
+import time
+import numpy as np
+
+# The engine imports `src.models` / `src.database` from this service
+import sys
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+SERVICE_ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, SERVICE_ROOT)
+sys.path.insert(0, os.path.join(SERVICE_ROOT, 'src'))
+
+ENGINE_PATH = os.path.join(
+    SERVICE_ROOT, '..', 'ai-core', 'src', 'recommendation_engine.py'
+)
+_spec = importlib.util.spec_from_file_location("recommendation_engine", ENGINE_PATH)
+recommendation_engine = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(recommendation_engine)
+
+from cache import ttl_cache
+from cache.ttl_cache import TTLCache
+from cache.response_cache import ResponseCache
+import similarity_table
+from src import snapshot_store
+from similarity_table import SimilarityTable, build_similarity_table
+from topk import top_k, top_k_indices
+from catalog import NO_CATEGORY, ProductCatalog
+import trending as trending_module
+import queries
+import db_metrics
+import startup
+from trending import TrendingIndex
+
+CollaborativeFilter = recommendation_engine.CollaborativeFilter
+SimilarityMetric = recommendation_engine.SimilarityMetric
+
+
+class TestTopK:
+    """Tests for the shared argpartition-based top-k selection"""
+    
+    def test_matches_stable_sort(self):
+        rng = np.random.default_rng(0)
+        # Few distinct values so ties are common
+        scores = rng.integers(0, 20, size=5000).astype(float)
+        expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        for k in (1, 10, 100, 5000, 6000):
+            assert top_k_indices(scores, k).tolist() == expected[:k]
+    
+    def test_mask_excludes_entries(self):
+        scores = np.array([0.9, 0.1, 0.8, 0.7])
+        mask = np.array([False, True, True, True])
+        assert top_k(["a", "b", "c", "d"], scores, 2, mask=mask) == [("c", 0.8), ("d", 0.7)]
+    
+    def test_empty_and_zero_k(self):
+        assert top_k_indices(np.array([]), 5).size == 0
+        assert top_k_indices(np.array([1.0, 2.0]), 0).size == 0
+        assert top_k([], np.array([]), 3) == []
+
+
+def _random_interactions(n_users: int = 60, n_items: int = 40, seed: int = 7):
+    rng = random.Random(seed)
+    types = ['purchase', 'bid', 'wishlist', 'click', 'view']
+    interactions = []
+    for user_id in range(1, n_users + 1):
+        for item_id in rng.sample(range(1, n_items + 1), rng.randint(1, 8)):
+            interactions.append({
+                'user_id': user_id,
+                'product_id': item_id,
+                'interaction_type': rng.choice(types)
+            })
+    return interactions
+
+
+class TestSparseCollaborativeFilter:
+    """Tests for the CSR-backed item-item collaborative filter"""
+    
+    @pytest.fixture
+    def interactions(self):
+        return _random_interactions()
+    
+    def test_sparse_similarity_matches_set_based(self, interactions):
+        """Sparse Jaccard neighbours equal the per-pair set computation"""
+        legacy = CollaborativeFilter(use_sparse=False)
+        fast = CollaborativeFilter(use_sparse=True, chunk_size=7)
+        legacy.build_from_interactions(interactions)
+        fast.build_from_interactions(interactions)
+        
+        for item_id in range(1, 41):
+            expected = legacy.compute_item_similarity(item_id)
+            actual = fast.compute_item_similarity(item_id)
+            # Ties at the top-k boundary may pick different items
+            boundary = min(expected.values(), default=0) + 1e-6
+            assert {k for k, v in actual.items() if v > boundary} == \
+                {k for k, v in expected.items() if v > boundary}
+            for other_id, sim in actual.items():
+                if other_id in expected:
+                    assert sim == pytest.approx(expected[other_id], rel=1e-5)
+    
+    def test_sparse_recommendations_match_set_based(self):
+        """Vectorized scoring ranks the same candidates as the dict walk"""
+        # Small catalog so every neighbour list fits in top_k
+        interactions = _random_interactions(n_items=15)
+        legacy = CollaborativeFilter(use_sparse=False)
+        fast = CollaborativeFilter(use_sparse=True)
+        legacy.build_from_interactions(interactions)
+        fast.build_from_interactions(interactions)
+        
+        for user_id in (1, 5, 17, 42):
+            expected = dict(legacy.recommend_for_user(user_id, limit=100))
+            actual = dict(fast.recommend_for_user(user_id, limit=100))
+            assert actual.keys() == expected.keys()
+            for item_id, score in actual.items():
+                assert score == pytest.approx(expected[item_id], rel=1e-4)
+    
+    def test_recommendations_exclude_seen_items(self, interactions):
+        """Items the user already interacted with are never recommended"""
+        cf = CollaborativeFilter()
+        cf.build_from_interactions(interactions)
+        seen = set(cf.user_item_matrix[3])
+        recs = cf.recommend_for_user(3, limit=10)
+        assert recs
+        assert not seen & {item_id for item_id, _ in recs}
+        scores = [score for _, score in recs]
+        assert scores == sorted(scores, reverse=True)
+    
+    def test_cosine_metric(self):
+        """Cosine neighbours are bounded and symmetric"""
+        cf = CollaborativeFilter(metric=SimilarityMetric.COSINE)
+        cf.add_interaction(1, 10, 5.0)
+        cf.add_interaction(1, 11, 5.0)
+        cf.add_interaction(2, 10, 1.0)
+        cf.add_interaction(2, 12, 1.0)
+        
+        sim_10 = cf.compute_item_similarity(10)
+        assert 0 < sim_10[11] <= 1.0
+        assert cf.compute_item_similarity(11)[10] == pytest.approx(sim_10[11])
+    
+    def test_index_rebuilt_after_new_interactions(self):
+        """Adding interactions invalidates the neighbour arrays"""
+        cf = CollaborativeFilter()
+        cf.add_interaction(1, 10)
+        cf.add_interaction(1, 11)
+        assert cf.recommend_for_user(1) == []
+        
+        cf.add_interaction(2, 11)
+        cf.add_interaction(2, 12)
+        assert [item_id for item_id, _ in cf.recommend_for_user(1)] == [12]
+
+
+class TestInteractionSnapshot:
+    """Tests for the globally built, atomically swapped interaction snapshot"""
+    
+    @pytest.mark.asyncio
+    async def test_refresh_swaps_in_new_version(self, monkeypatch):
+        """Each refresh builds a new indexed filter with a bumped version"""
+        engine = recommendation_engine.RecommendationEngine()
+        interactions = _random_interactions(n_users=10, n_items=8)
+        
+        async def fake_get_all_interactions():
+            return interactions
+        
+        monkeypatch.setattr(
+            recommendation_engine.database, "get_all_interactions", fake_get_all_interactions
+        )
+        
+        previous = engine.collaborative
+        assert await engine.refresh_interactions() == 1
+        first = engine.collaborative
+        assert first is not previous
+        assert first.snapshot_version == 1
+        assert not first._index_dirty
+        
+        assert await engine.refresh_interactions() == 2
+        assert engine.collaborative is not first
+        # The old snapshot is left untouched for in-flight readers
+        assert first.snapshot_version == 1
+    
+    def test_snapshot_rows_decay_by_age(self):
+        """Older purchases weigh less than recent ones of the same type"""
+        now = datetime.utcnow()
+        cf = CollaborativeFilter(half_life_days=30)
+        cf.build_from_interactions([
+            {'user_id': 1, 'product_id': 10, 'interaction_type': 'purchase',
+             'created_at': now - timedelta(days=60)},
+            {'user_id': 1, 'product_id': 11, 'interaction_type': 'purchase', 'created_at': now},
+            {'user_id': 2, 'product_id': 12, 'interaction_type': 'view'},
+        ])
+        weights = cf.user_item_matrix[1]
+        assert weights[10] / weights[11] == pytest.approx(0.25, rel=1e-3)
+        assert cf.user_item_matrix[2][12] == pytest.approx(1.0, rel=1e-3)
+    
+    @pytest.mark.asyncio
+    async def test_streamed_interactions_survive_rebuilds(self, monkeypatch):
+        """Views are never persisted, so each rebuild replays them"""
+        engine = recommendation_engine.RecommendationEngine()
+        
+        async def fake_get_all_interactions():
+            return [{'user_id': 2, 'product_id': 10, 'interaction_type': 'purchase'}]
+        
+        monkeypatch.setattr(
+            recommendation_engine.database, "get_all_interactions", fake_get_all_interactions
+        )
+        
+        await engine.refresh_interactions()
+        engine.record_interaction(1, 10, 'view')
+        engine.record_interaction(1, 11, 'add_to_cart')
+        engine.record_interaction(2, 12, 'view')
+        for _ in range(2):
+            await engine.refresh_interactions()
+            assert engine.collaborative.user_item_matrix[1].keys() == {10, 11}
+            assert engine.collaborative.user_item_matrix[1][11] == pytest.approx(3.5, rel=1e-3)
+            assert [item for item, _ in engine.collaborative.recommend_for_user(2)] == [11]
+        
+        engine._expire_streamed(time.time() + 365 * 86400)
+        await engine.refresh_interactions()
+        assert 1 not in engine.collaborative.user_item_matrix
+    
+    @pytest.mark.asyncio
+    async def test_persisted_deltas_replayed_only_after_the_read(self, monkeypatch):
+        """A bid the query already returned is not applied a second time"""
+        engine = recommendation_engine.RecommendationEngine()
+        rows = [{'user_id': 1, 'product_id': 10, 'interaction_type': 'purchase'}]
+        applied = []
+        
+        async def fake_get_all_interactions():
+            # Persisted before the read, then one more arrives during the fetch
+            engine.record_interaction(1, 11, 'bid', timestamp=time.time() - 60)
+            rows.append({'user_id': 1, 'product_id': 11, 'interaction_type': 'bid'})
+            engine.record_interaction(1, 12, 'bid')
+            return list(rows)
+        
+        monkeypatch.setattr(
+            recommendation_engine.database, "get_all_interactions", fake_get_all_interactions
+        )
+        monkeypatch.setattr(
+            CollaborativeFilter, "apply_interaction",
+            lambda self, user_id, item_id, *args: applied.append((self, item_id))
+        )
+        
+        await engine.refresh_interactions()
+        assert [item for cf, item in applied if cf is engine.collaborative] == [12]
+        assert [delta[1] for delta in engine._persisted_deltas] == [12]
+        
+        applied.clear()
+        rows.append({'user_id': 1, 'product_id': 12, 'interaction_type': 'bid'})
+        await engine.refresh_interactions()
+        assert [item for cf, item in applied if cf is engine.collaborative] == [12]
+
+
+class TestStreamingCollaborativeUpdates:
+    """Tests for incremental, time-decayed interaction deltas"""
+    
+    def test_streamed_interactions_match_batch_jaccard(self):
+        """Without decay, streaming deltas reproduce the batch Jaccard scores"""
+        interactions = _random_interactions(n_items=15)
+        batch = CollaborativeFilter(use_sparse=False)
+        batch.build_from_interactions(interactions)
+        
+        streamed = CollaborativeFilter(half_life_days=1e9)
+        now = 1_700_000_000.0
+        for interaction in interactions:
+            streamed.apply_interaction(
+                interaction['user_id'], interaction['product_id'], timestamp=now
+            )
+        
+        assert not streamed._index_dirty
+        for item_id in range(1, 16):
+            expected = batch.compute_item_similarity(item_id)
+            actual = streamed.compute_item_similarity(item_id)
+            assert actual.keys() == expected.keys()
+            for other_id, sim in actual.items():
+                assert sim == pytest.approx(expected[other_id], rel=1e-3)
+    
+    def test_repeat_interactions_are_not_new_co_occurrences(self):
+        """Replaying a pair the user already has leaves the Jaccard scores as in batch"""
+        interactions = [
+            {'user_id': 1, 'product_id': 10}, {'user_id': 1, 'product_id': 20},
+            {'user_id': 2, 'product_id': 10}, {'user_id': 3, 'product_id': 20},
+        ]
+        batch = CollaborativeFilter(use_sparse=False)
+        batch.build_from_interactions(interactions)
+        
+        streamed = CollaborativeFilter(half_life_days=1e9)
+        now = 1_700_000_000.0
+        for interaction in interactions:
+            streamed.apply_interaction(
+                interaction['user_id'], interaction['product_id'], timestamp=now
+            )
+        for _ in range(20):
+            streamed.apply_interaction(1, 10, 3.0, timestamp=now)
+        
+        assert streamed.compute_item_similarity(10) == {20: pytest.approx(1 / 3, rel=1e-3)}
+        assert streamed.compute_item_similarity(10) == \
+            pytest.approx(batch.compute_item_similarity(10), rel=1e-3)
+        assert streamed.user_item_matrix[1][10] == pytest.approx(3.0)
+    
+    def test_recent_interactions_outweigh_stale_ones(self):
+        """Co-occurrence from old interactions decays relative to new ones"""
+        cf = CollaborativeFilter(half_life_days=1)
+        start = 1_700_000_000.0
+        cf.apply_interaction(1, 100, timestamp=start)
+        cf.apply_interaction(1, 200, timestamp=start)
+        later = start + 10 * 86400
+        cf.apply_interaction(2, 100, timestamp=later)
+        cf.apply_interaction(2, 300, timestamp=later)
+        
+        sims = cf.compute_item_similarity(100)
+        assert sims[300] > sims[200]
+    
+    def test_new_items_grow_neighbour_arrays(self):
+        """Unseen items are appended to the index without a rebuild"""
+        cf = CollaborativeFilter()
+        cf.build_from_interactions(_random_interactions(n_users=5, n_items=10))
+        cf.build_sparse_index()
+        
+        for item_id in range(1000, 1040):
+            cf.apply_interaction(1, item_id)
+        
+        assert not cf._index_dirty
+        assert cf._n_items == len(cf.item_users)
+        sims = cf.compute_item_similarity(1039)
+        assert len(sims) == cf.top_k
+        assert all(other in cf.user_item_matrix[1] for other in sims)
+
+
+class TestSimilarityCache:
+    """Tests for the bounded item-similarity cache"""
+    
+    def test_lru_eviction_and_stats(self):
+        """Cache stays within its size bound and counts hits and misses"""
+        cache = TTLCache(max_size=2, ttl_seconds=0)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)  # evicts "b", the least recently used
+        
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+        stats = cache.get_stats()
+        assert stats["size"] == 2
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+        assert stats["evictions"] == 1
+    
+    def test_ttl_expiry(self, monkeypatch):
+        """Entries expire after their TTL"""
+        cache = TTLCache(max_size=10, ttl_seconds=60)
+        now = [1000.0]
+        monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+        cache.set("a", 1)
+        now[0] += 61
+        assert cache.get("a") is None
+        assert cache.get_stats()["expirations"] == 1
+    
+    def test_set_based_similarity_cached_until_interactions_change(self):
+        """The set walk is cached; new interactions change the cache key"""
+        cf = CollaborativeFilter(use_sparse=False)
+        cf.build_from_interactions(_random_interactions(n_users=10, n_items=8))
+        item_id = next(iter(cf.item_users))
+        first = cf.compute_item_similarity(item_id)
+        assert cf.compute_item_similarity(item_id) is first
+        assert cf.item_similarity.get_stats()["hits"] == 1
+        
+        cf.add_interaction(99, item_id)
+        assert cf.compute_item_similarity(item_id) is not first
+    
+    def test_set_based_similarity_cached_per_top_k(self):
+        """A shorter cached list is not served for a longer request"""
+        cf = CollaborativeFilter(use_sparse=False)
+        cf.build_from_interactions(_random_interactions(n_users=10, n_items=8))
+        item_id = next(iter(cf.item_users))
+        assert len(cf.compute_item_similarity(item_id, top_k=2)) == 2
+        assert len(cf.compute_item_similarity(item_id, top_k=20)) > 2
+    
+    @pytest.mark.asyncio
+    async def test_snapshot_swap_invalidates_and_reports_cache(self, monkeypatch):
+        """Rebuilt snapshots keep the set-based cache, cleared for the new version"""
+        engine = recommendation_engine.RecommendationEngine()
+        engine.collaborative = CollaborativeFilter(use_sparse=False)
+        cache = engine.collaborative.item_similarity
+        interactions = _random_interactions(n_users=10, n_items=8)
+        
+        async def fake_get_all_interactions():
+            return interactions
+        
+        monkeypatch.setattr(
+            recommendation_engine.database, "get_all_interactions", fake_get_all_interactions
+        )
+        
+        engine.collaborative.build_from_interactions(interactions)
+        engine.collaborative.compute_item_similarity(interactions[0]['product_id'])
+        assert await engine.refresh_interactions() == 1
+        
+        assert engine.collaborative.item_similarity is cache
+        assert not engine.collaborative.use_sparse
+        stats = engine.get_cache_stats()["item_similarity"]
+        assert stats["size"] == 0 and stats["invalidations"] == 1 and stats["version"] == 1
+    
+    def test_sparse_path_reads_neighbour_arrays_directly(self):
+        """Precomputed neighbour arrays need no similarity cache"""
+        cf = CollaborativeFilter()
+        assert cf.item_similarity is None
+        cf.build_from_interactions(_random_interactions(n_users=10, n_items=8))
+        assert cf.recommend_for_user(1)
+        assert "item_similarity" not in recommendation_engine.RecommendationEngine().get_cache_stats()
+
+
+def _synthetic_products(n: int = 600, seed: int = 3):
+    rng = random.Random(seed)
+    topics = [
+        ["iphone", "apple", "smartphone", "ios", "camera", "screen"],
+        ["sneakers", "nike", "running", "shoes", "sport", "sole"],
+        ["laptop", "macbook", "keyboard", "ssd", "processor", "display"],
+        ["handbag", "leather", "gucci", "luxury", "fashion", "strap"],
+        ["coffee", "espresso", "grinder", "beans", "kitchen", "brew"],
+    ]
+    products = []
+    for pid in range(1, n + 1):
+        topic = topics[pid % len(topics)]
+        words = rng.sample(topic, 4) + [f"model{rng.randint(1, 40)}"]
+        products.append({
+            'id': pid,
+            'title': ' '.join(words),
+            'category_id': pid % len(topics),
+            'category_name': topic[0],
+            'condition': rng.choice(['new', 'used']),
+            'price': float(rng.randint(10, 2000)),
+            'seller_id': rng.randint(1, 50),
+            'view_count': rng.randint(0, 20000),
+        })
+    return products
+
+
+def _seller_of(cbf, product_id):
+    return cbf.catalog.seller_ids[cbf.catalog.row_of(product_id)]
+
+
+class TestContentBasedAnnIndex:
+    """Tests for the LSH-backed similar-product lookup"""
+    
+    @pytest.fixture
+    def fitted(self):
+        cbf = recommendation_engine.ContentBasedFilter(ann_min_products=0, ann_dimensions=32)
+        cbf.fit(_synthetic_products())
+        return cbf
+    
+    def test_ann_index_built_for_large_catalogs_only(self):
+        small = recommendation_engine.ContentBasedFilter(ann_min_products=10_000)
+        small.fit(_synthetic_products(n=50))
+        assert small.ann_index is None
+    
+    def test_ann_recall_against_exact(self, fitted):
+        """ANN neighbours mostly agree with the exact full scan"""
+        assert fitted.ann_index is not None
+        recalls = []
+        for product_id in range(1, 101):
+            exact = fitted.get_similar_products(product_id, limit=10, exact=True)
+            approx = fitted.get_similar_products(product_id, limit=10)
+            # Score ties make set overlap ambiguous; compare score levels
+            assert [s for _, s in approx][-1] <= [s for _, s in exact][0] + 1e-9
+            floor = exact[-1][1]
+            recalls.append(sum(1 for _, s in approx if s >= floor - 1e-9) / len(exact))
+        assert np.mean(recalls) >= 0.9
+    
+    def test_ann_respects_seller_exclusion(self, fitted):
+        source_seller = _seller_of(fitted, 7)
+        for pid, _ in fitted.get_similar_products(7, limit=10):
+            assert pid != 7
+            assert _seller_of(fitted, pid) != source_seller
+
+
+class TestSimilarityTable:
+    """Tests for the precomputed, memory-mapped similar-products table"""
+    
+    @pytest.fixture
+    def fitted(self):
+        cbf = recommendation_engine.ContentBasedFilter(use_ann=False)
+        cbf.fit(_synthetic_products(n=300))
+        return cbf
+    
+    def _build(self, cbf, **kwargs):
+        return build_similarity_table(
+            cbf.product_vectors,
+            np.asarray(cbf.product_ids),
+            cbf.catalog.seller_ids,
+            k=20,
+            **kwargs
+        )
+    
+    def test_table_matches_exact_scan(self, fitted):
+        table = self._build(fitted)
+        for product_id in (1, 50, 123):
+            expected = fitted.get_similar_products(product_id, limit=10, exact=True)
+            actual = table.neighbors(product_id, limit=10)
+            assert [s for _, s in actual] == pytest.approx([s for _, s in expected], rel=1e-5)
+            source_seller = _seller_of(fitted, product_id)
+            assert all(_seller_of(fitted, pid) != source_seller for pid, _ in actual)
+    
+    def test_parallel_build_matches_serial(self, fitted, monkeypatch):
+        serial = self._build(fitted)
+        monkeypatch.setattr(similarity_table, "BLOCK_BUDGET_BYTES", 4 * 300 * 16)
+        parallel = self._build(fitted, n_workers=2)
+        np.testing.assert_allclose(parallel.neighbor_sim, serial.neighbor_sim, rtol=1e-5)
+    
+    def test_worker_ranges_reuse_the_shared_transpose(self, fitted, monkeypatch):
+        sparse = similarity_table.sparse
+        serial = self._build(fitted)
+        vectors = sparse.csr_matrix(fitted.product_vectors, dtype=np.float32)
+        monkeypatch.setattr(similarity_table, "_worker_vectors", None)
+        monkeypatch.setattr(similarity_table, "_worker_vectors_t", None)
+        similarity_table._init_worker(vectors, vectors.T.tocsc())
+        
+        def no_transpose(*args, **kwargs):
+            raise AssertionError("transposed inside a range task")
+        
+        monkeypatch.setattr(sparse.csr_matrix, "transpose", no_transpose)
+        start, idx, sim = similarity_table._worker_range((100, 200, 32, 20))
+        assert start == 100
+        np.testing.assert_allclose(sim, serial.neighbor_sim[100:200], rtol=1e-5)
+    
+    def test_save_and_memory_mapped_load(self, fitted, tmp_path):
+        table = self._build(fitted)
+        table.save(str(tmp_path))
+        loaded = SimilarityTable.load(str(tmp_path))
+        
+        assert isinstance(loaded.neighbor_idx, np.memmap)
+        assert len(loaded) == len(table)
+        assert loaded.neighbors(42, limit=5) == table.neighbors(42, limit=5)
+    
+    def test_load_without_saved_table(self, tmp_path):
+        assert SimilarityTable.load(str(tmp_path)) is None
+    
+    def test_last_save_wins_and_current_is_never_pruned(self, fitted, tmp_path, monkeypatch):
+        """Versions follow write order, not built_at"""
+        (tmp_path / "20990101000000000000").mkdir()  # legacy built_at-named version
+        table = self._build(fitted)
+        for built_at in (datetime(2026, 3, 1), datetime(2026, 2, 1), datetime(2026, 1, 1)):
+            table.built_at = built_at
+            table.save(str(tmp_path))
+        
+        loaded = SimilarityTable.load(str(tmp_path))
+        assert loaded.built_at == datetime(2026, 1, 1)
+        assert loaded.version == table.version
+        assert sorted(d.name for d in tmp_path.iterdir() if d.is_dir()) == [
+            "v00000002", "v00000003"
+        ]
+        
+        # A concurrent writer may have moved CURRENT to an older version
+        monkeypatch.setattr(snapshot_store, "current_version", lambda directory: "v00000002")
+        table.save(str(tmp_path))
+        table.save(str(tmp_path))
+        assert sorted(d.name for d in tmp_path.iterdir() if d.is_dir()) == [
+            "v00000002", "v00000004", "v00000005"
+        ]
+
+
+def _profile_scores_loop(products, preferred_categories, price_range):
+    """Per-product scoring as recommend_for_profile computed it before vectorizing"""
+    min_price, max_price = price_range
+    scored = []
+    for product in products:
+        score = 0.0
+        if product.get('category_id') in preferred_categories:
+            score += 0.5
+        price = product.get('price', 0)
+        if min_price is not None and max_price is not None:
+            if min_price <= price <= max_price:
+                score += 0.3
+        score += min(0.2, product.get('view_count', 0) / 10000)
+        if score > 0:
+            scored.append((product['id'], score))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored
+
+
+class TestProfileRecommendations:
+    """Tests for columnar, vectorized profile scoring"""
+    
+    @pytest.fixture
+    def products(self):
+        return _synthetic_products(n=400)
+    
+    @pytest.fixture
+    def fitted(self, products):
+        cbf = recommendation_engine.ContentBasedFilter(use_ann=False)
+        cbf.fit(products)
+        return cbf
+    
+    def test_catalog_columns_align_with_products(self, products):
+        catalog = ProductCatalog.from_products(products + [{'id': 999}])
+        assert len(catalog) == len(products) + 1
+        assert catalog.product_ids[10] == products[10]['id']
+        assert catalog.prices[10] == products[10]['price']
+        assert catalog.category_ids[-1] == NO_CATEGORY
+        assert catalog.view_counts[-1] == 0
+    
+    @pytest.mark.parametrize("categories,price_range", [
+        ([1, 3], (100.0, 900.0)),
+        ([2], (None, None)),
+        ([], (0.0, 50.0)),
+    ])
+    def test_matches_per_product_loop(self, fitted, products, categories, price_range):
+        expected = _profile_scores_loop(products, categories, price_range)[:25]
+        actual = fitted.recommend_for_profile(categories, price_range, limit=25)
+        assert actual == expected
+    
+    def test_zero_scores_excluded(self):
+        cbf = recommendation_engine.ContentBasedFilter(use_ann=False)
+        cbf.fit([
+            {'id': 1, 'title': 'red lamp', 'category_id': 1, 'price': 10.0, 'view_count': 0},
+            {'id': 2, 'title': 'blue lamp', 'category_id': 2, 'price': 10.0, 'view_count': 0},
+        ])
+        assert cbf.recommend_for_profile([1], limit=10) == [(1, 0.5)]
+
+
+class _FakeConnection:
+    """Records queries and answers them from an in-memory listing table"""
+    
+    def __init__(self, listings):
+        self.listings = listings
+        self.queries = []
+    
+    async def fetch_prepared(self, name, ids):
+        assert name == "product_details"
+        self.queries.append(list(ids))
+        # Like Postgres, ANY($1) gives no ordering guarantee
+        return [self.listings[pid] for pid in sorted(ids, reverse=True) if pid in self.listings]
+
+
+class TestProductHydration:
+    """Tests for batched, cached product lookups"""
+    
+    @pytest.fixture
+    def conn(self, monkeypatch):
+        database = recommendation_engine.database
+        conn = _FakeConnection({
+            pid: {'id': pid, 'title': f'listing {pid}', 'category_id': 1, 'price': 10.0 * pid}
+            for pid in range(1, 11)
+        })
+        
+        @asynccontextmanager
+        async def fake_connection(readonly=False):
+            yield conn
+        
+        monkeypatch.setattr(database.Database, "connection", fake_connection)
+        monkeypatch.setattr(database, "product_cache", TTLCache(max_size=100, ttl_seconds=60))
+        return conn
+    
+    @pytest.mark.asyncio
+    async def test_single_round_trip_preserves_order(self, conn):
+        products = await recommendation_engine.database.get_products_by_ids([3, 9, 42, 1, 9])
+        assert [p['id'] for p in products] == [3, 9, 1, 9]
+        assert conn.queries == [[3, 9, 42, 1]]
+    
+    @pytest.mark.asyncio
+    async def test_cached_products_skip_the_database(self, conn):
+        database = recommendation_engine.database
+        await database.get_products_by_ids([1, 2])
+        products = await database.get_products_by_ids([2, 5, 1])
+        
+        assert [p['id'] for p in products] == [2, 5, 1]
+        assert conn.queries == [[1, 2], [5]]
+        assert (await database.get_product_by_id(5))['title'] == 'listing 5'
+        assert len(conn.queries) == 2
+    
+    @pytest.mark.asyncio
+    async def test_similar_products_hydrated_in_ranking_order(self, conn, monkeypatch):
+        engine = recommendation_engine.RecommendationEngine()
+        engine._initialized = True
+        engine.content_based = recommendation_engine.ContentBasedFilter(use_ann=False)
+        engine.content_based.fit([
+            {'id': pid, 'title': f'vintage camera lens{pid % 3} model{pid}', 'category_id': 1,
+             'seller_id': pid}
+            for pid in range(1, 11)
+        ])
+        expected = engine.content_based.get_similar_products(4, limit=5)
+        
+        async def no_category_fallback(**kwargs):
+            return []
+        
+        monkeypatch.setattr(
+            recommendation_engine.database, "get_similar_products_by_category", no_category_fallback
+        )
+        recs = await engine.get_similar_products(4, limit=5)
+        
+        assert [r.product.id for r in recs] == [pid for pid, _ in expected]
+        # One lookup for the source product, one batch for the neighbours
+        assert len(conn.queries) == 2
+
+
+class TestContentSnapshot:
+    """Tests for saving and memory-mapping the fitted content model"""
+    
+    @pytest.fixture
+    def fitted(self):
+        cbf = recommendation_engine.ContentBasedFilter(ann_min_products=0, ann_dimensions=32)
+        cbf.fit(_synthetic_products(n=400))
+        return cbf
+    
+    def test_round_trip_is_memory_mapped(self, fitted, tmp_path):
+        fitted.save_snapshot(str(tmp_path))
+        loaded = recommendation_engine.ContentBasedFilter.load_snapshot(str(tmp_path))
+        
+        assert isinstance(loaded.catalog.product_ids, np.memmap)
+        assert not loaded.product_vectors.data.flags.writeable  # a view of the read-only map
+        assert loaded.ann_index is not None
+        assert abs(loaded.product_vectors - fitted.product_vectors).max() == 0
+        for product_id in (3, 150, 400):
+            assert loaded.get_similar_products(product_id, limit=5) == \
+                fitted.get_similar_products(product_id, limit=5)
+            assert loaded.category_of(product_id) == fitted.category_of(product_id)
+        assert loaded.recommend_for_profile([2], (100.0, 900.0)) == \
+            fitted.recommend_for_profile([2], (100.0, 900.0))
+    
+    def test_restored_idf_transforms_new_text(self, fitted, tmp_path):
+        fitted.save_snapshot(str(tmp_path))
+        loaded = recommendation_engine.ContentBasedFilter.load_snapshot(str(tmp_path))
+        counts, _ = loaded.transform_chunk([{'id': 1, 'title': 'nike running shoes'}])
+        expected, _ = fitted.transform_chunk([{'id': 1, 'title': 'nike running shoes'}])
+        
+        assert abs(loaded.tfidf.transform(counts) - fitted.tfidf.transform(expected)).max() == 0
+    
+    def test_stale_or_mismatched_snapshots_are_ignored(self, fitted, tmp_path):
+        ContentBasedFilter = recommendation_engine.ContentBasedFilter
+        assert ContentBasedFilter.load_snapshot(str(tmp_path)) is None
+        
+        fitted.built_at = datetime.utcnow() - timedelta(hours=2)
+        fitted.save_snapshot(str(tmp_path))
+        assert ContentBasedFilter.load_snapshot(str(tmp_path), max_age_seconds=3600) is None
+        assert ContentBasedFilter.load_snapshot(str(tmp_path), n_features=2 ** 10) is None
+        assert ContentBasedFilter.load_snapshot(str(tmp_path), max_age_seconds=86400) is not None
+
+
+class _FakeCursor:
+    def __init__(self, rows, fetches, gate=None):
+        self.rows = rows
+        self.fetches = fetches
+        self.gate = gate
+    
+    async def fetch(self, n):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.fetches.append(n)
+        chunk, self.rows = self.rows[:n], self.rows[n:]
+        return chunk
+
+
+class _CursorConnection:
+    """Serves the catalog stream from a server-side cursor inside a transaction"""
+    
+    def __init__(self, rows, watermark=None):
+        self.rows = rows
+        self.watermark = watermark or datetime(2026, 1, 1)
+        self.fetches = []
+        self.cursors_opened = 0
+        self.gate = None  # an asyncio.Event that holds cursor fetches while unset
+        self.in_transaction = False
+    
+    @asynccontextmanager
+    async def transaction(self, isolation=None, readonly=False):
+        assert readonly and isolation == "repeatable_read"
+        self.in_transaction = True
+        yield
+        self.in_transaction = False
+    
+    async def fetch_prepared(self, name, *args):
+        if name == "catalog_changes":
+            since, limit = args
+            changed = sorted(
+                (row for row in self.rows if row['updated_at'] >= since),
+                key=lambda row: (row['updated_at'], row['id'])
+            )
+            return changed[:limit]
+        assert name == "catalog_watermark"
+        return [{'updated_at': self.watermark}]
+    
+    async def cursor_prepared(self, name):
+        assert name == "catalog_stream"
+        assert self.in_transaction
+        self.cursors_opened += 1
+        return _FakeCursor(list(self.rows), self.fetches, self.gate)
+
+
+@pytest.fixture
+def catalog_conn(monkeypatch):
+    conn = _CursorConnection([
+        {**product, 'active': True, 'updated_at': datetime(2025, 12, 1)}
+        for product in _synthetic_products(n=2500)
+    ])
+    
+    @asynccontextmanager
+    async def fake_connection(readonly=False):
+        assert readonly
+        yield conn
+    
+    monkeypatch.setattr(recommendation_engine.database.Database, "connection", fake_connection)
+    return conn
+
+
+class TestStartupProfile:
+    """Tests for deferred imports and the startup report"""
+    
+    def test_lazy_import_records_first_import_only(self, monkeypatch):
+        profile = startup.StartupProfile()
+        monkeypatch.setattr(startup, "startup_profile", profile)
+        monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+        
+        module = startup.lazy_import("colorsys")
+        assert startup.lazy_import("colorsys") is module
+        assert [(s["kind"], s["name"]) for s in profile.steps] == [("import", "colorsys")]
+        
+        profile.mark_ready()
+        report = profile.report()
+        assert report["steps"][0]["before_ready"]
+        assert report["within_target"] == (report["ready_seconds"] <= report["target_seconds"])
+    
+    def test_snapshot_served_without_importing_sklearn(self, tmp_path):
+        cbf = recommendation_engine.ContentBasedFilter(ann_min_products=0, ann_dimensions=32)
+        cbf.fit(_synthetic_products(n=300))
+        cbf.save_snapshot(str(tmp_path))
+        expected = cbf.get_similar_products(5, limit=5, exact=True)
+        
+        script = f"""
+import importlib.util, sys
+sys.path[:0] = [{SERVICE_ROOT!r}]
+spec = importlib.util.spec_from_file_location("recommendation_engine", {ENGINE_PATH!r})
+engine = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(engine)
+assert "sklearn" not in sys.modules, "imported by the engine module"
+content = engine.ContentBasedFilter.load_snapshot({str(tmp_path)!r})
+print(content.get_similar_products(5, limit=5, exact=True))
+print("sklearn" in sys.modules)
+"""
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        similar, sklearn_loaded = result.stdout.strip().splitlines()[-2:]
+        assert sklearn_loaded == "False"
+        assert [pid for pid, _ in eval(similar)] == [pid for pid, _ in expected]
+    
+    def test_app_import_defers_heavy_clients(self):
+        script = """
+import sys
+import src.main
+import src.ml_serving
+print(",".join(sorted({"sklearn", "httpx", "aio_pika", "redis"} & set(sys.modules))))
+print(type(src.main.recommendation_engine).__name__)
+"""
+        result = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, cwd=SERVICE_ROOT
+        )
+        assert result.returncode == 0, result.stderr
+        eager, engine = result.stdout.splitlines()[-2:]
+        assert eager == ""
+        assert engine == "RecommendationEngine"
+
+
+class TestStreamingCatalog:
+    """Tests for the cursor-streamed, hashed content model fit"""
+    
+    def test_chunked_fit_matches_single_fit(self):
+        products = _synthetic_products(n=300)
+        whole = recommendation_engine.ContentBasedFilter(use_ann=False)
+        whole.fit(products)
+        chunked = recommendation_engine.ContentBasedFilter(use_ann=False)
+        chunked.fit_chunks(chunked.transform_chunk(products[i:i + 64]) for i in range(0, 300, 64))
+        
+        np.testing.assert_array_equal(chunked.product_ids, whole.product_ids)
+        np.testing.assert_array_equal(chunked.catalog.seller_ids, whole.catalog.seller_ids)
+        assert abs(chunked.product_vectors - whole.product_vectors).max() < 1e-6
+        assert chunked.get_similar_products(17, limit=5) == whole.get_similar_products(17, limit=5)
+    
+    @pytest.mark.asyncio
+    async def test_cursor_yields_fixed_size_chunks(self, catalog_conn):
+        database = recommendation_engine.database
+        chunks = [c async for c in database.iter_active_product_chunks(chunk_size=1000)]
+        
+        assert [len(rows) for _, rows in chunks] == [1000, 1000, 500]
+        assert {watermark for watermark, _ in chunks} == {catalog_conn.watermark}
+        assert catalog_conn.fetches == [1000, 1000, 1000]
+    
+    @pytest.mark.asyncio
+    async def test_engine_fits_beyond_first_thousand(self, catalog_conn):
+        engine = recommendation_engine.RecommendationEngine()
+        content = await engine.build_content_model()
+        
+        assert len(content.catalog) == 2500
+        assert content.product_vectors.shape[0] == 2500
+        assert content.watermark == catalog_conn.watermark
+        assert content.category_of(2400) == 2400 % 5
+        assert content.category_of(99999) is None
+        assert content.get_similar_products(2400, limit=3)
+
+
+class TestContentRefresh:
+    """Tests for watermark-driven content model rebuilds"""
+    
+    @staticmethod
+    def _engine(snapshot_dir, monkeypatch):
+        engine = recommendation_engine.RecommendationEngine()
+        engine.content_snapshot_dir = snapshot_dir
+        
+        async def skip_similarity_table():
+            pass
+        
+        monkeypatch.setattr(engine, "refresh_similarity_table", skip_similarity_table)
+        return engine
+    
+    @pytest.fixture
+    async def engine(self, catalog_conn, tmp_path, monkeypatch):
+        engine = self._engine(str(tmp_path), monkeypatch)
+        engine.content_based = await engine.build_content_model()
+        return engine
+    
+    @pytest.mark.asyncio
+    async def test_unchanged_or_lagging_watermark_keeps_model(self, engine, catalog_conn):
+        current = engine.content_based
+        assert not await engine.refresh_content()
+        catalog_conn.watermark = datetime(2025, 1, 1)  # a replica behind the fit
+        assert not await engine.refresh_content()
+        assert engine.content_based is current
+    
+    @pytest.mark.asyncio
+    async def test_new_listing_swapped_in_atomically(self, engine, catalog_conn):
+        old = engine.content_based
+        catalog_conn.rows = catalog_conn.rows + [
+            {'id': 9001, 'title': 'vintage leica camera', 'category_id': 2, 'seller_id': 7,
+             'active': True, 'updated_at': datetime(2026, 2, 1)}
+        ]
+        catalog_conn.watermark = datetime(2026, 2, 1)
+        catalog_conn.gate = asyncio.Event()
+        
+        refresh = asyncio.create_task(engine.refresh_content(force=True))
+        await asyncio.sleep(0.01)
+        # The rebuild is parked mid-stream; requests still see the full old model
+        assert engine.content_based is old
+        assert engine.content_based.get_similar_products(9001) == []
+        
+        catalog_conn.gate.set()
+        assert await refresh
+        
+        assert engine.content_based is not old
+        assert engine.content_based.watermark == datetime(2026, 2, 1)
+        assert engine.content_based.category_of(9001) == 2
+        assert len(old.catalog) == 2500
+    
+    @pytest.mark.asyncio
+    async def test_published_snapshot_reused_by_other_workers(
+        self, engine, catalog_conn, tmp_path, monkeypatch
+    ):
+        catalog_conn.watermark = datetime(2026, 2, 1)
+        assert await engine.refresh_content(force=True)
+        opened = catalog_conn.cursors_opened
+        
+        other = self._engine(str(tmp_path), monkeypatch)
+        assert await other.refresh_content()
+        
+        assert catalog_conn.cursors_opened == opened
+        assert other.content_based.watermark == datetime(2026, 2, 1)
+        assert len(other.content_based.catalog) == 2500
+    
+    @pytest.mark.asyncio
+    async def test_only_the_fitting_worker_builds_the_table(
+        self, catalog_conn, tmp_path, monkeypatch
+    ):
+        builds = []
+        engines = []
+        for _ in range(2):
+            engine = recommendation_engine.RecommendationEngine()
+            engine.content_snapshot_dir = str(tmp_path / "content")
+            engine.similarity_table_dir = str(tmp_path / "table")
+            engines.append(engine)
+        fitter, other = engines
+        
+        real_build = recommendation_engine.build_similarity_table
+        
+        def counting_build(*args, **kwargs):
+            builds.append(args[0].shape[0])
+            return real_build(*args, **kwargs)
+        
+        monkeypatch.setattr(recommendation_engine, "build_similarity_table", counting_build)
+        assert await fitter.refresh_content(force=True)
+        await fitter._table_task
+        assert await other.refresh_content()
+        assert other._table_task is None
+        assert await other.sync_similarity_table()
+        assert not await other.sync_similarity_table()
+        # Re-running on the current fit is a no-op
+        await fitter.refresh_similarity_table()
+        
+        assert builds == [2500]
+        assert other.similarity_table.version == fitter.similarity_table.version
+        assert other.similarity_table.content_built_at == fitter.content_based.built_at
+
+
+class TestContentDelta:
+    """Tests for applying listing changes without a full re-fit"""
+    
+    @pytest.fixture
+    def fitted(self):
+        cbf = recommendation_engine.ContentBasedFilter(ann_min_products=0, ann_dimensions=32)
+        cbf.fit(_synthetic_products(n=600))
+        cbf.watermark = datetime(2026, 1, 1)
+        return cbf
+    
+    @staticmethod
+    def _change(product, updated_at=datetime(2026, 1, 2), active=True, **fields):
+        return {**product, **fields, 'active': active, 'updated_at': updated_at}
+    
+    def test_updates_appends_and_tombstones(self, fitted):
+        products = {p['id']: p for p in _synthetic_products(n=600)}
+        new_listing = {**products[7], 'id': 9001, 'seller_id': 999}
+        changes = [
+            self._change(products[10], title='espresso grinder beans kitchen'),
+            self._change(new_listing, updated_at=datetime(2026, 1, 3)),
+            self._change(products[20], active=False),
+        ]
+        delta = fitted.apply_changes(changes)
+        
+        assert len(fitted.catalog) == 600 and fitted.watermark == datetime(2026, 1, 1)
+        assert len(delta.catalog) == 601
+        assert delta.watermark == datetime(2026, 1, 3)
+        assert delta.is_changed(10) and delta.is_changed(9001) and not delta.is_changed(11)
+        assert delta.is_tombstoned(20) and not fitted.is_tombstoned(20)
+        
+        # Changed rows are vectorized with the fitted IDF weights
+        counts, _ = fitted.transform_chunk([changes[0]])
+        expected = fitted.tfidf.transform(counts)
+        row = delta.catalog.row_of(10)
+        merged = delta.merged_vectors()
+        assert abs(merged[row] - expected).max() < 1e-6
+        unchanged = fitted.catalog.row_of(11)
+        assert abs(merged[unchanged] - fitted.product_vectors[unchanged]).max() == 0
+        
+        # The fitted matrix is shared as is; only the changed rows are held apart
+        assert delta.product_vectors is fitted.product_vectors
+        assert delta.overlay_rows.tolist() == [row, 600]
+        
+        # The appended copy of listing 7 is found through the ANN path
+        assert delta.get_similar_products(7, limit=5)[0] == (9001, pytest.approx(1.0, abs=1e-5))
+        assert all(pid != 20 for pid, _ in delta.get_similar_products(25, limit=50, exact=True))
+        assert delta.get_similar_products(20) == []
+        assert 20 not in [pid for pid, _ in delta.recommend_for_profile([0], limit=600)]
+    
+    def test_deltas_leave_the_mapped_snapshot_untouched(self, fitted, tmp_path):
+        fitted.save_snapshot(str(tmp_path))
+        loaded = recommendation_engine.ContentBasedFilter.load_snapshot(
+            str(tmp_path), ann_min_products=0, ann_dimensions=32
+        )
+        products = {p['id']: p for p in _synthetic_products(n=600)}
+        first = loaded.apply_changes([self._change(products[10], title='espresso grinder')])
+        second = first.apply_changes([
+            self._change(products[10], title='espresso grinder beans kitchen'),
+            self._change({**products[7], 'id': 9001, 'seller_id': 999}),
+        ])
+        
+        assert second.product_vectors is loaded.product_vectors
+        assert not second.product_vectors.data.flags.writeable
+        # A row updated twice keeps one overlay row, the latest
+        assert second.overlay_rows.tolist() == [loaded.catalog.row_of(10), 600]
+        assert second.get_similar_products(7, limit=1) == [(9001, pytest.approx(1.0, abs=1e-5))]
+        
+        # Saving merges the overlay, so the next load serves the same neighbours
+        second.save_snapshot(str(tmp_path))
+        reloaded = recommendation_engine.ContentBasedFilter.load_snapshot(
+            str(tmp_path), ann_min_products=0, ann_dimensions=32
+        )
+        assert reloaded.overlay_rows.size == 0
+        assert reloaded.get_similar_products(10, limit=5, exact=True) == \
+            pytest.approx(second.get_similar_products(10, limit=5, exact=True))
+    
+    def test_large_or_drifting_deltas_require_refit(self, fitted):
+        products = _synthetic_products(n=600)
+        too_many = [self._change(p) for p in products[:100]]
+        assert fitted.apply_changes(too_many, max_changed_fraction=0.1) is None
+        
+        unseen = [self._change(products[0], title='zeppelin quokka xylophone marimba',
+                               category_name='', condition='', description='')]
+        assert fitted.apply_changes(unseen, drift_threshold=0.3) is None
+        assert fitted.apply_changes(unseen, drift_threshold=1.0).vocabulary_drift > 0.3
+    
+    @pytest.mark.asyncio
+    async def test_refresh_applies_delta_without_streaming(self, catalog_conn, tmp_path, monkeypatch):
+        engine = TestContentRefresh._engine(str(tmp_path), monkeypatch)
+        engine.content_based = await engine.build_content_model()
+        opened = catalog_conn.cursors_opened
+        product_cache = TTLCache(max_size=10, ttl_seconds=60)
+        monkeypatch.setattr(recommendation_engine.database, "product_cache", product_cache)
+        changed_id, unchanged_id = catalog_conn.rows[5]['id'], catalog_conn.rows[6]['id']
+        product_cache.set(changed_id, {'id': changed_id})
+        product_cache.set(unchanged_id, {'id': unchanged_id})
+        
+        catalog_conn.rows[5] = {**catalog_conn.rows[5], 'active': False,
+                                'updated_at': datetime(2026, 3, 1)}
+        catalog_conn.watermark = datetime(2026, 3, 1)
+        assert await engine.refresh_content()
+        
+        content = engine.content_based
+        assert catalog_conn.cursors_opened == opened
+        assert engine._table_task is None
+        assert content.watermark == datetime(2026, 3, 1)
+        assert content.is_tombstoned(catalog_conn.rows[5]['id'])
+        assert product_cache.get(changed_id) is None
+        assert product_cache.get(unchanged_id) == {'id': unchanged_id}
+        assert not await engine.refresh_content()
+
+
+class TestHomepageFanOut:
+    """Tests for concurrent homepage sections with per-section budgets"""
+    
+    @pytest.fixture
+    def engine(self):
+        engine = recommendation_engine.RecommendationEngine()
+        engine._initialized = True
+        return engine
+    
+    @pytest.mark.asyncio
+    async def test_sections_run_concurrently(self, engine, monkeypatch):
+        async def section(**kwargs):
+            await asyncio.sleep(0.1)
+            return ["ok"]
+        
+        monkeypatch.setattr(engine, "get_trending_products", section)
+        monkeypatch.setattr(engine, "get_personalized_recommendations", section)
+        monkeypatch.setattr(engine, "_get_featured_products", section)
+        
+        start = time.perf_counter()
+        result = await engine.get_homepage_recommendations(user_id=7, section_timeout=1.0)
+        elapsed = time.perf_counter() - start
+        
+        assert result == {'partial': [], 'trending': ["ok"], 'featured': ["ok"], 'personalized': ["ok"]}
+        assert elapsed < 0.25
+    
+    @pytest.mark.asyncio
+    async def test_slow_and_failing_sections_are_partial(self, engine, monkeypatch):
+        async def slow(**kwargs):
+            await asyncio.sleep(5)
+            return ["late"]
+        
+        async def failing(**kwargs):
+            raise RuntimeError("database unavailable")
+        
+        async def fast(**kwargs):
+            return ["ok"]
+        
+        monkeypatch.setattr(engine, "get_trending_products", slow)
+        monkeypatch.setattr(engine, "_get_featured_products", failing)
+        monkeypatch.setattr(engine, "get_personalized_recommendations", fast)
+        
+        start = time.perf_counter()
+        result = await engine.get_homepage_recommendations(user_id=7, section_timeout=0.05)
+        
+        assert time.perf_counter() - start < 1
+        assert result['personalized'] == ["ok"]
+        assert result['trending'] == [] and result['featured'] == []
+        assert sorted(result['partial']) == ['featured', 'trending']
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+    
+    async def get(self, key):
+        return self.data.get(key)
+    
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+class TestResponseCache:
+    """Tests for the two-tier, single-flight response cache"""
+    
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        now = [1_000_000.0]
+        # The package re-exports a `response_cache` instance over the module name
+        module = importlib.import_module("cache.response_cache")
+        monkeypatch.setattr(module.time, "time", lambda: now[0])
+        return now
+    
+    def test_key_ignores_parameter_order(self):
+        assert ResponseCache.make_key("homepage", {"user_id": 1, "limit": 20}) == \
+            ResponseCache.make_key("homepage", {"limit": 20, "user_id": 1})
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_compute_once(self):
+        cache = ResponseCache()
+        calls = []
+        
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"items": [1, 2, 3]}
+        
+        results = await asyncio.gather(*(
+            cache.get_or_compute("trending", {"limit": 10}, compute, ttl_seconds=60)
+            for _ in range(20)
+        ))
+        
+        assert len(calls) == 1
+        assert all(r == {"items": [1, 2, 3]} for r in results)
+        assert cache.get_stats()["coalesced"] == 19
+        
+        await cache.get_or_compute("trending", {"limit": 10}, compute, ttl_seconds=60)
+        assert len(calls) == 1
+        assert cache.get_stats()["fresh_hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_stale_served_while_revalidating(self, clock):
+        cache = ResponseCache(stale_seconds=100)
+        version = [1]
+        
+        async def compute():
+            return {"version": version[0]}
+        
+        await cache.get_or_compute("homepage", {}, compute, ttl_seconds=10)
+        version[0] = 2
+        clock[0] += 50  # past the TTL, inside the stale window
+        
+        assert await cache.get_or_compute("homepage", {}, compute, ttl_seconds=10) == {"version": 1}
+        await asyncio.sleep(0)  # let the background refresh finish
+        assert await cache.get_or_compute("homepage", {}, compute, ttl_seconds=10) == {"version": 2}
+        
+        clock[0] += 500  # past the stale window: recompute inline
+        version[0] = 3
+        assert await cache.get_or_compute("homepage", {}, compute, ttl_seconds=10) == {"version": 3}
+    
+    @pytest.mark.asyncio
+    async def test_failures_are_not_cached(self):
+        cache = ResponseCache()
+        attempts = []
+        
+        async def compute():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("database unavailable")
+            return {"ok": True}
+        
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("for-user", {"user_id": 1}, compute, ttl_seconds=60)
+        assert await cache.get_or_compute("for-user", {"user_id": 1}, compute, ttl_seconds=60) == {"ok": True}
+    
+    @pytest.mark.asyncio
+    async def test_uncacheable_responses_are_not_stored(self):
+        redis = _FakeRedis()
+        cache = ResponseCache(redis_client=redis)
+        partial = [True]
+        
+        async def compute():
+            return {"partial": partial[0]}
+        
+        def cacheable(response):
+            return not response["partial"]
+        
+        for _ in range(2):
+            assert await cache.get_or_compute(
+                "homepage", {}, compute, ttl_seconds=60, cacheable=cacheable
+            ) == {"partial": True}
+        assert cache.get_stats()["computations"] == 2
+        assert cache.get_stats()["uncached"] == 2 and not redis.data
+        
+        partial[0] = False
+        await cache.get_or_compute("homepage", {}, compute, ttl_seconds=60, cacheable=cacheable)
+        assert await cache.get_or_compute(
+            "homepage", {}, compute, ttl_seconds=60, cacheable=cacheable
+        ) == {"partial": False}
+        assert cache.get_stats()["fresh_hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_homepage_route_skips_caching_partial_sections(self, monkeypatch):
+        from src.routes import recommendations as routes
+        partial = [['featured']]
+        calls = []
+        
+        class FakeEngine:
+            async def get_homepage_recommendations(self, user_id, limit):
+                calls.append(user_id)
+                return {'trending': [], 'featured': [], 'personalized': [], 'partial': partial[0]}
+        
+        monkeypatch.setattr(routes, "recommendation_engine", FakeEngine())
+        monkeypatch.setattr(routes, "response_cache", ResponseCache())
+        
+        first = await routes.get_homepage_recommendations(user_id=None, limit=20)
+        assert first["partial_sections"] == ['featured']
+        partial[0] = []
+        assert (await routes.get_homepage_recommendations(user_id=None, limit=20))["partial_sections"] == []
+        await routes.get_homepage_recommendations(user_id=None, limit=20)
+        assert len(calls) == 2
+    
+    @pytest.mark.asyncio
+    async def test_redis_tier_shared_between_processes(self):
+        redis = _FakeRedis()
+        first, second = ResponseCache(redis_client=redis), ResponseCache(redis_client=redis)
+        
+        async def compute():
+            return {"products": [7, 8]}
+        
+        async def must_not_run():
+            raise AssertionError("expected a Redis hit")
+        
+        await first.get_or_compute("for-product", {"product_id": 7}, compute, ttl_seconds=60)
+        result = await second.get_or_compute("for-product", {"product_id": 7}, must_not_run, ttl_seconds=60)
+        
+        assert result == {"products": [7, 8]}
+        assert second.get_stats()["redis_hits"] == 1
+
+
+class TestTrendingIndex:
+    """Tests for the materialized, gravity-ranked trending index"""
+    
+    NOW_HOUR = trending_module.current_hour()
+    
+    @pytest.fixture
+    def index(self):
+        index = TrendingIndex(windows_hours=[24, 168], gravity=1.8, view_weight=0.1, list_size=50)
+        index.load_bid_buckets([
+            {'product_id': 1, 'category_id': 10, 'hour': self.NOW_HOUR, 'bid_count': 5},
+            {'product_id': 2, 'category_id': 10, 'hour': self.NOW_HOUR - 20, 'bid_count': 5},
+            {'product_id': 3, 'category_id': 20, 'hour': self.NOW_HOUR - 1, 'bid_count': 2},
+            {'product_id': 4, 'category_id': 20, 'hour': self.NOW_HOUR - 100, 'bid_count': 50},
+        ])
+        index.rebuild(now_hour=self.NOW_HOUR)
+        return index
+    
+    def test_recent_activity_outranks_older_activity(self, index):
+        ranked = [pid for pid, _, _ in index.top(24, limit=10)]
+        assert ranked == [1, 3, 2]
+        # Gravity: 5 bids now vs. 5 bids 20 hours ago
+        scores = {pid: score for pid, score, _ in index.top(24)}
+        assert scores[1] / scores[2] == pytest.approx((22 / 2) ** 1.8)
+    
+    def test_windows_and_categories(self, index):
+        assert 4 not in [pid for pid, _, _ in index.top(24)]
+        assert [pid for pid, _, _ in index.top(168, category_id=20)] == [3, 4]
+        assert index.top(24, category_id=10, limit=1) == [(1, pytest.approx(5 / 2 ** 1.8), 5)]
+        assert index.supports(24) and not index.supports(48)
+    
+    def test_streamed_events_and_reseed(self, index):
+        now = self.NOW_HOUR * 3600 + 10
+        for _ in range(5):
+            index.record(3, 'bid', timestamp=now, category_id=20)
+        index.record(3, 'view', timestamp=now)
+        index.record(3, 'purchase', timestamp=now)
+        index.rebuild(now_hour=self.NOW_HOUR)
+        assert index.top(24, limit=1)[0][0] == 3
+        assert index.top(24, limit=1)[0][2] == 7
+        
+        # The database is authoritative for bids; streamed views survive
+        index.load_bid_buckets([])
+        index.rebuild(now_hour=self.NOW_HOUR)
+        assert index.top(24) == [(3, pytest.approx(0.1 / 2 ** 1.8), 0)]
+    
+    def test_expired_buckets_are_dropped(self, index):
+        index.rebuild(now_hour=self.NOW_HOUR + 200)
+        assert index.top(168) == []
+        assert index.get_stats()["buckets"] == 0
+        assert index.get_stats()["listings"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_engine_reads_materialized_rankings(self, monkeypatch):
+        engine = recommendation_engine.RecommendationEngine()
+        engine._initialized = True
+        engine.content_based = recommendation_engine.ContentBasedFilter(use_ann=False)
+        products = _synthetic_products(n=30)
+        engine.content_based.fit(products)
+        hour = trending_module.current_hour()
+        database = recommendation_engine.database
+        
+        async def fake_bid_buckets(hours):
+            return [
+                {'product_id': 5, 'category_id': 0, 'hour': hour, 'bid_count': 3},
+                {'product_id': 7, 'category_id': 2, 'hour': hour, 'bid_count': 9},
+            ]
+        
+        async def fake_products_by_ids(ids):
+            return [products[pid - 1] for pid in ids]
+        
+        async def no_trending_query(**kwargs):
+            raise AssertionError("trending should be served from the index")
+        
+        monkeypatch.setattr(database, "get_bid_buckets", fake_bid_buckets)
+        monkeypatch.setattr(database, "get_products_by_ids", fake_products_by_ids)
+        monkeypatch.setattr(database, "get_trending_products", no_trending_query)
+        
+        await engine.refresh_trending()
+        recs = await engine.get_trending_products(hours=24, limit=4)
+        
+        assert [r.product.id for r in recs[:2]] == [7, 5]
+        assert recs[0].score == 1.0
+        assert recs[0].reason == "Trending with 9 recent bids"
+        # Topped up with the most viewed listings
+        assert len(recs) == 4 and all(r.score == 0.0 for r in recs[2:])
+
+
+class _RecordingConnection:
+    def __init__(self):
+        self.calls = []
+    
+    async def fetch_prepared(self, name, *args):
+        self.calls.append((name, args))
+        return []
+    
+    async def fetch(self, sql, *args):
+        self.calls.append((sql, args))
+        return []
+
+
+class TestPreparedQueries:
+    """Tests for the prepared-statement query registry"""
+    
+    @pytest.fixture
+    def conn(self, monkeypatch):
+        conn = _RecordingConnection()
+        
+        @asynccontextmanager
+        async def fake_connection(readonly=False):
+            yield conn
+        
+        monkeypatch.setattr(recommendation_engine.database.Database, "connection", fake_connection)
+        return conn
+    
+    def test_registry_placeholders_are_contiguous(self):
+        for name, sql in queries.QUERIES.items():
+            numbers = sorted({int(n) for n in re.findall(r"\$(\d+)", sql)})
+            assert numbers == list(range(1, len(numbers) + 1)), name
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("kwargs,name,args", [
+        ({}, "active_products", (100,)),
+        ({"category_id": 4}, "active_products_by_category", (4, 100)),
+        ({"exclude_ids": [1, 2]}, "active_products_excluding", ([1, 2], 100)),
+        ({"category_id": 4, "exclude_ids": [1]}, "active_products_by_category_excluding", (4, [1], 100)),
+    ])
+    async def test_active_products_variants(self, conn, kwargs, name, args):
+        await recommendation_engine.database.get_active_products(**kwargs)
+        assert conn.calls == [(name, args)]
+        assert name in queries.QUERIES
+    
+    @pytest.mark.asyncio
+    async def test_trending_and_similar_variants(self, conn):
+        database = recommendation_engine.database
+        await database.get_trending_products(hours=48, limit=5)
+        await database.get_trending_products(hours=48, category_id=3, limit=5)
+        await database.get_similar_products_by_category(9, 3, 20.0, limit=5, seller_id=11)
+        await database.get_similar_products_by_category(
+            9, 3, 20.0, limit=5, include_same_seller=True, seller_id=11
+        )
+        
+        assert conn.calls == [
+            ("trending_products", (48, 5)),
+            ("trending_products_by_category", (48, 3, 5)),
+            ("similar_by_category_other_sellers", (3, 20.0, 9, 11, 5)),
+            ("similar_by_category", (3, 20.0, 9, 5)),
+        ]
+
+
+class _FakePool:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.released = 0
+    
+    async def acquire(self, timeout=None):
+        if self.delay > timeout:
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(self.delay)
+        return object()
+    
+    async def release(self, conn):
+        self.released += 1
+    
+    def get_size(self):
+        return 3
+    
+    def get_idle_size(self):
+        return 2
+    
+    def get_min_size(self):
+        return 2
+    
+    def get_max_size(self):
+        return 10
+
+
+class TestDatabasePool:
+    """Tests for lazy pool creation and pool metrics"""
+    
+    @pytest.fixture
+    def database(self, monkeypatch):
+        database = recommendation_engine.database
+        monkeypatch.setattr(database.Database, "_pool", None)
+        monkeypatch.setattr(database.Database, "_pool_lock", asyncio.Lock())
+        monkeypatch.setattr(database, "pool_metrics", db_metrics.PoolMetrics())
+        return database
+    
+    def test_histogram_quantiles(self):
+        histogram = db_metrics.Histogram(buckets=(1, 10, 100))
+        for value in [0.5] * 90 + [50] * 9 + [500]:
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        assert snapshot["p50_ms"] == 1.0
+        assert snapshot["p95_ms"] == 100.0
+        assert snapshot["p99_ms"] == 100.0
+        assert snapshot["max_ms"] == 500
+        assert snapshot["buckets"] == {"le_1": 90, "le_10": 90, "le_100": 99, "le_inf": 100}
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_first_callers_share_one_pool(self, database, monkeypatch):
+        created = []
+        
+        async def fake_create_pool(dsn, **kwargs):
+            await asyncio.sleep(0.01)
+            created.append(kwargs)
+            return _FakePool()
+        
+        monkeypatch.setattr(database.asyncpg, "create_pool", fake_create_pool)
+        pools = await asyncio.gather(*(database.Database.get_pool() for _ in range(5)))
+        
+        assert len(created) == 1
+        assert all(pool is pools[0] for pool in pools)
+        assert created[0]["max_size"] == database.DB_POOL_MAX_SIZE
+        assert created[0]["statement_cache_size"] == database.DB_STATEMENT_CACHE_SIZE
+    
+    @pytest.mark.asyncio
+    async def test_connection_usage_is_measured(self, database, monkeypatch):
+        pool = _FakePool(delay=0.02)
+        monkeypatch.setattr(database.Database, "_pool", pool)
+        
+        async with database.Database.connection():
+            assert database.pool_metrics.in_use == 1
+        
+        stats = database.Database.get_stats()
+        assert stats["in_use"] == 0 and stats["peak_in_use"] == 1
+        assert stats["acquire_wait"]["count"] == 1
+        assert stats["acquire_wait"]["max_ms"] >= 15
+        assert stats["size"] == 3 and stats["idle"] == 2
+        assert pool.released == 1
+    
+    @pytest.mark.asyncio
+    async def test_acquire_timeout_is_counted(self, database, monkeypatch):
+        monkeypatch.setattr(database.Database, "_pool", _FakePool(delay=1.0))
+        monkeypatch.setattr(database, "DB_ACQUIRE_TIMEOUT", 0.01)
+        
+        with pytest.raises(asyncio.TimeoutError):
+            async with database.Database.connection():
+                pass
+        assert database.pool_metrics.acquire_timeouts == 1
+        assert database.pool_metrics.in_use == 0
+
+
+class _FailingPool(_FakePool):
+    async def acquire(self, timeout=None):
+        raise ConnectionRefusedError("replica down")
+
+
+class TestReadReplicas:
+    """Tests for read-only routing across replicas"""
+    
+    @pytest.fixture
+    def database(self, monkeypatch):
+        database = recommendation_engine.database
+        primary = _FakePool()
+        replicas = [database.Replica(f"postgresql://u:p@replica{i}:5432/db", pool=_FakePool()) for i in range(2)]
+        monkeypatch.setattr(database.Database, "_pool", primary)
+        monkeypatch.setattr(database.Database, "_replicas", replicas)
+        monkeypatch.setattr(database.Database, "_replica_cursor", 0)
+        monkeypatch.setattr(database, "pool_metrics", db_metrics.PoolMetrics())
+        return database
+    
+    @pytest.mark.asyncio
+    async def test_writes_and_reads_are_routed(self, database):
+        async with database.Database.connection():
+            pass
+        async with database.Database.connection(readonly=True):
+            pass
+        assert database.Database._pool.released == 1
+        assert sum(r.pool.released for r in database.Database._replicas) == 1
+    
+    @pytest.mark.asyncio
+    async def test_least_busy_replica_selected(self, database):
+        first, second = database.Database._replicas
+        first.in_use = 3
+        for _ in range(4):
+            assert database.Database.select_replica() is second
+    
+    def test_round_robin_alternates(self, database, monkeypatch):
+        monkeypatch.setattr(database, "REPLICA_SELECTION", "round_robin")
+        picks = [database.Database.select_replica() for _ in range(4)]
+        assert picks[0] is not picks[1]
+        assert picks[0] is picks[2]
+    
+    @pytest.mark.asyncio
+    async def test_failed_replica_is_ejected(self, database):
+        down, up = database.Database._replicas
+        down.pool = _FailingPool()
+        up.ejected_until = float("inf")  # force the first pick onto the failing replica
+        
+        async with database.Database.connection(readonly=True):
+            pass
+        
+        assert not down.healthy and down.failures == 1
+        assert database.Database._pool.released == 1  # fell back to the primary
+        assert database.Database.select_replica() is None
+        assert database.Database.get_stats()["replicas"][0]["name"] == "replica0:5432"
+    
+    @pytest.mark.asyncio
+    async def test_heavy_reads_request_replicas(self, monkeypatch):
+        database = recommendation_engine.database
+        modes = []
+        
+        @asynccontextmanager
+        async def fake_connection(readonly=False):
+            modes.append(readonly)
+            yield _RecordingConnection()
+        
+        monkeypatch.setattr(database.Database, "connection", fake_connection)
+        monkeypatch.setattr(database, "product_cache", TTLCache(max_size=10, ttl_seconds=60))
+        await database.get_active_products()
+        await database.get_trending_products()
+        await database.get_similar_products_by_category(1, 2, 3.0)
+        await database.get_products_by_ids([1])
+        await database.get_all_interactions()
+        await database.get_bid_buckets()
+        assert modes == [True, True, True, False, True, True]
+    
+    @pytest.mark.asyncio
+    async def test_ad_hoc_queries_are_timed(self, monkeypatch):
+        database = recommendation_engine.database
+        metrics = db_metrics.PoolMetrics()
+        
+        @asynccontextmanager
+        async def fake_connection(readonly=False):
+            yield _RecordingConnection()
+        
+        monkeypatch.setattr(database.Database, "connection", fake_connection)
+        monkeypatch.setattr(database, "pool_metrics", metrics)
+        await database.get_all_interactions()
+        await database.get_bid_buckets()
+        await database.get_request_changes(datetime(2026, 1, 1), 10)
+        
+        queries = database.Database.get_stats()["queries"]
+        assert {"all_interactions", "bid_buckets", "travel_request_changes"} <= queries.keys()
+        assert queries["bid_buckets"]["count"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_only_connection_failures_eject(self, database):
+        replica = database.Database._replicas[0]
+        database.Database._replicas[1].ejected_until = float("inf")
+        
+        with pytest.raises(database.asyncpg.exceptions.InterfaceError):
+            async with database.Database.connection(readonly=True):
+                raise database.asyncpg.exceptions.InterfaceError("another operation is in progress")
+        assert replica.healthy
+        
+        with pytest.raises(ConnectionResetError):
+            async with database.Database.connection(readonly=True):
+                raise ConnectionResetError("connection lost")
+        assert not replica.healthy
+    
+    @pytest.mark.asyncio
+    async def test_query_timeouts_leave_the_replica_healthy(self, database):
+        replica = database.Database._replicas[0]
+        database.Database._replicas[1].ejected_until = float("inf")
+        
+        with pytest.raises(asyncio.TimeoutError):
+            async with database.Database.connection(readonly=True):
+                raise asyncio.TimeoutError()
+        assert replica.healthy and replica.failures == 0
+    
+    @pytest.mark.asyncio
+    async def test_repeated_acquire_timeouts_eject(self, database, monkeypatch):
+        monkeypatch.setattr(database, "DB_ACQUIRE_TIMEOUT", 0.01)
+        replica = database.Database._replicas[0]
+        replica.pool = _FakePool(delay=1.0)
+        database.Database._replicas[1].ejected_until = float("inf")
+        
+        for _ in range(database.REPLICA_EJECT_ACQUIRE_TIMEOUTS - 1):
+            async with database.Database.connection(readonly=True):
+                pass
+        assert replica.healthy and replica.acquire_timeouts == 2
+        assert database.Database._pool.released == 2  # served by the primary
+        
+        async with database.Database.connection(readonly=True):
+            pass
+        assert not replica.healthy and replica.failures == 1